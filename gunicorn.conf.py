@@ -0,0 +1,26 @@
+"""
+Gunicorn configuration for MamaCare (loaded automatically from the working directory)
+
+Sets up prometheus_client's multiprocess mode so /metrics reports the sum of
+every worker rather than whichever worker happened to answer the scrape.
+"""
+import os
+import shutil
+from pathlib import Path
+
+
+# Must be set before any worker imports prometheus_client
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', str(Path(__file__).resolve().parent / 'var' / 'prometheus'))
+
+
+def on_starting(server):
+    """Start every deployment with an empty metrics directory (files of old workers would be summed)"""
+    metrics_dir = Path(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    metrics_dir.mkdir(parents=True, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Drop a dead worker's live gauges (its counters and histograms are kept)"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
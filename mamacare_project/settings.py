@@ -62,6 +62,9 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # For static files in production
+    'predictions.middleware.MetricsMiddleware',  # Request counts / latency for /metrics
+    'predictions.middleware.QueryBudgetMiddleware',  # MongoDB round trips per request (Server-Timing)
+    'predictions.middleware.ProfilingMiddleware',  # On-demand cProfile / tracemalloc (staff profiling page)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -94,13 +97,79 @@ WSGI_APPLICATION = 'mamacare_project.wsgi.application'
 # Database - MongoDB Configuration
 # Using PyMongo directly instead of djongo for better compatibility
 
+# Where patients, predictions and audit logs are stored: 'mongodb' (default),
+# 'sqlite' (a local file, for small clinics running offline) or 'memory'
+# (process memory only, for tests and benchmarks)
+STORAGE_BACKEND = config('STORAGE_BACKEND', default='mongodb')
+SQLITE_STORAGE_PATH = config('SQLITE_STORAGE_PATH', default=str(BASE_DIR / 'var' / 'mamacare_data.sqlite3'))
+
 MONGODB_SETTINGS = {
     'host': config('MONGODB_HOST', default='mongodb://localhost:27017/'),
     'name': config('MONGODB_NAME', default='mamacare_db'),
     'username': config('MONGODB_USERNAME', default=''),
     'password': config('MONGODB_PASSWORD', default=''),
+    # Circuit breaker: after this many consecutive network failures (or as soon as
+    # the driver loses every server) calls fail fast for breaker_reset_seconds
+    'breaker_failure_threshold': config('MONGODB_BREAKER_FAILURES', default=3, cast=int),
+    'breaker_reset_seconds': config('MONGODB_BREAKER_RESET_SECONDS', default=30, cast=float),
+    # How long the first request after boot waits for the lazy connection
+    'connect_wait_ms': config('MONGODB_CONNECT_WAIT_MS', default=500, cast=int),
+    # Connection pool (per worker process: total connections to Atlas is roughly
+    # gunicorn workers x max_pool_size, so keep it within the cluster's limit)
+    'max_pool_size': config('MONGODB_MAX_POOL_SIZE', default=20, cast=int),
+    'min_pool_size': config('MONGODB_MIN_POOL_SIZE', default=0, cast=int),
+    'max_idle_time_ms': config('MONGODB_MAX_IDLE_TIME_MS', default=300000, cast=int),
+    # Fail a request that waits this long for a free pooled connection (0 = wait forever)
+    'wait_queue_timeout_ms': config('MONGODB_WAIT_QUEUE_TIMEOUT_MS', default=2000, cast=int),
+    # Wire compression, e.g. 'zstd,snappy,zlib' (zstd/snappy need extra packages)
+    'compressors': config('MONGODB_COMPRESSORS', default=''),
 }
 
+# Requests making more MongoDB round trips than this, or spending longer in
+# MongoDB, are logged with their most frequent commands
+MONGO_QUERY_BUDGET = config('MONGO_QUERY_BUDGET', default=20, cast=int)
+MONGO_LATENCY_BUDGET_MS = config('MONGO_LATENCY_BUDGET_MS', default=500, cast=float)
+
+# MongoDB commands at least this slow are kept (per worker, newest SLOW_QUERY_LOG_SIZE)
+# for the slow query page; this fraction of slow reads is also explained
+SLOW_QUERY_MS = config('SLOW_QUERY_MS', default=100, cast=float)
+SLOW_QUERY_LOG_SIZE = config('SLOW_QUERY_LOG_SIZE', default=200, cast=int)
+SLOW_QUERY_EXPLAIN_RATE = config('SLOW_QUERY_EXPLAIN_RATE', default=0.1, cast=float)
+
+# On-demand profiling (staff profiling page): most requests one session may
+# profile, and how long an unfinished session stays armed
+PROFILING_MAX_REQUESTS = config('PROFILING_MAX_REQUESTS', default=200, cast=int)
+PROFILING_SESSION_TIMEOUT_SECONDS = config('PROFILING_SESSION_TIMEOUT_SECONDS', default=900, cast=int)
+
+# /metrics (Prometheus text format) requires 'Authorization: Bearer <METRICS_TOKEN>'
+# when set; without a token only local scrapers (127.0.0.1 / ::1) are served.
+# gunicorn.conf.py points PROMETHEUS_MULTIPROC_DIR at var/prometheus so the
+# samples of every worker are merged
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Audit logs are queued in memory and written to MongoDB in batches by a
+# background thread; entries that cannot be written are spilled to this file
+AUDIT_LOG_QUEUE_SIZE = config('AUDIT_LOG_QUEUE_SIZE', default=10000, cast=int)
+AUDIT_LOG_BATCH_SIZE = config('AUDIT_LOG_BATCH_SIZE', default=200, cast=int)
+AUDIT_LOG_FLUSH_SECONDS = config('AUDIT_LOG_FLUSH_SECONDS', default=2.0, cast=float)
+AUDIT_LOG_SPILL_PATH = BASE_DIR / 'var' / 'audit_logs.spill.jsonl'
+
+# Predictions are made durable in a local append-only spool first and replayed
+# into MongoDB in bulk by a background flusher (write-behind)
+PREDICTION_SPOOL_PATH = BASE_DIR / 'var' / 'predictions.spool.jsonl'
+PREDICTION_SPOOL_BATCH_SIZE = config('PREDICTION_SPOOL_BATCH_SIZE', default=500, cast=int)
+PREDICTION_SPOOL_FLUSH_SECONDS = config('PREDICTION_SPOOL_FLUSH_SECONDS', default=1.0, cast=float)
+PREDICTION_SPOOL_FSYNC = config('PREDICTION_SPOOL_FSYNC', default=True, cast=bool)
+# Visits MongoDB rejects this many times are moved to <spool path>.dead
+PREDICTION_SPOOL_MAX_ATTEMPTS = config('PREDICTION_SPOOL_MAX_ATTEMPTS', default=5, cast=int)
+
+# New patient IDs come from blocks of this many sequence numbers that each
+# worker reserves from a shared counter (one round trip per block, not per patient)
+PATIENT_ID_BLOCK_SIZE = config('PATIENT_ID_BLOCK_SIZE', default=100, cast=int)
+
+# Patient pairs whose names score at least this (0-1) are queued for duplicate review
+DUPLICATE_MATCH_THRESHOLD = config('DUPLICATE_MATCH_THRESHOLD', default=0.92, cast=float)
+
 # For Django's default SQLite (used for auth, sessions, etc.)
 DATABASES = {
     'default': {
@@ -109,6 +178,53 @@ DATABASES = {
     }
 }
 
+# wsgi.py applies missing migrations at startup (once, under this lock shared by
+# all workers); turn off where the build or release step migrates instead
+MIGRATE_ON_STARTUP = config('MIGRATE_ON_STARTUP', default=True, cast=bool)
+STARTUP_LOCK_PATH = config('STARTUP_LOCK_PATH', default=str(BASE_DIR / 'var' / 'startup.lock'))
+
+
+# Cache shared by all workers (file-based by default; for Redis set
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache and
+# CACHE_LOCATION=redis://127.0.0.1:6379)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / 'var' / 'cache')),
+    }
+}
+
+# Dashboard / analytics aggregates are cached for these many seconds (0 disables
+# one; new predictions invalidate them all immediately)
+AGGREGATE_CACHE_ALIAS = 'default'
+AGGREGATE_CACHE_TTLS = {
+    'get_statistics': config('AGGREGATE_CACHE_STATISTICS_TTL', default=60, cast=int),
+    'get_statistics_by_date_range': config('AGGREGATE_CACHE_STATISTICS_TTL', default=60, cast=int),
+    'get_daily_statistics': config('AGGREGATE_CACHE_DAILY_TTL', default=300, cast=int),
+    'get_all_health_workers': config('AGGREGATE_CACHE_HEALTH_WORKERS_TTL', default=120, cast=int),
+    'get_health_worker_stats': config('AGGREGATE_CACHE_HEALTH_WORKERS_TTL', default=120, cast=int),
+    'get_report_summary': config('AGGREGATE_CACHE_REPORT_TTL', default=300, cast=int),
+}
+# Longest a request waits for another worker already recomputing the same aggregate
+AGGREGATE_CACHE_LOCK_SECONDS = config('AGGREGATE_CACHE_LOCK_SECONDS', default=10, cast=float)
+
+# Dashboard queries run concurrently on a per-process pool (keep well under
+# MONGODB_MAX_POOL_SIZE); sections still loading at the deadline render empty
+PAGE_QUERY_WORKERS = config('PAGE_QUERY_WORKERS', default=8, cast=int)
+PAGE_QUERY_TIMEOUT_SECONDS = config('PAGE_QUERY_TIMEOUT_SECONDS', default=3.0, cast=float)
+
+# Browsers may reuse each admin dashboard panel for this long (panel URLs change
+# whenever a prediction is saved, so this only bounds staleness from other writes)
+DASHBOARD_PANEL_MAX_AGE = {
+    'stats': config('DASHBOARD_PANEL_STATS_MAX_AGE', default=60, cast=int),
+    'health_workers': config('DASHBOARD_PANEL_HEALTH_WORKERS_MAX_AGE', default=120, cast=int),
+    'recent_predictions': config('DASHBOARD_PANEL_RECENT_MAX_AGE', default=60, cast=int),
+    'daily_chart': config('DASHBOARD_PANEL_CHART_MAX_AGE', default=300, cast=int),
+}
+
+# Health worker names shown next to MongoDB records are cached per process for
+# this long (saving or deleting a user drops its entry immediately)
+USER_CACHE_SECONDS = config('USER_CACHE_SECONDS', default=60, cast=int)
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -148,6 +264,16 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Background export jobs (artifacts are written under MEDIA_ROOT)
+EXPORT_JOBS_DIR = MEDIA_ROOT / 'exports'
+# Run jobs on a thread pool inside the web worker; set False when a separate
+# `python manage.py run_export_jobs` process drains the queue instead
+EXPORT_JOBS_IN_PROCESS = config('EXPORT_JOBS_IN_PROCESS', default=True, cast=bool)
+EXPORT_JOB_WORKERS = config('EXPORT_JOB_WORKERS', default=1, cast=int)
+# Identical export requests within this window reuse the finished artifact
+EXPORT_JOB_REUSE_SECONDS = config('EXPORT_JOB_REUSE_SECONDS', default=600, cast=int)
+EXPORT_JOB_RETENTION_HOURS = config('EXPORT_JOB_RETENTION_HOURS', default=24, cast=int)
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -165,6 +291,12 @@ if not DEBUG:
     SECURE_CONTENT_TYPE_NOSNIFF = True
     X_FRAME_OPTIONS = 'DENY'
 
+# Benchmark runs recorded by `manage.py bench_record` (compared with `manage.py bench_compare`)
+BENCHMARK_RESULTS_DIR = config('BENCHMARK_RESULTS_DIR', default=str(BASE_DIR / 'var' / 'benchmarks'))
+
 # ML Models Path
 ML_MODELS_DIR = BASE_DIR / 'ml_models'
+# Models (with pandas / scikit-learn) load on the first prediction; set True to
+# load them in a background thread as each worker boots instead
+ML_WARM_UP = config('ML_WARM_UP', default=False, cast=bool)
 
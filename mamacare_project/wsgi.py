@@ -1,80 +1,39 @@
 """
 WSGI config for mamacare_project project.
+
+Each boot phase is timed (printed on stderr and exported as the
+mamacare_boot_phase_seconds metric). The Django schema is checked with one
+query; migrations run only when some are missing, once, under a file lock
+shared by all workers. Heavy libraries (pandas, scikit-learn) wait for the
+first prediction unless ML_WARM_UP loads them in the background.
 """
 
 import os
-import sys
 
 # Set Django settings before importing anything else
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mamacare_project.settings')
 
-# Import Django after setting environment
-import django
-django.setup()
+from predictions.startup import boot_timer, ensure_schema
+
+with boot_timer.phase('imports'):
+    import django
+    from django.conf import settings
+    settings.INSTALLED_APPS  # Loads the settings module
 
-# Now import Django components
-from django.core.management import call_command
-from django.contrib.auth.models import User
-from django.db import connection
+# App registry and Django models
+with boot_timer.phase('django_setup'):
+    django.setup()
 
 # Ensure database is initialized before starting (for Render's ephemeral filesystem)
-def initialize_database():
-    """Initialize database tables and create admin user"""
-    try:
-        # Check if database file exists, create it if needed
-        from django.conf import settings
-        db_path = str(settings.DATABASES['default']['NAME'])
-        
-        # Ensure directory exists
-        db_dir = os.path.dirname(db_path)
-        if db_dir and not os.path.exists(db_dir):
-            os.makedirs(db_dir, exist_ok=True)
-        
-        # Run migrations
-        print("=" * 60, file=sys.stderr)
-        print("Initializing database on startup...", file=sys.stderr)
-        print("=" * 60, file=sys.stderr)
-        
-        # Use call_command instead of execute_from_command_line for better reliability
-        call_command('migrate', verbosity=2, interactive=False, run_syncdb=True)
-        
-        print("✓ Database migrations completed", file=sys.stderr)
-        
-        # Create admin user if it doesn't exist
-        admin_username = os.environ.get('ADMIN_USERNAME', 'admin')
-        admin_password = os.environ.get('ADMIN_PASSWORD', 'admin123')
-        admin_email = os.environ.get('ADMIN_EMAIL', 'admin@mamacare.com')
-        
-        if not User.objects.filter(username=admin_username).exists():
-            print(f"Creating admin user '{admin_username}'...", file=sys.stderr)
-            User.objects.create_superuser(
-                username=admin_username,
-                email=admin_email,
-                password=admin_password
-            )
-            print(f"✓ Admin user '{admin_username}' created successfully!", file=sys.stderr)
-        else:
-            print(f"✓ Admin user '{admin_username}' already exists.", file=sys.stderr)
-        
-        print("=" * 60, file=sys.stderr)
-        print("Database initialization complete!", file=sys.stderr)
-        print("=" * 60, file=sys.stderr)
-        
-    except Exception as e:
-        # Log error but don't fail startup - app will still run
-        print("=" * 60, file=sys.stderr)
-        print(f"ERROR: Database initialization failed: {e}", file=sys.stderr)
-        print("=" * 60, file=sys.stderr)
-        import traceback
-        traceback.print_exc(file=sys.stderr)
-        print("=" * 60, file=sys.stderr)
-        print("WARNING: Application will start but login/registration may not work!", file=sys.stderr)
-        print("=" * 60, file=sys.stderr)
+ensure_schema()
 
-# Initialize database on module import
-initialize_database()
+with boot_timer.phase('wsgi_application'):
+    from django.core.wsgi import get_wsgi_application
+    application = get_wsgi_application()
 
-# Now get the WSGI application
-from django.core.wsgi import get_wsgi_application
-application = get_wsgi_application()
+boot_timer.report()
 
+if settings.ML_WARM_UP:
+    import threading
+    from predictions.ml_service import ml_service
+    threading.Thread(target=ml_service.ensure_loaded, name='ml-warm-up', daemon=True).start()
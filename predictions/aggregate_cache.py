@@ -0,0 +1,172 @@
+"""
+Cache for MamaCare's dashboard and analytics aggregates
+Serves statistics from Django's cache, invalidated whenever new predictions are written
+"""
+import hashlib
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .fanout import time_left
+
+
+VERSION_KEY = 'mamacare:aggregates:version'
+
+# Writes that change the aggregates; each bumps the cache version
+INVALIDATING_METHODS = ('save_prediction', 'save_visit')
+
+_MISSING = object()
+
+
+def _cache():
+    return caches[settings.AGGREGATE_CACHE_ALIAS]
+
+
+def _new_version():
+    # Unique per bump: a read-modify-write counter (FileBasedCache's incr) lets
+    # two workers invalidating at once both land on the same next version
+    return uuid.uuid4().hex
+
+
+def aggregates_version():
+    """Current aggregate cache version (shared by all workers through the cache)"""
+    version = _cache().get(VERSION_KEY)
+    if version is None:
+        # add() keeps the first worker's version if several start at once
+        _cache().add(VERSION_KEY, _new_version(), timeout=None)
+        version = _cache().get(VERSION_KEY)
+    return version
+
+
+def invalidate_aggregates():
+    """Make every cached aggregate stale (they are recomputed on next use)"""
+    try:
+        _cache().set(VERSION_KEY, _new_version(), timeout=None)
+    except Exception as e:
+        print(f"⚠ Warning: Could not invalidate aggregate cache: {e}")
+
+
+class CachedAggregates:
+    """
+    Storage proxy that caches the expensive read-only aggregates
+
+    Every other attribute is passed straight through to the wrapped backend.
+    Cache keys embed a version token that writes replace, so a new prediction
+    makes all cached aggregates stale at once; TTLs bound staleness for
+    anything written behind the proxy's back. Concurrent misses for the same
+    key compute it once: threads in a worker share a lock, and workers share
+    a short-lived lock entry in the cache while the others wait for the result.
+    """
+
+    def __init__(self, backend, ttls, lock_timeout=10.0):
+        """
+        Args:
+            backend: The StorageBackend to wrap
+            ttls: {method name: seconds} for each cached method
+            lock_timeout: Longest a miss waits for another worker's recompute
+        """
+        self._backend = backend
+        self._ttls = ttls
+        self._lock_timeout = lock_timeout
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+
+    def __getattr__(self, name):
+        attribute = getattr(self._backend, name)
+        if name in self._ttls and callable(attribute):
+            return lambda *args, **kwargs: self._cached(name, attribute, args, kwargs)
+        if name in INVALIDATING_METHODS:
+            def write_through(*args, **kwargs):
+                result = attribute(*args, **kwargs)
+                invalidate_aggregates()
+                return result
+            return write_through
+        return attribute
+
+    def _key(self, name, args, kwargs):
+        signature = repr((args, sorted(kwargs.items())))
+        digest = hashlib.sha1(signature.encode('utf-8')).hexdigest()
+        return f'mamacare:aggregates:{aggregates_version()}:{name}:{digest}'
+
+    def _local_lock(self, key):
+        with self._locks_guard:
+            if len(self._locks) > 1000:
+                # Old versions' locks are never used again
+                self._locks.clear()
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _cached(self, name, method, args, kwargs):
+        cache = _cache()
+        try:
+            key = self._key(name, args, kwargs)
+            value = cache.get(key, _MISSING)
+        except Exception as e:
+            print(f"⚠ Warning: Aggregate cache unavailable, computing {name} directly: {e}")
+            return method(*args, **kwargs)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        with self._local_lock(key):
+            # Another thread in this worker may have filled it while we waited
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+
+            lock_key = f'{key}:lock'
+            if not cache.add(lock_key, 1, timeout=self._lock_timeout):
+                # Another worker is computing it: wait for its result, but no
+                # longer than a page query's deadline (dashboard panels)
+                self.waits += 1
+                wait_seconds = self._lock_timeout
+                remaining = time_left()
+                if remaining is not None:
+                    wait_seconds = min(wait_seconds, remaining)
+                deadline = time.monotonic() + wait_seconds
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    value = cache.get(key, _MISSING)
+                    if value is not _MISSING:
+                        self.hits += 1
+                        return value
+                if remaining is not None and time_left() <= 0:
+                    raise TimeoutError(f"Page deadline passed waiting for another worker to compute {name}")
+
+            self.misses += 1
+            try:
+                value = method(*args, **kwargs)
+                # Empty results mean the database was unavailable; don't keep those
+                if value:
+                    cache.set(key, value, timeout=self._ttls[name])
+                return value
+            finally:
+                cache.delete(lock_key)
+
+    def cache_stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'waits': self.waits,
+            'version': aggregates_version(),
+            'ttls': self._ttls,
+        }
+
+    def pool_stats(self):
+        stats = self._backend.pool_stats()
+        stats['aggregate_cache'] = self.cache_stats()
+        return stats
+
+
+def cached_aggregates(backend):
+    """Wrap a backend in CachedAggregates unless the cache is disabled (AGGREGATE_CACHE_TTLS empty)"""
+    ttls = {name: ttl for name, ttl in settings.AGGREGATE_CACHE_TTLS.items() if ttl}
+    if not ttls:
+        return backend
+    return CachedAggregates(backend, ttls, lock_timeout=settings.AGGREGATE_CACHE_LOCK_SECONDS)
@@ -0,0 +1,206 @@
+"""
+Asynchronous audit log writer for MamaCare
+Queues audit entries in memory and flushes them to MongoDB in batches from a background thread
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+from . import spool_files
+
+
+class AuditLogWriter:
+    """
+    Bounded in-memory queue drained by a daemon thread using insert_many
+
+    Entries are flushed when a batch fills up or the flush interval elapses,
+    whichever comes first. If MongoDB is unavailable (or the queue is full)
+    entries are appended to a local JSON-lines spill file, which is replayed
+    once MongoDB accepts writes again. Every entry carries a client-generated
+    _id, so a replayed batch that partly made it in before is not duplicated.
+    """
+
+    def __init__(self, get_collection, spill_path, max_queue=10000, batch_size=200, flush_interval=2.0):
+        """
+        Args:
+            get_collection: Callable returning the audit_logs collection, or None if unavailable
+            spill_path: File used to persist entries that could not be written to MongoDB
+            max_queue: Maximum number of entries held in memory
+            batch_size: Maximum entries per insert_many call
+            flush_interval: Seconds between flushes of a partially filled batch
+        """
+        self._get_collection = get_collection
+        self.spill_path = Path(spill_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+        self.written = 0
+        self.spilled = 0
+        atexit.register(self.close)
+
+    def submit(self, entry):
+        """Queue an audit entry without waiting on MongoDB"""
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            # Never make the request wait: overflow goes straight to disk
+            self._spill([entry])
+
+    def queue_depth(self):
+        """Number of entries waiting to be flushed"""
+        return self._queue.qsize()
+
+    def stats(self):
+        """Snapshot of the writer's counters"""
+        return {
+            'queue_depth': self.queue_depth(),
+            'written': self.written,
+            'spilled': self.spilled,
+            'spill_file_bytes': sum(self._file_size(f) for f in spool_files.pending_files(self.spill_path)),
+        }
+
+    @staticmethod
+    def _file_size(path):
+        try:
+            return path.stat().st_size
+        except FileNotFoundError:
+            # Removed by a replay finishing since it was listed
+            return 0
+
+    def _ensure_thread(self):
+        """Start the flusher thread (again, after a fork) on first use"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Entries queued by the parent belong to the parent
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """Flusher loop: collect up to batch_size entries or until the interval passes"""
+        while not self._stopping.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._write(batch)
+            elif spool_files.pending_files(self.spill_path):
+                self._replay_spill()
+
+    def _collect_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        """Insert a batch, spilling it to disk if MongoDB is unavailable"""
+        collection = self._get_collection()
+        if collection is None:
+            self._spill(batch)
+            return
+        try:
+            collection.insert_many(batch, ordered=False)
+            self.written += len(batch)
+        except Exception as e:
+            inserted = self._inserted_count(e)
+            self.written += inserted
+            if inserted < len(batch):
+                print(f"Error writing audit logs, spilling {len(batch)} entries to disk: {e}")
+                self._spill(batch)
+            return
+        if spool_files.pending_files(self.spill_path):
+            self._replay_spill()
+
+    @staticmethod
+    def _inserted_count(error):
+        """Entries actually stored by a failed insert_many (0 if unknown)"""
+        details = getattr(error, 'details', None) or {}
+        return details.get('nInserted', 0)
+
+    def _spill(self, entries):
+        """Append entries to the local spill file as extended JSON lines"""
+        try:
+            spool_files.append_records(self.spill_path, entries)
+            self.spilled += len(entries)
+        except OSError as e:
+            print(f"❌ Could not spill {len(entries)} audit log entries to {self.spill_path}: {e}")
+
+    def _replay_spill(self):
+        """Move spilled entries back into MongoDB once it is reachable"""
+        collection = self._get_collection()
+        if collection is None:
+            return
+        spool_files.adopt_orphans(self.spill_path)
+        replay_path = spool_files.claim(self.spill_path)
+        if replay_path is None:
+            return
+
+        try:
+            batch = []
+            for entry in spool_files.iter_records(replay_path):
+                batch.append(entry)
+                if len(batch) >= self.batch_size:
+                    self._insert_replayed(collection, batch)
+                    batch = []
+            if batch:
+                self._insert_replayed(collection, batch)
+            os.remove(replay_path)
+        except Exception as e:
+            # The claimed file is kept and retried later; duplicates are skipped by _id
+            print(f"Error replaying audit log spill file: {e}")
+
+    def _insert_replayed(self, collection, batch):
+        from pymongo.errors import BulkWriteError
+
+        try:
+            collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # Duplicate key errors mean the entry was already written before the spill
+            self.written += self._inserted_count(e)
+            if any(err.get('code') != 11000 for err in e.details.get('writeErrors', [])):
+                raise
+            return
+        self.written += len(batch)
+
+    def flush(self):
+        """Synchronously write everything currently queued"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def close(self):
+        """Stop the flusher thread and write out any remaining entries"""
+        if self._pid != os.getpid():
+            return
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
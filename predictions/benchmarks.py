@@ -0,0 +1,373 @@
+"""
+Benchmark results for MamaCare
+Times ML inference, storage queries and worker imports, keeps every run (with its git commit and machine) in a local
+store, and compares two runs for statistically significant regressions
+"""
+import hashlib
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from importlib import metadata
+from pathlib import Path
+from statistics import median
+
+from django.conf import settings
+
+
+# Package versions worth knowing when two runs disagree
+FINGERPRINT_PACKAGES = ('Django', 'pymongo', 'numpy', 'pandas', 'scikit-learn', 'gunicorn')
+
+
+def git_commit():
+    """The checked-out commit (with a '-dirty' suffix for uncommitted changes), or None outside git"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, timeout=5, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=settings.BASE_DIR,
+                               capture_output=True, text=True, timeout=5).stdout.strip()
+        return f'{commit}-dirty' if dirty else commit
+    except Exception:
+        return None
+
+
+def _memory_mb():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def machine_fingerprint():
+    """
+    The hardware and software a run was measured on
+
+    Returns:
+        dict: host details, package versions and a short 'id' hashed from them
+    """
+    packages = {}
+    for package in FINGERPRINT_PACKAGES:
+        try:
+            packages[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            packages[package] = None
+    fingerprint = {
+        'hostname': socket.gethostname(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'memory_mb': _memory_mb(),
+        'python': platform.python_version(),
+        'packages': packages,
+    }
+    fingerprint['id'] = hashlib.sha1(json.dumps(fingerprint, sort_keys=True).encode()).hexdigest()[:12]
+    return fingerprint
+
+
+def new_record(kind, metrics, label='', details=None):
+    """
+    A benchmark run ready to be saved
+
+    Args:
+        kind: What was measured ('benchmark', 'http_load_test', ...)
+        metrics: {metric name: list of samples in ms}
+        label: Free text describing the run
+        details: Anything else worth keeping (settings, summaries)
+    """
+    recorded_at = datetime.now()
+    commit = git_commit()
+    return {
+        # Microseconds keep two runs recorded within a second from overwriting each other
+        'id': f"{recorded_at:%Y%m%d-%H%M%S-%f}-{commit or 'nogit'}-{kind}",
+        'kind': kind,
+        'label': label,
+        'recorded_at': recorded_at.isoformat(timespec='microseconds'),
+        'git_commit': commit,
+        'machine': machine_fingerprint(),
+        'metrics': metrics,
+        'details': details or {},
+    }
+
+
+def record_from_load_test(results, label=''):
+    """A store record for the JSON saved by `manage.py load_test` (one metric per endpoint)"""
+    record = new_record(
+        'http_load_test',
+        {f'http:{endpoint}': samples for endpoint, samples in results.get('latencies_ms', {}).items()},
+        label=label or results.get('label', ''),
+        details={'config': results.get('config'), 'endpoints': results.get('endpoints')}
+    )
+    # Keep the commit the load test ran against, not the one importing it
+    if results.get('git_commit'):
+        record['id'] = record['id'].replace(f"-{record['git_commit'] or 'nogit'}-", f"-{results['git_commit']}-", 1)
+        record['git_commit'] = results['git_commit']
+    return record
+
+
+class ResultStore:
+    """Benchmark runs saved as one JSON file each under a directory"""
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory or settings.BENCHMARK_RESULTS_DIR)
+
+    def save(self, record):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{record['id']}.json"
+        path.write_text(json.dumps(record, indent=2))
+        return path
+
+    def runs(self, kind=None):
+        """Saved runs, oldest first"""
+        runs = []
+        for path in sorted(self.directory.glob('*.json')):
+            try:
+                record = json.loads(path.read_text())
+            except (OSError, ValueError) as e:
+                print(f"⚠ Skipping unreadable benchmark file {path.name}: {e}")
+                continue
+            if kind is None or record.get('kind') == kind:
+                runs.append(record)
+        runs.sort(key=lambda record: record.get('recorded_at', ''))
+        return runs
+
+    def resolve(self, ref, kind=None):
+        """
+        Find a run by reference
+
+        Args:
+            ref: 'latest', 'previous', a run id (or prefix), a git commit (latest
+                 run of it), or a path to a record file
+            kind: Only consider runs of this kind
+
+        Returns:
+            dict: The run, or None if nothing matches
+        """
+        if ref and Path(ref).is_file():
+            return json.loads(Path(ref).read_text())
+        runs = self.runs(kind)
+        if not runs:
+            return None
+        if ref in (None, 'latest'):
+            return runs[-1]
+        if ref == 'previous':
+            return runs[-2] if len(runs) > 1 else None
+        for record in reversed(runs):
+            if record['id'].startswith(ref) or (record.get('git_commit') or '').startswith(ref):
+                return record
+        return None
+
+
+def mann_whitney_u(baseline, candidate):
+    """
+    One-sided Mann-Whitney U test that candidate samples tend to be larger than baseline ones
+
+    Uses the normal approximation with tie and continuity corrections, which
+    is accurate for the sample sizes benchmarks produce (ten or more each).
+
+    Returns:
+        tuple: (U statistic of candidate, p-value)
+    """
+    n1, n2 = len(baseline), len(candidate)
+    if not n1 or not n2:
+        return None, 1.0
+    combined = sorted([(value, 0) for value in baseline] + [(value, 1) for value in candidate])
+    ranks = [0.0] * len(combined)
+    tie_term = 0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        # Tied values share the average of their ranks (ranks are 1-based)
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        tied = j - i + 1
+        tie_term += tied ** 3 - tied
+        i = j + 1
+
+    rank_sum = sum(rank for rank, (_, group) in zip(ranks, combined) if group == 1)
+    u = rank_sum - n2 * (n2 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return u, 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return u, 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def compare_runs(baseline, candidate, alpha=0.01, threshold=0.05):
+    """
+    Compare every metric two runs share
+
+    A metric regresses when the candidate is significantly slower (one-sided
+    Mann-Whitney p < alpha) and its median grew by more than threshold
+    (a fraction); improvements are the mirror image.
+
+    Returns:
+        list: One dict per metric with medians, relative change, p-values and status
+    """
+    rows = []
+    names = sorted(set(baseline['metrics']) | set(candidate['metrics']))
+    for name in names:
+        before = baseline['metrics'].get(name) or []
+        after = candidate['metrics'].get(name) or []
+        if not before or not after:
+            rows.append({'metric': name, 'status': 'missing', 'baseline_n': len(before), 'candidate_n': len(after)})
+            continue
+        before_median, after_median = median(before), median(after)
+        change = (after_median - before_median) / before_median if before_median else 0.0
+        _, p_slower = mann_whitney_u(before, after)
+        _, p_faster = mann_whitney_u(after, before)
+        if p_slower < alpha and change > threshold:
+            status = 'regression'
+        elif p_faster < alpha and change < -threshold:
+            status = 'improvement'
+        else:
+            status = 'unchanged'
+        rows.append({
+            'metric': name,
+            'status': status,
+            'baseline_n': len(before),
+            'candidate_n': len(after),
+            'baseline_median_ms': round(before_median, 3),
+            'candidate_median_ms': round(after_median, 3),
+            'change': round(change, 4),
+            'p_value': round(min(p_slower, p_faster), 6),
+        })
+    return rows
+
+
+def _timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def bench_ml(repeat=50, seed=0):
+    """Latency samples (ms) of ml_service.predict_all_risks on varied synthetic visits"""
+    from .ml_service import ml_service
+    from .synthetic import SyntheticPopulation
+
+    population = SyntheticPopulation(seed=seed)
+    inputs = [population.visit({'patient_id': None, 'patient_name': ''})['input_data'] for _ in range(repeat)]
+    # Warm up (first calls pay for lazy initialisation inside pandas / sklearn)
+    for input_data in inputs[:3]:
+        ml_service.predict_all_risks(input_data)
+    samples = []
+    for input_data in inputs:
+        started = time.perf_counter()
+        ml_service.predict_all_risks(input_data)
+        samples.append((time.perf_counter() - started) * 1000)
+    return {'ml:predict_all_risks': samples}
+
+
+def storage_backend():
+    """The configured storage backend without the aggregate cache and metrics proxies around it"""
+    from .db_service import db_service
+
+    backend = db_service.get()
+    while '_backend' in vars(backend):
+        backend = vars(backend)['_backend']
+    return backend
+
+
+def bench_storage(repeat=20, days=30):
+    """
+    Latency samples (ms) of the storage queries behind the busiest pages
+
+    Runs against the configured backend directly, so the aggregate cache
+    does not turn the aggregations into cache hits.
+    """
+    backend = storage_backend()
+    latest = backend.get_all_predictions(limit=1)
+    user_id = latest[0].get('user_id') if latest else '1'
+    patient_id = latest[0].get('patient_id') if latest else 'MC-000000'
+    search = (latest[0].get('patient_name') or 'a')[:3] if latest else 'a'
+    end = datetime.utcnow()
+    start = end - timedelta(days=days)
+
+    queries = {
+        'get_statistics': lambda: backend.get_statistics(),
+        'get_daily_statistics': lambda: backend.get_daily_statistics(days=days),
+        'get_statistics_by_date_range': lambda: backend.get_statistics_by_date_range(start, end),
+        'get_all_health_workers': lambda: backend.get_all_health_workers(),
+        'get_user_predictions': lambda: backend.get_user_predictions(user_id, limit=50),
+        'get_patient_predictions': lambda: backend.get_patient_predictions(patient_id, limit=100),
+        'get_all_predictions': lambda: backend.get_all_predictions(limit=100),
+        'search_patients': lambda: backend.search_patients(search),
+    }
+    metrics = {}
+    for name, query in queries.items():
+        try:
+            query()
+            metrics[f'db:{name}'] = _timed(query, repeat)
+        except Exception as e:
+            print(f"⚠ Skipping storage benchmark {name}: {e}")
+    return metrics
+
+
+# Only the inference and export paths may import these (see check_import_time)
+HEAVY_MODULES = ('pandas', 'numpy', 'sklearn', 'scipy', 'joblib', 'reportlab', 'openpyxl')
+
+
+def import_profile(module='predictions.urls'):
+    """
+    Import times of a fresh interpreter setting up Django and importing one module
+
+    Runs `python -X importtime` in a subprocess, so nothing this process has
+    already imported is hidden.
+
+    Returns:
+        dict: total_ms (everything imported), module_ms (the module itself,
+              0 if Django setup had already imported it) and modules
+              ({name: (self ms, cumulative ms)})
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'mamacare_project.settings'))
+    code = f'import django; django.setup(); import {module}'
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, timeout=120
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed: {result.stderr.strip().splitlines()[-1:]}")
+
+    modules = {}
+    total_us = 0
+    for line in result.stderr.splitlines():
+        # import time:       769 |      71760 |       pymongo
+        if not line.startswith('import time:'):
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            self_us, cumulative_us = int(self_us), int(cumulative_us)
+        except ValueError:
+            continue  # Header line
+        # Nested imports (indented) are already in their parent's cumulative time
+        if not name.startswith('  '):
+            total_us += cumulative_us
+        modules[name.strip()] = (self_us / 1000, cumulative_us / 1000)
+    return {
+        'total_ms': total_us / 1000,
+        'module_ms': modules.get(module, (0, 0))[1],
+        'modules': modules,
+    }
+
+
+def heavy_imports(modules, allow=()):
+    """Top-level packages from HEAVY_MODULES (minus allow) among the imported module names"""
+    imported = {name.split('.')[0] for name in modules}
+    return sorted(imported.intersection(HEAVY_MODULES) - set(allow))
+
+
+def bench_import(repeat=10, module='predictions.urls'):
+    """Samples (ms) of the total import time of a fresh worker, one subprocess each"""
+    return {f'import:{module}': [import_profile(module)['total_ms'] for _ in range(repeat)]}
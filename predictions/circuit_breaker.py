@@ -0,0 +1,165 @@
+"""
+Circuit breaker for MamaCare's MongoDB access
+Lets DBService fail fast while MongoDB is unhealthy instead of waiting out driver timeouts
+"""
+import threading
+import time
+
+from pymongo import monitoring
+
+
+# Command failures that mean the server could not be reached, as opposed to
+# errors the server returned (duplicate keys, bad queries, ...)
+NETWORK_ERROR_TYPES = {
+    'AutoReconnect', 'ConnectionFailure', 'NetworkTimeout', 'NotPrimaryError',
+    'ServerSelectionTimeoutError', 'WaitQueueTimeoutError',
+}
+
+
+class CircuitBreaker:
+    """
+    Classic three-state circuit breaker
+
+    CLOSED: requests flow normally; consecutive failures are counted.
+    OPEN: requests are refused immediately until reset_timeout has passed.
+    HALF_OPEN: one probe request (on one thread) is let through; its outcome
+    closes or re-opens the breaker.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0, name='mongodb'):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_thread = None
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+        self.last_error = None
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        return self._state
+
+    def allow_request(self):
+        """True if a request may go to MongoDB right now"""
+        if self._state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            if self._state == self.OPEN:
+                if now - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._start_probe(now)
+                return True
+            if self._state == self.HALF_OPEN:
+                if self._probe_thread == threading.get_ident():
+                    return True
+                if now - self._probe_started >= self.reset_timeout:
+                    # The previous probe never reported back; try another
+                    self._start_probe(now)
+                    return True
+                return False
+            return True
+
+    def _start_probe(self, now):
+        self._probe_thread = threading.get_ident()
+        self._probe_started = now
+
+    def record_success(self):
+        """A request (or health check) succeeded: close the breaker"""
+        if self._state == self.CLOSED and self._failures == 0:
+            return
+        with self._lock:
+            if self._state != self.CLOSED:
+                print(f"✓ {self.name} circuit closed: MongoDB is healthy again")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_thread = None
+
+    def record_failure(self, error=None):
+        """A request failed because MongoDB was unreachable"""
+        with self._lock:
+            self.last_error = str(error) if error else self.last_error
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._open()
+
+    def trip(self, error=None):
+        """Open the breaker immediately (e.g. the driver lost every server)"""
+        with self._lock:
+            self.last_error = str(error) if error else self.last_error
+            self._open()
+
+    def _open(self):
+        if self._state != self.OPEN:
+            self.times_opened += 1
+            print(f"⚠ {self.name} circuit open: failing fast for {self.reset_timeout:.0f}s ({self.last_error})")
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probe_thread = None
+
+    def stats(self):
+        return {
+            'state': self._state,
+            'consecutive_failures': self._failures,
+            'times_opened': self.times_opened,
+            'last_error': self.last_error,
+        }
+
+
+class BreakerCommandListener(monitoring.CommandListener):
+    """Feeds command outcomes into the breaker"""
+
+    def __init__(self, breaker):
+        self.breaker = breaker
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.breaker.record_success()
+
+    def failed(self, event):
+        failure = event.failure or {}
+        if failure.get('errtype') in NETWORK_ERROR_TYPES:
+            self.breaker.record_failure(failure.get('errmsg'))
+
+
+class BreakerTopologyListener(monitoring.TopologyListener):
+    """
+    Feeds the driver's background server monitoring into the breaker
+
+    PyMongo keeps heartbeating every known server, so this both trips the
+    breaker as soon as the deployment becomes unreachable and closes it again
+    once a writable server reappears, without any request having to wait.
+    """
+
+    def __init__(self, breaker, on_available=None):
+        self.breaker = breaker
+        self.on_available = on_available
+
+    def opened(self, event):
+        pass
+
+    def closed(self, event):
+        pass
+
+    def description_changed(self, event):
+        description = event.new_description
+        if description.has_writable_server():
+            was_available = event.previous_description.has_writable_server()
+            self.breaker.record_success()
+            if not was_available and self.on_available:
+                self.on_available()
+            return
+        errors = [sd.error for sd in description.server_descriptions().values() if sd.error]
+        if errors:
+            self.breaker.trip(errors[0])
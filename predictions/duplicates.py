@@ -0,0 +1,285 @@
+"""
+Duplicate patient detection for MamaCare
+Finds patients re-registered under a new MC- ID with a slightly different spelling of their name
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from itertools import combinations, groupby
+from operator import itemgetter
+
+from django.conf import settings
+
+from .patient_search import name_tokens
+
+
+# Blocks larger than this (very common name pairs) are compared with a sliding
+# window over the sorted names instead of pairwise, keeping the job linear
+MAX_BLOCK_SIZE = 200
+WINDOW = 20
+
+# Candidates are written to the review collection in batches of this size
+WRITE_BATCH = 500
+
+# Applied in order, before the single-letter folds below. Prenasalised stops
+# (Mbugua/Bugua, Ndungu/Dungu, Njeri/Jeri) lose their leading nasal; the
+# digraphs common in Swahili, Kikuyu and Luo spellings get one symbol each
+_PRENASAL = re.compile(r'^(?:m(?=b)|n(?=[dgj]))')
+_DIGRAPHS = (
+    ('tch', 'C'), ('sh', 'X'), ('ch', 'C'), ('ny', 'Y'), ('ng', 'N'),
+    ('th', 'T'), ('dh', 'T'), ('gh', 'G'), ('kh', 'K'), ('ph', 'F'), ('x', 'ks'),
+)
+# l/r are interchangeable in Kikuyu and Luganda spellings; c/q/k, s/z, f/v and
+# the glides y/w (as vowels) are common spelling variants; lone h is silent
+_FOLDS = str.maketrans({'c': 'k', 'q': 'k', 'r': 'l', 'z': 's', 'v': 'f', 'y': 'i', 'w': 'u', 'h': None})
+_VOWELS = re.compile(r'[aeiou]')
+_REPEATS = re.compile(r'(.)\1+')
+
+
+@lru_cache(maxsize=65536)
+def phonetic_key(token):
+    """
+    Phonetic code for one name token, tuned for East African names
+
+    'Wanjiru' and 'Wanjirru' -> 'ANJL'; 'Mohamed' and 'Muhammad' -> 'MD';
+    'Otieno' and 'Atieno' -> 'ATN'.
+    """
+    word = re.sub(r'[^a-z]', '', token.lower())
+    if not word:
+        return ''
+    word = _PRENASAL.sub('', word)
+    for digraph, symbol in _DIGRAPHS:
+        word = word.replace(digraph, symbol)
+    word = word.translate(_FOLDS)
+    if not word:
+        return ''
+    # Keep whether the name starts with a vowel, drop every other vowel
+    head = 'A' if word[0] in 'aeiou' else word[0]
+    code = (head + _VOWELS.sub('', word[1:])).upper()
+    return _REPEATS.sub(r'\1', code)[:6]
+
+
+def block_keys(patient_name):
+    """
+    Blocking keys for a name: only patients sharing a key are ever compared
+
+    Returns:
+        list: Phonetic codes of every pair of name tokens (sorted, so token order does
+              not matter), the lone code of single-token names, and the exact sorted
+              tokens
+    """
+    tokens = [token for token in name_tokens(patient_name) if len(token) > 1]
+    codes = sorted({code for code in map(phonetic_key, tokens) if code})
+    keys = set()
+    if len(codes) == 1:
+        keys.add(f'p:{codes[0]}')
+    for first, second in combinations(codes, 2):
+        keys.add(f'p:{first} {second}')
+    if tokens:
+        keys.add('t:' + ' '.join(sorted(tokens)))
+    return sorted(keys)
+
+
+def jaro_winkler(a, b, prefix_weight=0.1):
+    """Jaro-Winkler similarity of two strings (0.0 - 1.0)"""
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    window = max(max(len(a), len(b)) // 2 - 1, 0)
+    a_matched = [False] * len(a)
+    b_matched = [False] * len(b)
+    matches = 0
+    for i, char in enumerate(a):
+        for j in range(max(0, i - window), min(len(b), i + window + 1)):
+            if not b_matched[j] and b[j] == char:
+                a_matched[i] = b_matched[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+    a_chars = [char for char, matched in zip(a, a_matched) if matched]
+    b_chars = [char for char, matched in zip(b, b_matched) if matched]
+    transpositions = sum(x != y for x, y in zip(a_chars, b_chars)) / 2
+    jaro = (matches / len(a) + matches / len(b) + (matches - transpositions) / matches) / 3
+    prefix = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefix += 1
+    return jaro + prefix * prefix_weight * (1 - jaro)
+
+
+@lru_cache(maxsize=65536)
+def _block_key_set(name):
+    return frozenset(block_keys(name))
+
+
+@lru_cache(maxsize=65536)
+def _tokens(name):
+    """Name tokens, cached: common names recur across thousands of comparisons"""
+    return tuple(name_tokens(name))
+
+
+@lru_cache(maxsize=262144)
+def _token_similarity(token, other):
+    if token == other:
+        return 1.0
+    code = phonetic_key(token)
+    if code and code == phonetic_key(other):
+        return 0.95
+    # Spelled alike but sounding different (Wanjiru / Wanjiku) is weaker evidence
+    return jaro_winkler(token, other) * 0.85
+
+
+def name_similarity(name_a, name_b):
+    """
+    How likely two names belong to the same person (0.0 - 1.0)
+
+    Each token of the shorter name is matched to its best counterpart in the
+    other name (so token order does not matter), phonetically equal tokens
+    scoring 0.95; every token only one name has costs a little.
+    """
+    tokens_a, tokens_b = _tokens(name_a or ''), _tokens(name_b or '')
+    if not tokens_a or not tokens_b:
+        return 0.0
+    shorter, longer = sorted((tokens_a, tokens_b), key=len)
+    per_token = [max(_token_similarity(token, other) for other in longer) for token in shorter]
+    score = sum(per_token) / len(per_token) * 0.97 ** (len(longer) - len(shorter))
+    return round(score, 4)
+
+
+def build_candidate(patient_a, patient_b, score, block_key):
+    """Review record for a likely duplicate pair (ordered by patient ID)"""
+    first, second = sorted((patient_a, patient_b), key=lambda p: p['patient_id'])
+    return {
+        '_id': f"{first['patient_id']}|{second['patient_id']}",
+        'patient_ids': [first['patient_id'], second['patient_id']],
+        'patient_names': [first.get('patient_name'), second.get('patient_name')],
+        'score': score,
+        'block_key': block_key,
+        'detected_at': datetime.utcnow()
+    }
+
+
+def _block_pairs(members):
+    """Pairs to compare within one block: all of them, or a sorted-neighbourhood window"""
+    if len(members) <= MAX_BLOCK_SIZE:
+        yield from combinations(members, 2)
+        return
+    ordered = sorted(members, key=lambda p: ' '.join(sorted(name_tokens(p.get('patient_name')))))
+    for i, patient in enumerate(ordered):
+        for other in ordered[i + 1:i + 1 + WINDOW]:
+            yield patient, other
+
+
+def _compared_earlier(pair, patient_a, patient_b, key, windowed, windowed_pairs):
+    """
+    Whether the pair was already scored in an earlier block
+
+    Blocks arrive in key order, so a pair sharing a smaller key with a block
+    that compared all its pairs has been; oversized blocks (windowed) only
+    compared neighbours, which are remembered in windowed_pairs.
+    """
+    if pair in windowed_pairs:
+        return True
+    shared = _block_key_set(patient_a.get('patient_name')) & _block_key_set(patient_b.get('patient_name'))
+    return any(other < key and other not in windowed for other in shared)
+
+
+def find_duplicates(backend, threshold=None):
+    """
+    Scan every patient for likely duplicates and record them for review
+
+    The backend streams patients grouped by blocking key, in key order; only
+    patients within a block are compared, one block in memory at a time, and
+    each block's candidates are written before the next is read. The work
+    grows with the number of patients rather than pairs.
+
+    Returns:
+        dict: blocks with two or more patients, pairs compared and candidates recorded
+    """
+    threshold = threshold if threshold is not None else settings.DUPLICATE_MATCH_THRESHOLD
+    blocks = compared = recorded = 0
+    # Oversized blocks (a handful of very common names) and the pairs they
+    # compared: at most WINDOW per member, unlike a set of every pair
+    windowed = set()
+    windowed_pairs = set()
+    for key, rows in groupby(backend.iter_block_members(), key=itemgetter(0)):
+        members = [patient for _, patient in rows]
+        if len(members) < 2:
+            continue
+        blocks += 1
+        oversized = len(members) > MAX_BLOCK_SIZE
+        if oversized:
+            windowed.add(key)
+        batch = []
+        for patient_a, patient_b in _block_pairs(members):
+            pair = tuple(sorted((patient_a['patient_id'], patient_b['patient_id'])))
+            if pair[0] == pair[1] or _compared_earlier(pair, patient_a, patient_b, key, windowed, windowed_pairs):
+                continue
+            if oversized:
+                windowed_pairs.add(pair)
+            compared += 1
+            score = name_similarity(patient_a.get('patient_name'), patient_b.get('patient_name'))
+            if score >= threshold:
+                batch.append(build_candidate(patient_a, patient_b, score, key))
+                if len(batch) >= WRITE_BATCH:
+                    recorded += backend.save_duplicate_candidates(batch)
+                    batch = []
+        if batch:
+            recorded += backend.save_duplicate_candidates(batch)
+
+    return {
+        'blocks': blocks,
+        'pairs_compared': compared,
+        'candidates': recorded,
+    }
+
+
+def check_new_patient(backend, patient_id, patient_name, threshold=None):
+    """
+    Compare one (newly registered) patient against those sharing a blocking key
+
+    Returns:
+        int: Number of duplicate candidates recorded
+    """
+    threshold = threshold if threshold is not None else settings.DUPLICATE_MATCH_THRESHOLD
+    keys = block_keys(patient_name)
+    if not keys:
+        return 0
+    patient = {'patient_id': patient_id, 'patient_name': patient_name}
+    own_keys = set(keys)
+    candidates = []
+    for other in backend.find_patients_by_block_keys(keys, limit=MAX_BLOCK_SIZE):
+        if other['patient_id'] == patient_id:
+            continue
+        score = name_similarity(patient_name, other.get('patient_name'))
+        if score >= threshold:
+            shared = sorted(own_keys.intersection(block_keys(other.get('patient_name'))))
+            candidates.append(build_candidate(patient, other, score, shared[0] if shared else keys[0]))
+    return backend.save_duplicate_candidates(candidates) if candidates else 0
+
+
+_executor = None
+
+
+def _get_executor():
+    """Lazily create the single background worker for incremental checks"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='duplicate-check')
+    return _executor
+
+
+def _check_quietly(backend, patient_id, patient_name):
+    try:
+        check_new_patient(backend, patient_id, patient_name)
+    except Exception as e:
+        print(f"Error checking patient {patient_id} for duplicates: {e}")
+
+
+def check_new_patient_async(backend, patient_id, patient_name):
+    """Queue check_new_patient off the request thread"""
+    _get_executor().submit(_check_quietly, backend, patient_id, patient_name)
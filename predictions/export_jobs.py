@@ -0,0 +1,282 @@
+"""
+Background export jobs for MamaCare
+Runs CSV/Excel/PDF generation off the request path and stores the artifact in MEDIA_ROOT
+"""
+import hashlib
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .db_service import db_service
+from .exports import (
+    EXPORT_PROJECTION, iter_csv, label_health_workers, write_summary_pdf, write_xlsx
+)
+from .models import ExportJob
+
+
+CONTENT_TYPES = {
+    ExportJob.FORMAT_CSV: 'text/csv',
+    ExportJob.FORMAT_XLSX: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    ExportJob.FORMAT_PDF: 'application/pdf',
+}
+
+# Running jobs that have not finished within this window are assumed to be orphaned
+# (e.g. the worker that owned them was restarted) and are no longer shared
+STALE_AFTER = timedelta(hours=1)
+
+# With in-process jobs nothing runs `manage.py run_export_jobs --purge`, so
+# submit_export() queues a purge of expired artifacts at most this often
+PURGE_EVERY = timedelta(hours=1)
+
+_executor = None
+_last_purge = None
+_purge_lock = threading.Lock()
+
+
+def _get_executor():
+    """Lazily create the in-process worker pool"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.EXPORT_JOB_WORKERS,
+            thread_name_prefix='export-job'
+        )
+    return _executor
+
+
+def job_fingerprint(export_format, start_date=None, end_date=None):
+    """Stable key for an export request; identical requests share a job"""
+    key = f"{export_format}|{start_date or ''}|{end_date or ''}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def submit_export(export_format, start_date=None, end_date=None, user=None):
+    """
+    Queue an export, or return the job already serving an identical request
+
+    Args:
+        export_format: One of ExportJob.FORMAT_CSV / FORMAT_XLSX / FORMAT_PDF
+        start_date: Optional date lower bound
+        end_date: Optional date upper bound
+        user: Django user requesting the export
+
+    Returns:
+        tuple: (ExportJob, created) where created is False for a shared job
+    """
+    fingerprint = job_fingerprint(export_format, start_date, end_date)
+    if settings.EXPORT_JOBS_IN_PROCESS:
+        _schedule_purge()
+
+    existing = _find_reusable_job(fingerprint)
+    if existing:
+        if existing.status == ExportJob.STATUS_PENDING and settings.EXPORT_JOBS_IN_PROCESS:
+            # Re-dispatch in case the worker that queued it has since restarted;
+            # claim_job() guarantees it still only runs once
+            _get_executor().submit(run_job, existing.pk)
+        return existing, False
+
+    try:
+        with transaction.atomic():
+            job = ExportJob.objects.create(
+                export_format=export_format,
+                start_date=start_date,
+                end_date=end_date,
+                fingerprint=fingerprint,
+                requested_by=user if user and user.is_authenticated else None,
+            )
+    except IntegrityError:
+        # Another worker queued the same export between our lookup and insert
+        existing = _find_reusable_job(fingerprint)
+        if existing:
+            return existing, False
+        raise
+
+    if settings.EXPORT_JOBS_IN_PROCESS:
+        _get_executor().submit(run_job, job.pk)
+    return job, True
+
+
+def _find_reusable_job(fingerprint):
+    """Return an active or recently finished job with this fingerprint, if any"""
+    now = timezone.now()
+
+    # Release jobs orphaned by a dead worker so they stop blocking new requests
+    ExportJob.objects.filter(
+        fingerprint=fingerprint,
+        status=ExportJob.STATUS_RUNNING,
+        started_at__lt=now - STALE_AFTER,
+    ).update(status=ExportJob.STATUS_FAILED, error='Abandoned by worker', finished_at=now)
+
+    active = ExportJob.objects.filter(
+        fingerprint=fingerprint, status__in=ExportJob.ACTIVE_STATUSES
+    ).first()
+    if active:
+        return active
+
+    reuse_after = now - timedelta(seconds=settings.EXPORT_JOB_REUSE_SECONDS)
+    done = ExportJob.objects.filter(
+        fingerprint=fingerprint,
+        status=ExportJob.STATUS_DONE,
+        finished_at__gte=reuse_after,
+    ).first()
+    if done and os.path.exists(done.file_path):
+        return done
+    return None
+
+
+def claim_job(job_id):
+    """Atomically move a pending job to running; False if someone else has it"""
+    return ExportJob.objects.filter(
+        pk=job_id, status=ExportJob.STATUS_PENDING
+    ).update(status=ExportJob.STATUS_RUNNING, started_at=timezone.now()) == 1
+
+
+def run_job(job_id):
+    """Generate the artifact for a job (executed in a worker thread or process)"""
+    try:
+        if not claim_job(job_id):
+            return
+        job = ExportJob.objects.get(pk=job_id)
+        try:
+            _generate(job)
+            outcome = {
+                'status': ExportJob.STATUS_DONE,
+                'file_path': job.file_path,
+                'file_name': job.file_name,
+                'file_size': job.file_size,
+                'row_count': job.row_count,
+            }
+        except Exception as e:
+            print(f"❌ Export job {job_id} failed: {e}")
+            traceback.print_exc()
+            outcome = {'status': ExportJob.STATUS_FAILED, 'error': str(e)}
+
+        # Only finish a job we still own: _find_reusable_job() may have declared it
+        # abandoned meanwhile and queued a replacement, whose result must stand
+        finished = ExportJob.objects.filter(
+            pk=job_id, status=ExportJob.STATUS_RUNNING
+        ).update(finished_at=timezone.now(), **outcome)
+        if not finished:
+            print(f"⚠ Export job {job_id} was marked abandoned while running; discarding its result")
+            if job.file_path and os.path.exists(job.file_path):
+                os.remove(job.file_path)
+    finally:
+        close_old_connections()
+
+
+def _date_bounds(job):
+    """Convert the job's date filters to the datetime range used by db_service"""
+    if job.start_date and job.end_date:
+        return (
+            datetime.combine(job.start_date, time.min),
+            datetime.combine(job.end_date, time(23, 59, 59)),
+        )
+    return None, None
+
+
+def _generate(job):
+    """Write the export to a temp file in EXPORT_JOBS_DIR, then move it into place"""
+    export_dir = Path(settings.EXPORT_JOBS_DIR)
+    export_dir.mkdir(parents=True, exist_ok=True)
+
+    stamp = timezone.localtime(job.created_at).strftime('%Y%m%d')
+    if job.export_format == ExportJob.FORMAT_PDF:
+        file_name = f'mamacare_summary_{stamp}.pdf'
+    else:
+        file_name = f'mamacare_predictions_{stamp}.{job.export_format}'
+    final_path = export_dir / f'{job.pk}_{file_name}'
+    tmp_path = export_dir / f'.{job.pk}_{file_name}.part'
+
+    start, end = _date_bounds(job)
+    try:
+        rows = _write_artifact(job, tmp_path, start, end)
+        os.replace(tmp_path, final_path)
+    except BaseException:
+        # Don't leave a partial file behind: nothing would ever purge it
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+    job.file_path = str(final_path)
+    job.file_name = file_name
+    job.file_size = final_path.stat().st_size
+    job.row_count = rows
+
+
+def _write_artifact(job, tmp_path, start, end):
+    """Write the export to tmp_path; returns the number of data rows (None for the PDF summary)"""
+    rows = None
+    if job.export_format == ExportJob.FORMAT_CSV:
+        rows = 0
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            for line in iter_csv(db_service.iter_predictions(start, end, projection=EXPORT_PROJECTION)):
+                f.write(line)
+                rows += 1
+        rows -= 1  # header line
+    elif job.export_format == ExportJob.FORMAT_XLSX:
+        with open(tmp_path, 'wb') as f:
+            rows = write_xlsx(db_service.iter_predictions(start, end, projection=EXPORT_PROJECTION), f)
+    elif job.export_format == ExportJob.FORMAT_PDF:
+        summary = label_health_workers(db_service.get_report_summary(start, end))
+        with open(tmp_path, 'wb') as f:
+            write_summary_pdf(summary, f)
+    else:
+        raise ValueError(f"Unknown export format: {job.export_format}")
+    return rows
+
+
+def run_pending_jobs(limit=None):
+    """Process queued jobs in this process (used by the run_export_jobs command)"""
+    processed = 0
+    pending = ExportJob.objects.filter(status=ExportJob.STATUS_PENDING).order_by('created_at')
+    for job_id in pending.values_list('pk', flat=True)[:limit]:
+        run_job(job_id)
+        processed += 1
+    return processed
+
+
+def purge_expired_artifacts():
+    """Delete artifacts (and their job rows) older than EXPORT_JOB_RETENTION_HOURS"""
+    cutoff = timezone.now() - timedelta(hours=settings.EXPORT_JOB_RETENTION_HOURS)
+    expired = ExportJob.objects.filter(
+        status__in=[ExportJob.STATUS_DONE, ExportJob.STATUS_FAILED],
+        finished_at__lt=cutoff,
+    )
+    removed = 0
+    for job in expired:
+        if job.file_path:
+            try:
+                os.remove(job.file_path)
+            except FileNotFoundError:
+                pass  # already gone (or purged by another worker)
+        job.delete()
+        removed += 1
+    return removed
+
+
+def _schedule_purge():
+    """Queue purge_expired_artifacts() on the in-process pool, at most once per PURGE_EVERY per process"""
+    global _last_purge
+    now = timezone.now()
+    with _purge_lock:
+        if _last_purge is not None and now - _last_purge < PURGE_EVERY:
+            return
+        _last_purge = now
+    _get_executor().submit(_purge_in_background)
+
+
+def _purge_in_background():
+    try:
+        removed = purge_expired_artifacts()
+        if removed:
+            print(f"✓ Purged {removed} expired export job(s)")
+    except Exception as e:
+        print(f"⚠ Could not purge expired export jobs: {e}")
+    finally:
+        close_old_connections()
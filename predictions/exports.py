@@ -0,0 +1,210 @@
+"""
+Export helpers for MamaCare
+Turns prediction documents into report rows without holding the dataset in memory
+"""
+import csv
+from datetime import datetime
+
+
+# Columns written to every tabular export (CSV, Excel)
+EXPORT_HEADERS = [
+    'Date', 'Patient ID', 'Patient Name', 'Health Worker ID', 'Age', 'BMI',
+    'Gestational Age', 'Systolic BP', 'Diastolic BP', 'General Risk',
+    'Preeclampsia Risk', 'GDM Risk', 'Overall Assessment'
+]
+
+# Only the fields needed to build a row are fetched from MongoDB
+EXPORT_PROJECTION = {
+    '_id': 0,
+    'created_at': 1,
+    'patient_id': 1,
+    'patient_name': 1,
+    'user_id': 1,
+    'input_data.age': 1,
+    'input_data.bmi_val': 1,
+    'input_data.gestational_age_weeks': 1,
+    'input_data.systolic_bp': 1,
+    'input_data.diastolic_bp': 1,
+    'general_risk': 1,
+    'preeclampsia_risk': 1,
+    'gdm_risk': 1,
+    'overall_assessment': 1,
+}
+
+
+def prediction_to_row(pred):
+    """Convert a prediction document into a list matching EXPORT_HEADERS"""
+    input_data = pred.get('input_data', {})
+    created_at = pred.get('created_at')
+    return [
+        created_at.strftime('%Y-%m-%d %H:%M:%S') if created_at else '',
+        pred.get('patient_id', ''),
+        pred.get('patient_name', ''),
+        pred.get('user_id', ''),
+        input_data.get('age', ''),
+        input_data.get('bmi_val', ''),
+        input_data.get('gestational_age_weeks', ''),
+        input_data.get('systolic_bp', ''),
+        input_data.get('diastolic_bp', ''),
+        pred.get('general_risk', ''),
+        pred.get('preeclampsia_risk', ''),
+        pred.get('gdm_risk', ''),
+        pred.get('overall_assessment', '')
+    ]
+
+
+class _Echo:
+    """File-like object whose write() hands the formatted line straight back"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(predictions):
+    """
+    Yield CSV-encoded lines for an iterable of prediction documents
+
+    Args:
+        predictions: Iterable of prediction documents (typically a cursor)
+
+    Yields:
+        str: One CSV line at a time, header first
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_HEADERS)
+    for pred in predictions:
+        yield writer.writerow(prediction_to_row(pred))
+
+
+# Excel caps a worksheet at 1,048,576 rows (one is used by the header)
+XLSX_MAX_ROWS_PER_SHEET = 1048575
+
+
+def write_xlsx(predictions, fileobj):
+    """
+    Write predictions to an Excel workbook using openpyxl's write-only mode
+
+    Rows are serialised as they arrive, so memory stays bounded however many
+    predictions the iterable yields. Overflowing rows continue on a new sheet.
+
+    Args:
+        predictions: Iterable of prediction documents (typically a cursor)
+        fileobj: Binary file object the .xlsx is saved into
+
+    Returns:
+        int: Number of prediction rows written
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_rows = 0
+    count = 0
+
+    for pred in predictions:
+        if sheet is None or sheet_rows >= XLSX_MAX_ROWS_PER_SHEET:
+            title = 'Predictions' if sheet is None else f'Predictions {len(workbook.sheetnames) + 1}'
+            sheet = workbook.create_sheet(title=title)
+            sheet.append(EXPORT_HEADERS)
+            sheet_rows = 0
+        row = prediction_to_row(pred)
+        # Keep a real datetime so Excel can sort and filter the column
+        row[0] = pred.get('created_at') or ''
+        sheet.append(row)
+        sheet_rows += 1
+        count += 1
+
+    if sheet is None:
+        workbook.create_sheet(title='Predictions').append(EXPORT_HEADERS)
+
+    workbook.save(fileobj)
+    return count
+
+
+def label_health_workers(summary):
+    """Attach display names to the summary's top health workers in one query"""
+    from .users import display_name, user_directory
+
+    health_workers = summary.get('health_workers', [])
+    users = user_directory.resolve(hw['_id'] for hw in health_workers)
+    for hw in health_workers:
+        user = users.get(hw['_id'])
+        if user:
+            hw['name'] = display_name(user)
+    return summary
+
+
+def write_summary_pdf(summary, fileobj):
+    """
+    Render the aggregated report summary as a PDF
+
+    Args:
+        summary: dict returned by db_service.get_report_summary()
+        fileobj: Binary file object the PDF is written into
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c5aa0')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f5f5f5')]),
+        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+    ])
+
+    start_date = summary.get('start_date')
+    end_date = summary.get('end_date')
+    if start_date and end_date:
+        period = f"{start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}"
+    else:
+        period = 'All time'
+
+    story = [
+        Paragraph('MamaCare Prediction Summary Report', styles['Title']),
+        Paragraph(f'Period: {period}', styles['Normal']),
+        Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}", styles['Normal']),
+        Spacer(1, 0.5 * cm),
+    ]
+
+    totals = summary.get('totals', {})
+    story.append(Paragraph('Overview', styles['Heading2']))
+    overview = Table([
+        ['Measure', 'Value'],
+        ['Total predictions', totals.get('total_predictions', 0)],
+        ['High risk cases', totals.get('high_risk_count', 0)],
+        ['Low risk cases', totals.get('low_risk_count', 0)],
+        ['Preeclampsia cases', totals.get('preeclampsia_count', 0)],
+        ['GDM cases', totals.get('gdm_count', 0)],
+        ['Unique patients', totals.get('unique_patients', 0)],
+        ['Health workers', totals.get('unique_health_workers', 0)],
+    ], colWidths=[8 * cm, 4 * cm])
+    overview.setStyle(table_style)
+    story += [overview, Spacer(1, 0.5 * cm)]
+
+    monthly = summary.get('monthly', [])
+    if monthly:
+        story.append(Paragraph('Monthly Trend', styles['Heading2']))
+        rows = [['Month', 'Predictions', 'High Risk', 'Preeclampsia', 'GDM']]
+        for item in monthly:
+            rows.append([item['_id'], item['count'], item['high_risk'], item['preeclampsia'], item['gdm']])
+        trend = Table(rows, repeatRows=1)
+        trend.setStyle(table_style)
+        story += [trend, Spacer(1, 0.5 * cm)]
+
+    health_workers = summary.get('health_workers', [])
+    if health_workers:
+        story.append(Paragraph('Most Active Health Workers', styles['Heading2']))
+        rows = [['Health Worker', 'Predictions', 'High Risk']]
+        for hw in health_workers:
+            rows.append([hw.get('name') or f"User ID: {hw['_id']}", hw['total_predictions'], hw['high_risk_count']])
+        workers = Table(rows, repeatRows=1)
+        workers.setStyle(table_style)
+        story.append(workers)
+
+    SimpleDocTemplate(fileobj, pagesize=A4, title='MamaCare Summary Report').build(story)
@@ -0,0 +1,121 @@
+"""
+Concurrent page queries for MamaCare
+Runs a view's independent storage queries side by side on a shared pool, bounded by a per-request deadline
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pymongo
+from django.conf import settings
+
+
+# MongoDB gets this much longer than fan_out waits, so a query that is aborted
+# on the server is always one fan_out has already given up on (never a result
+# that arrives in time but empty)
+SERVER_TIMEOUT_GRACE_SECONDS = 0.25
+
+_deadline = contextvars.ContextVar('mamacare_fan_out_deadline', default=None)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Lazily create the worker pool shared by every request in this process"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.PAGE_QUERY_WORKERS,
+                    thread_name_prefix='page-query'
+                )
+    return _executor
+
+
+def time_left():
+    """Seconds until the deadline of the fan_out query running in this context, or None outside one"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def _bounded(query, deadline):
+    """Run query with its MongoDB operations limited to the time left until deadline"""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("Deadline passed before the query started")
+    _deadline.set(deadline)
+    # pymongo sends the time left as maxTimeMS on each command (and bounds
+    # connection checkout and socket waits), so the server aborts a late query
+    # instead of it holding a pool thread after fan_out has stopped waiting
+    with pymongo.timeout(remaining + SERVER_TIMEOUT_GRACE_SECONDS):
+        return query()
+
+
+def run_with_deadline(query, timeout=None):
+    """
+    Run a single query in the calling thread, bounded like a fan_out query
+
+    For views with only one query, where the pool would add a thread hop and
+    no concurrency. Its MongoDB commands are limited to the time left on the
+    server, and time_left() reports the deadline while it runs.
+
+    Args:
+        query: Zero-argument callable
+        timeout: Seconds it may take (default PAGE_QUERY_TIMEOUT_SECONDS)
+
+    Returns:
+        The query's result; whatever it raises (including pymongo's timeout
+        errors once the deadline passes) propagates
+    """
+    timeout = timeout if timeout is not None else settings.PAGE_QUERY_TIMEOUT_SECONDS
+    # A copied context, so the deadline does not outlive the query in this thread
+    return contextvars.copy_context().run(_bounded, query, time.monotonic() + timeout)
+
+
+def fan_out(queries, timeout=None, defaults=None):
+    """
+    Run independent queries concurrently and collect whatever finishes in time
+
+    Each query runs in a copy of the caller's context (so per-request
+    context variables follow it onto the pool). A query that raises or is
+    still running at the deadline gets its default instead. Its MongoDB
+    commands are bounded by the deadline on the server too, so a late query
+    is aborted shortly afterwards rather than left running; one still queued
+    for a thread is cancelled.
+
+    Args:
+        queries: {name: zero-argument callable}
+        timeout: Seconds to wait for all of them (default PAGE_QUERY_TIMEOUT_SECONDS)
+        defaults: {name: value used when that query fails or times out} (default None)
+
+    Returns:
+        tuple: ({name: result}, [names that failed or timed out])
+    """
+    timeout = timeout if timeout is not None else settings.PAGE_QUERY_TIMEOUT_SECONDS
+    defaults = defaults or {}
+    executor = _get_executor()
+    started = time.monotonic()
+    deadline = started + timeout
+    futures = {
+        name: executor.submit(contextvars.copy_context().run, _bounded, query, deadline)
+        for name, query in queries.items()
+    }
+    wait(futures.values(), timeout=timeout)
+
+    results = {}
+    missing = []
+    for name, future in futures.items():
+        if future.done() and future.exception() is None:
+            results[name] = future.result()
+            continue
+        if future.done():
+            print(f"⚠ Warning: Page query '{name}' failed: {future.exception()}")
+        else:
+            future.cancel()
+            print(f"⚠ Warning: Page query '{name}' timed out after {time.monotonic() - started:.2f}s")
+        results[name] = defaults.get(name)
+        missing.append(name)
+    return results, missing
@@ -0,0 +1,309 @@
+"""
+HTTP load testing for MamaCare
+Drives a running server with a mix of health worker and staff traffic and summarises latency per endpoint
+"""
+import html
+import random
+import re
+import threading
+import time
+from http.cookiejar import CookieJar
+from urllib import request as urlrequest
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urljoin
+
+from .synthetic import SyntheticPopulation
+
+
+# Relative frequency of each action, by kind of client
+WORKER_MIX = {
+    'login': 3,
+    'predict': 30,
+    'history': 25,
+    'patient_lookup': 10,
+    'patient_detail': 20,
+}
+STAFF_MIX = {
+    'login': 3,
+    'dashboard': 25,
+    'analytics_data': 20,
+    'history': 10,
+    'patient_detail': 15,
+    'export_csv': 5,
+}
+
+PATIENT_ID_RE = re.compile(r'\bMC-[0-9A-Z]{6}\b')
+PANEL_URL_RE = re.compile(r'data-panel-url="([^"]+)"')
+
+
+def percentile(sorted_values, pct):
+    """The pct-th percentile (0-100) of an already sorted list, interpolating between ranks"""
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize_latencies(latencies_ms, errors, seconds):
+    """Count, throughput and latency percentiles (ms) of one endpoint's successful requests"""
+    values = sorted(latencies_ms)
+    return {
+        'requests': len(values) + errors,
+        'errors': errors,
+        'throughput_rps': round((len(values) + errors) / seconds, 2) if seconds else None,
+        'mean_ms': round(sum(values) / len(values), 2) if values else None,
+        'p50_ms': round(percentile(values, 50), 2) if values else None,
+        'p95_ms': round(percentile(values, 95), 2) if values else None,
+        'p99_ms': round(percentile(values, 99), 2) if values else None,
+        'max_ms': round(values[-1], 2) if values else None,
+    }
+
+
+class _NoRedirect(urlrequest.HTTPRedirectHandler):
+    """Return redirects as responses so each request is timed on its own"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class LoadRecorder:
+    """Thread-safe latency samples per endpoint (nothing is kept until recording starts)"""
+
+    def __init__(self):
+        self.recording = False
+        self.samples = {}
+        self.errors = {}
+        self.statuses = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, elapsed_ms, status, ok):
+        if not self.recording:
+            return
+        with self._lock:
+            if ok:
+                self.samples.setdefault(endpoint, []).append(elapsed_ms)
+            else:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            statuses = self.statuses.setdefault(endpoint, {})
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+
+class LoadClient:
+    """
+    One simulated user: a cookie jar (session + CSRF cookies) and the actions it performs
+
+    Args:
+        base_url: Server to drive, e.g. http://127.0.0.1:8000/
+        username / password: Credentials of an existing account
+        recorder: LoadRecorder shared by all clients
+        known_patients: Shared list of patient IDs seen in responses (grown as clients predict)
+        rng: random.Random for this client's choices
+        timeout: Per-request timeout in seconds
+    """
+
+    def __init__(self, base_url, username, password, recorder, known_patients, rng, timeout=30):
+        self.base_url = base_url if base_url.endswith('/') else base_url + '/'
+        self.username = username
+        self.password = password
+        self.recorder = recorder
+        self.known_patients = known_patients
+        self.rng = rng
+        self.timeout = timeout
+        self.population = SyntheticPopulation(seed=rng.random())
+        self._new_session()
+
+    def _new_session(self):
+        self.cookies = CookieJar()
+        self.opener = urlrequest.build_opener(urlrequest.HTTPCookieProcessor(self.cookies), _NoRedirect())
+
+    def _csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def request(self, endpoint, path, data=None, expect_redirect=False):
+        """
+        Send one request, read the whole body and record its latency under endpoint
+
+        Returns:
+            tuple: (status, body text, Location header or None)
+        """
+        url = urljoin(self.base_url, path.lstrip('/'))
+        headers = {}
+        body = None
+        if data is not None:
+            body = urlencode(dict(data, csrfmiddlewaretoken=self._csrf_token())).encode()
+            # Django checks the Referer of HTTPS form posts
+            headers = {'Referer': url, 'Content-Type': 'application/x-www-form-urlencoded'}
+        req = urlrequest.Request(url, data=body, headers=headers)
+
+        started = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                status, content, location = response.status, response.read(), None
+        except HTTPError as e:
+            status, content, location = e.code, e.read(), e.headers.get('Location')
+        except (URLError, OSError):
+            status, content, location = 0, b'', None
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if expect_redirect:
+            ok = status == 302
+        else:
+            # Being sent to the login page means the session was lost
+            ok = 0 < status < 400 and not (location and '/login/' in location)
+        self.recorder.record(endpoint, elapsed_ms, status, ok)
+        return status, content.decode('utf-8', 'replace'), location
+
+    def _remember_patients(self, text):
+        found = PATIENT_ID_RE.findall(text)
+        if found:
+            self.known_patients.extend(found[:5])
+            # Keep the shared list bounded
+            if len(self.known_patients) > 5000:
+                del self.known_patients[:1000]
+
+    def _known_patient(self):
+        return self.rng.choice(self.known_patients) if self.known_patients else None
+
+    # Actions
+    def login(self):
+        """Start a fresh session: fetch the form for the CSRF cookie, then post the credentials"""
+        self._new_session()
+        self.request('login_form', '/login/')
+        status, _, _ = self.request('login', '/login/', {'username': self.username, 'password': self.password},
+                                    expect_redirect=True)
+        return status == 302
+
+    def predict(self):
+        visit = self.population.visit({'patient_id': None, 'patient_name': self.population.patient_name()})
+        data = dict(visit['input_data'], patient_name=visit['patient_name'], patient_id='')
+        existing = self._known_patient()
+        if existing and self.rng.random() < 0.6:
+            data['patient_id'] = existing
+        _, text, _ = self.request('predict', '/predict/', data)
+        self._remember_patients(text)
+
+    def history(self):
+        _, text, _ = self.request('history', '/history/')
+        self._remember_patients(text)
+
+    def patient_lookup(self):
+        patient_id = self._known_patient()
+        if patient_id:
+            self.request('history_lookup', f'/history/?{urlencode({"patient_id": patient_id})}')
+        else:
+            self.history()
+
+    def patient_detail(self):
+        patient_id = self._known_patient()
+        if patient_id:
+            self.request('patient_detail', f'/patient/{patient_id}/')
+        else:
+            self.history()
+
+    def dashboard(self):
+        """The dashboard shell, then each panel it loads (as the browser would)"""
+        _, text, _ = self.request('dashboard', '/dashboard/')
+        for panel_url in PANEL_URL_RE.findall(text):
+            _, panel, _ = self.request('dashboard_panel', html.unescape(panel_url))
+            self._remember_patients(panel)
+
+    def analytics_data(self):
+        self.request('analytics_data', f'/manage/analytics/data/?days={self.rng.choice([7, 30, 90])}')
+
+    def export_csv(self):
+        self.request('export_csv', '/manage/export/csv/')
+
+
+def run_load_test(base_url, workers, staff, clients, staff_clients, duration, warmup=0, think_ms=500,
+                  seed=0, worker_mix=None, staff_mix=None, timeout=30, progress=None):
+    """
+    Run concurrent clients against base_url and summarise what they saw
+
+    Args:
+        workers / staff: Lists of (username, password) for health worker and staff clients
+        clients: Total concurrent clients; staff_clients of them use staff accounts
+        duration: Seconds of measured traffic (after warmup seconds that are not recorded)
+        think_ms: Mean pause between a client's actions (exponentially distributed)
+        seed: Seed for every client's choices
+        progress: Optional callable(str) for status lines
+
+    Returns:
+        dict: Run settings, overall and per-endpoint summaries, and raw latencies
+    """
+    worker_mix = worker_mix or WORKER_MIX
+    staff_mix = staff_mix or STAFF_MIX
+    recorder = LoadRecorder()
+    known_patients = []
+    stop = threading.Event()
+
+    def client_loop(index):
+        is_staff = index < staff_clients
+        accounts = staff if is_staff else workers
+        username, password = accounts[index % len(accounts)]
+        mix = staff_mix if is_staff else worker_mix
+        actions, weights = list(mix), list(mix.values())
+        rng = random.Random(f'{seed}:{index}')
+        client = LoadClient(base_url, username, password, recorder, known_patients, rng, timeout)
+        client.login()
+        while not stop.is_set():
+            action = rng.choices(actions, weights)[0]
+            try:
+                getattr(client, action)()
+            except Exception as e:
+                recorder.record(action, 0, f'exception: {type(e).__name__}', False)
+            if think_ms:
+                stop.wait(rng.expovariate(1000 / think_ms))
+
+    threads = [
+        threading.Thread(target=client_loop, args=(index,), name=f'loadtest-client-{index}', daemon=True)
+        for index in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    if warmup:
+        if progress:
+            progress(f"Warming up for {warmup}s...")
+        time.sleep(warmup)
+    recorder.recording = True
+    started = time.perf_counter()
+    if progress:
+        progress(f"Measuring for {duration}s with {clients} clients ({staff_clients} staff)...")
+    time.sleep(duration)
+    recorder.recording = False
+    seconds = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join(timeout + 5)
+
+    endpoints = sorted(set(recorder.samples) | set(recorder.errors))
+    all_latencies = [value for samples in recorder.samples.values() for value in samples]
+    return {
+        'config': {
+            'base_url': base_url,
+            'clients': clients,
+            'staff_clients': staff_clients,
+            'duration_seconds': duration,
+            'warmup_seconds': warmup,
+            'think_ms': think_ms,
+            'seed': seed,
+            'worker_mix': worker_mix,
+            'staff_mix': staff_mix,
+        },
+        'elapsed_seconds': round(seconds, 2),
+        'overall': summarize_latencies(all_latencies, sum(recorder.errors.values()), seconds),
+        'endpoints': {
+            endpoint: dict(
+                summarize_latencies(recorder.samples.get(endpoint, []), recorder.errors.get(endpoint, 0), seconds),
+                statuses=recorder.statuses.get(endpoint, {})
+            )
+            for endpoint in endpoints
+        },
+        'latencies_ms': {
+            endpoint: [round(value, 2) for value in samples] for endpoint, samples in recorder.samples.items()
+        },
+    }
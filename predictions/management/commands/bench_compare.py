@@ -0,0 +1,98 @@
+"""
+Django management command to compare a benchmark run against a baseline and fail on regressions
+Usage: python manage.py bench_compare --baseline <run id | git commit | previous> [--candidate latest] [--alpha 0.01] [--threshold 5]
+
+A metric regresses when the candidate's samples are significantly slower
+(one-sided Mann-Whitney U test) and its median grew by more than --threshold
+percent. Exits non-zero when any metric regresses or is missing from either
+run, so it can gate CI. The baseline is looked up among runs of the
+candidate's kind unless --kind says otherwise.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from predictions.benchmarks import ResultStore, compare_runs
+
+
+class Command(BaseCommand):
+    help = 'Compare a recorded benchmark run with a baseline and exit non-zero on significant regressions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--baseline', default='previous',
+                            help="Baseline run: 'previous', 'latest', a run id prefix, a git commit or a file path")
+        parser.add_argument('--candidate', default='latest', help='Run to check (same forms as --baseline)')
+        parser.add_argument('--kind', default=None,
+                            help="Only consider runs of this kind ('benchmark' or 'http_load_test'; "
+                                 "default: the candidate's kind for the baseline)")
+        parser.add_argument('--alpha', type=float, default=0.01, help='Significance level')
+        parser.add_argument('--threshold', type=float, default=5.0,
+                            help='Ignore median changes smaller than this many percent')
+        parser.add_argument('--store', default=None, help='Results directory (default: BENCHMARK_RESULTS_DIR)')
+        parser.add_argument('--list', action='store_true', help='List recorded runs and exit')
+
+    def handle(self, *args, **options):
+        store = ResultStore(options['store'])
+
+        if options['list']:
+            for record in store.runs(options['kind']):
+                self.stdout.write(
+                    f"{record['id']}  {record.get('git_commit') or '-':<16} machine {record['machine']['id']}  "
+                    f"{len(record['metrics'])} metric(s)  {record.get('label') or ''}"
+                )
+            return
+
+        candidate = store.resolve(options['candidate'], options['kind'])
+        if candidate is None:
+            raise CommandError(f"No recorded run matches candidate '{options['candidate']}'")
+        # A load test and a benchmark share no metrics: compare like with like
+        kind = options['kind'] or candidate.get('kind')
+        baseline = store.resolve(options['baseline'], kind)
+        if baseline is None:
+            of_kind = f" of kind '{kind}'" if kind else ''
+            raise CommandError(f"No recorded run{of_kind} matches baseline '{options['baseline']}'")
+        if baseline['id'] == candidate['id']:
+            raise CommandError(f"Baseline and candidate are the same run ({baseline['id']})")
+
+        self.stdout.write(f"Baseline:  {baseline['id']} ({baseline.get('label') or 'no label'})")
+        self.stdout.write(f"Candidate: {candidate['id']} ({candidate.get('label') or 'no label'})")
+        if baseline['machine']['id'] != candidate['machine']['id']:
+            changed = [
+                key for key in ('hostname', 'cpu_count', 'memory_mb', 'python', 'packages')
+                if baseline['machine'].get(key) != candidate['machine'].get(key)
+            ]
+            self.stdout.write(self.style.WARNING(
+                f"⚠ Runs come from different machines or environments ({', '.join(changed) or 'platform'} differ); "
+                f"differences may not be caused by the code"
+            ))
+
+        rows = compare_runs(baseline, candidate, alpha=options['alpha'], threshold=options['threshold'] / 100)
+        regressions = 0
+        for row in rows:
+            if row['status'] == 'missing':
+                self.stdout.write(f"  {row['metric']:<40} only in one run ({row['baseline_n']} / {row['candidate_n']} samples)")
+                continue
+            line = (
+                f"  {row['metric']:<40} {row['baseline_median_ms']:>9.2f} -> {row['candidate_median_ms']:>9.2f} ms "
+                f"({row['change'] * 100:+6.1f}%, p={row['p_value']:.4f}) {row['status']}"
+            )
+            if row['status'] == 'regression':
+                regressions += 1
+                self.stdout.write(self.style.ERROR(f"❌{line}"))
+            elif row['status'] == 'improvement':
+                self.stdout.write(self.style.SUCCESS(f"✓{line}"))
+            else:
+                self.stdout.write(f" {line}")
+
+        missing = [row['metric'] for row in rows if row['status'] == 'missing']
+        if len(missing) == len(rows):
+            raise CommandError(
+                f"{baseline['id']} ({baseline.get('kind')}) and {candidate['id']} ({candidate.get('kind')}) "
+                f"share no metrics; nothing was compared"
+            )
+        problems = []
+        if regressions:
+            problems.append(f"{regressions} metric(s) regressed against {baseline['id']}")
+        if missing:
+            problems.append(f"{len(missing)} metric(s) missing from one run: {', '.join(missing)}")
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('✓ No significant regressions'))
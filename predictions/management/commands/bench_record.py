@@ -0,0 +1,72 @@
+"""
+Django management command to run benchmarks and save the results to the local results store
+Usage: python manage.py bench_record [--suite ml] [--suite db] [--suite import] [--repeat 50] [--load-test var/loadtest/<run>.json] [--label TEXT]
+
+Each run is saved with the git commit and a fingerprint of the machine, for
+`python manage.py bench_compare` to check against a baseline.
+"""
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from predictions.benchmarks import ResultStore, bench_import, bench_ml, bench_storage, new_record, record_from_load_test
+from predictions.loadtest import summarize_latencies
+
+
+SUITES = ('ml', 'db', 'import')
+# Each import sample starts a fresh interpreter
+IMPORT_REPEAT_MAX = 10
+
+
+class Command(BaseCommand):
+    help = 'Run ML inference / storage query / import time benchmarks (or import a load test) and record the results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suite', action='append', choices=SUITES, default=[],
+                            help='Benchmark suite to run (repeatable; default: all)')
+        parser.add_argument('--repeat', type=int, default=50, help=f'Samples per benchmark (at most {IMPORT_REPEAT_MAX} for imports)')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic ML inputs')
+        parser.add_argument('--load-test', dest='load_test', default=None,
+                            help='Record the results file written by `manage.py load_test` instead')
+        parser.add_argument('--label', default='', help='Free text stored with the run')
+        parser.add_argument('--store', default=None, help='Results directory (default: BENCHMARK_RESULTS_DIR)')
+
+    def handle(self, *args, **options):
+        store = ResultStore(options['store'])
+
+        if options['load_test']:
+            try:
+                results = json.loads(Path(options['load_test']).read_text())
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read load test results: {e}")
+            record = record_from_load_test(results, options['label'])
+        else:
+            metrics = {}
+            suites = options['suite'] or list(SUITES)
+            if 'ml' in suites:
+                self.stdout.write(f"Timing ML inference ({options['repeat']} predictions)...")
+                metrics.update(bench_ml(options['repeat'], options['seed']))
+            if 'db' in suites:
+                self.stdout.write(f"Timing storage queries ({options['repeat']} runs each)...")
+                metrics.update(bench_storage(options['repeat']))
+            if 'import' in suites:
+                repeat = min(options['repeat'], IMPORT_REPEAT_MAX)
+                self.stdout.write(f"Timing worker imports ({repeat} fresh interpreters)...")
+                try:
+                    metrics.update(bench_import(repeat))
+                except (RuntimeError, OSError) as e:
+                    raise CommandError(str(e))
+            record = new_record('benchmark', metrics, options['label'], details={'suites': suites, 'repeat': options['repeat']})
+
+        if not record['metrics']:
+            raise CommandError('No benchmark produced any samples')
+        for name, samples in sorted(record['metrics'].items()):
+            summary = summarize_latencies(samples, 0, None)
+            self.stdout.write(
+                f"  {name:<40} n={summary['requests']:<5} p50 {summary['p50_ms']:>9.2f} ms  p95 {summary['p95_ms']:>9.2f} ms"
+            )
+        path = store.save(record)
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Recorded {record['id']} (commit {record['git_commit'] or 'unknown'}, machine {record['machine']['id']}) in {path}"
+        ))
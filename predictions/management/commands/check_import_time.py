@@ -0,0 +1,57 @@
+"""
+Django management command to check what a fresh worker imports, and how long it takes
+Usage: python manage.py check_import_time [--module predictions.urls] [--max-ms 500] [--allow pandas] [--top 15]
+
+Starts a new interpreter under `python -X importtime`, sets Django up and
+imports --module (the URLconf pulls in every view, like the first request
+does). Fails when a heavy library (pandas, numpy, scikit-learn, ...) is
+imported at boot instead of on first use, or when the total exceeds --max-ms.
+Record the timings for bench_compare with `manage.py bench_record --suite import`.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from predictions.benchmarks import HEAVY_MODULES, heavy_imports, import_profile
+
+
+class Command(BaseCommand):
+    help = 'Fail if a fresh worker imports heavy libraries at boot or takes longer than a budget to import'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default='predictions.urls', help='Module to import after django.setup()')
+        parser.add_argument('--max-ms', dest='max_ms', type=float, default=None,
+                            help='Fail when everything imported takes longer than this (median of --repeat)')
+        parser.add_argument('--allow', action='append', default=[], choices=HEAVY_MODULES,
+                            help='Heavy library that may be imported (repeatable)')
+        parser.add_argument('--repeat', type=int, default=3, help='Fresh interpreters to time')
+        parser.add_argument('--top', type=int, default=15, help='Slowest top-level imports to list')
+
+    def handle(self, *args, **options):
+        module = options['module']
+        profiles = []
+        for _ in range(max(options['repeat'], 1)):
+            try:
+                profiles.append(import_profile(module))
+            except (RuntimeError, OSError) as e:
+                raise CommandError(str(e))
+        profiles.sort(key=lambda profile: profile['total_ms'])
+        median = profiles[len(profiles) // 2]
+
+        self.stdout.write(
+            f"Imports of a fresh worker: {median['total_ms']:.0f} ms total, {module} {median['module_ms']:.0f} ms "
+            f"(median of {len(profiles)}; fastest {profiles[0]['total_ms']:.0f} ms)"
+        )
+        self.stdout.write(f"\n  {'Package':<40} {'Cumulative':>11} {'Self':>9}")
+        packages = {name: times for name, times in median['modules'].items() if '.' not in name}
+        slowest = sorted(packages.items(), key=lambda item: item[1][1], reverse=True)[:options['top']]
+        for name, (self_ms, cumulative_ms) in slowest:
+            self.stdout.write(f"  {name:<40} {cumulative_ms:>8.1f} ms {self_ms:>6.1f} ms")
+
+        problems = []
+        heavy = heavy_imports(median['modules'], options['allow'])
+        if heavy:
+            problems.append(f"imported at boot: {', '.join(heavy)} (import them where they are used)")
+        if options['max_ms'] is not None and median['total_ms'] > options['max_ms']:
+            problems.append(f"{median['total_ms']:.0f} ms is over the {options['max_ms']:.0f} ms budget")
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('\n✓ No heavy libraries imported at boot'))
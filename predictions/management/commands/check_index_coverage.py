@@ -0,0 +1,303 @@
+"""
+Django management command to check that every MongoDB query the service makes is served by an index
+Usage: python manage.py check_index_coverage [--database mamacare_index_check] [--patients 2000] [--visits 20000] [--keep] [--force-scratch]
+
+Seeds a scratch database with synthetic data, calls each MongoDBService read
+method (including the earlier, shadowed definitions of methods defined twice
+in db_service.py), captures the commands they send and runs each distinct one
+under explain('executionStats'). A plan with a COLLSCAN, or a blocking SORT
+in the query phase, fails the check.
+
+The configured MONGODB_SETTINGS database is never used, and a --database
+that already holds data is refused unless --force-scratch says it may be
+dropped. Only a database this run seeded is dropped afterwards.
+"""
+import ast
+import inspect
+import json
+import sys
+import threading
+import types
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from pymongo import MongoClient, monitoring
+
+from predictions.db_service import MongoDBService
+from predictions.slow_queries import command_filter, explainable_command, query_shape, summarize_explain
+from predictions.synthetic import SyntheticPopulation
+
+
+# Commands worth explaining (explain never applies a write's changes)
+CHECKED_COMMANDS = {'find', 'aggregate', 'count', 'distinct', 'findAndModify', 'update', 'delete'}
+
+
+class CommandCapture(monitoring.CommandListener):
+    """Collects the commands sent while a method is being checked"""
+
+    def __init__(self):
+        self.current = None
+        self.commands = []
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if self.current and event.command_name in CHECKED_COMMANDS:
+            with self._lock:
+                self.commands.append((self.current, event.database_name, event.command_name, dict(event.command)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def shadowed_methods(cls):
+    """
+    Definitions in cls's body that a later definition of the same name replaced
+
+    They never run, but they document query shapes someone may restore, so
+    they are compiled from source and checked too.
+
+    Returns:
+        list: (name, line number, function) for every shadowed definition
+    """
+    source_file = inspect.getsourcefile(cls)
+    tree = ast.parse(Path(source_file).read_text(encoding='utf-8'))
+    class_node = next(node for node in tree.body if isinstance(node, ast.ClassDef) and node.name == cls.__name__)
+    definitions = {}
+    for node in class_node.body:
+        if isinstance(node, ast.FunctionDef):
+            definitions.setdefault(node.name, []).append(node)
+
+    shadowed = []
+    for name, nodes in definitions.items():
+        for node in nodes[:-1]:
+            node.decorator_list = []
+            module_ast = ast.Module(body=[node], type_ignores=[])
+            namespace = dict(vars(sys.modules[cls.__module__]))
+            exec(compile(module_ast, source_file, 'exec'), namespace)
+            shadowed.append((name, node.lineno, namespace[name]))
+    return shadowed
+
+
+def _plan_problems(plan):
+    """COLLSCAN anywhere, or SORT before any GROUP (i.e. sorting documents rather than groups)"""
+    stages = [stage.split('(')[0] for stage in plan.split(' > ')] if plan else []
+    problems = []
+    if 'COLLSCAN' in stages:
+        problems.append('COLLSCAN')
+    # Stages are listed root first; those below the first GROUP select documents
+    query_phase = stages[stages.index('GROUP') + 1:] if 'GROUP' in stages else stages
+    if 'SORT' in query_phase:
+        problems.append('SORT')
+    return problems
+
+
+class Command(BaseCommand):
+    help = 'Run every MongoDB query shape in db_service.py under explain and fail on COLLSCAN / in-memory SORT'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uri', default=None,
+                            help='MongoDB connection string (default: MONGODB_SETTINGS host and credentials)')
+        parser.add_argument('--database', default='mamacare_index_check',
+                            help='Scratch database to seed and query (dropped afterwards unless --keep)')
+        parser.add_argument('--patients', type=int, default=2000, help='Synthetic patients to seed')
+        parser.add_argument('--visits', type=int, default=20000, help='Synthetic visits (predictions) to seed')
+        parser.add_argument('--audit-logs', type=int, default=5000, help='Synthetic audit log entries to seed')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic data')
+        parser.add_argument('--allow', action='append', default=[], metavar='METHOD',
+                            help='Report but do not fail on this method (repeatable)')
+        parser.add_argument('--keep', action='store_true', help='Keep the scratch database')
+        parser.add_argument('--force-scratch', dest='force_scratch', action='store_true',
+                            help='Drop and reseed --database even though it already holds data')
+        parser.add_argument('--json', dest='json_path', default=None, help='Also write the results to this file')
+
+    def handle(self, *args, **options):
+        scratch = self._scratch_service()
+        configured_uri, production_db = scratch._build_connection_string()
+        # Whatever server --uri points at, it may hold (a copy of) the real data under that name
+        if options['database'] == production_db:
+            raise CommandError(f"Refusing to seed the configured database '{production_db}'; pass another --database")
+        uri = options['uri'] or configured_uri
+
+        capture = CommandCapture()
+        client = MongoClient(uri, serverSelectionTimeoutMS=10000, event_listeners=[capture])
+        db = client[options['database']]
+        try:
+            client.admin.command('ping')
+            existing = db.list_collection_names()
+        except Exception as e:
+            client.close()
+            raise CommandError(f"Cannot reach MongoDB: {e}")
+        if existing and not options['force_scratch']:
+            client.close()
+            raise CommandError(
+                f"Database '{db.name}' already holds {len(existing)} collection(s); "
+                f"pass an unused --database, or --force-scratch to drop it"
+            )
+        if existing:
+            self.stdout.write(self.style.WARNING(f"⚠ Dropping {db.name} ({len(existing)} collections) before seeding"))
+            client.drop_database(db.name)
+
+        # From here on the database is ours: it did not exist, or --force-scratch let us drop it
+        try:
+            sample = self._seed(db, options)
+            scratch.client, scratch._db = client, db
+            scratch._ensure_indexes()
+            self._run_methods(scratch, capture, sample)
+            results = self._explain_all(db, capture.commands)
+        finally:
+            if not options['keep']:
+                client.drop_database(db.name)
+            client.close()
+
+        failures = self._report(results, set(options['allow']))
+        if options['json_path']:
+            Path(options['json_path']).write_text(json.dumps(results, indent=2, default=str))
+            self.stdout.write(f"Results written to {options['json_path']}")
+        if failures:
+            raise CommandError(f"{failures} query shape(s) are not fully served by an index")
+        self.stdout.write(self.style.SUCCESS(f"✓ All {len(results)} query shape(s) use an index"))
+
+    @staticmethod
+    def _scratch_service():
+        """A MongoDBService that is never connected to the configured database (no writers, no spool)"""
+        service = MongoDBService.__new__(MongoDBService)
+        service._indexes_ensured = True
+        service._init_connection_state()
+        return service
+
+    def _seed(self, db, options):
+        """Fill the scratch database and pick sample arguments for the method calls"""
+        population = SyntheticPopulation(seed=options['seed'], days=120)
+
+        patients = [population.patient(sequence) for sequence in range(options['patients'])]
+        db.patients.insert_many(patients, ordered=False)
+        visits = [population.visit(population.random.choice(patients)) for _ in range(options['visits'])]
+        for start in range(0, len(visits), 5000):
+            db.predictions.insert_many(visits[start:start + 5000], ordered=False)
+        logs = [population.audit_log() for _ in range(options['audit_logs'])]
+        if logs:
+            db.audit_logs.insert_many(logs, ordered=False)
+        db.duplicate_candidates.insert_many([
+            {'_id': f'{a["patient_id"]}|{b["patient_id"]}', 'patient_ids': [a['patient_id'], b['patient_id']],
+             'patient_names': [a['patient_name'], b['patient_name']], 'score': 0.95, 'status': 'pending',
+             'block_key': a['block_keys'][0], 'detected_at': population.end}
+            for a, b in zip(patients[0:200:2], patients[1:200:2])
+        ])
+        self.stdout.write(
+            f"Seeded {db.name}: {len(patients)} patients, {len(visits)} visits, {len(logs)} audit logs"
+        )
+
+        patient = visits[0]
+        end = population.end
+        return {
+            'patient_id': patient['patient_id'],
+            'patient_name': patient['patient_name'],
+            'user_id': patient['user_id'],
+            'start': end - timedelta(days=30),
+            'end': end,
+            'search': patient['patient_name'].split()[0][:4],
+            'block_keys': patients[0]['block_keys'],
+        }
+
+    @staticmethod
+    def _calls(sample):
+        """Each read method with arguments that make it query (name -> callable(method))"""
+        s = sample
+        return {
+            'search_patient': lambda m: m(s['patient_id']),
+            'search_patients': lambda m: m(s['search']),
+            'get_or_create_patient': lambda m: m(s['patient_id'], s['patient_name']),
+            '_taken_patient_ids': lambda m: m([s['patient_id'], 'MC-000000']),
+            'get_user_predictions': lambda m: m(s['user_id']),
+            'get_patient_predictions': lambda m: m(s['patient_id']),
+            'get_all_predictions': lambda m: m(limit=100),
+            'get_predictions_by_date_range': lambda m: m(s['start'], s['end']),
+            'iter_predictions': lambda m: list(m(s['start'], s['end'])),
+            'get_statistics': lambda m: m(),
+            'get_statistics_by_date_range': lambda m: m(s['start'], s['end']),
+            'get_daily_statistics': lambda m: m(days=30),
+            'get_report_summary': lambda m: m(s['start'], s['end']),
+            'get_health_worker_stats': lambda m: m(s['user_id']),
+            'get_all_health_workers': lambda m: m(),
+            'get_all_patients': lambda m: m(search_term=s['search'], limit=20),
+            'get_patients_list': lambda m: m(search_query=s['search'], limit=20),
+            'find_patients_by_block_keys': lambda m: m(s['block_keys']),
+            'get_duplicate_candidates': lambda m: m(status='pending'),
+            'get_audit_logs': lambda m: m(user_id=s['user_id'], action_type='login'),
+        }
+
+    def _run_methods(self, service, capture, sample):
+        calls = self._calls(sample)
+        targets = [(name, getattr(service, name), name) for name in calls]
+        for name, line, function in shadowed_methods(MongoDBService):
+            if name in calls:
+                targets.append((name, types.MethodType(function, service), f'{name} (shadowed, line {line})'))
+            else:
+                self.stdout.write(self.style.WARNING(f"⚠ No sample call for shadowed method {name} (line {line})"))
+
+        for name, method, label in targets:
+            capture.current = label
+            try:
+                calls[name](method)
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f"⚠ {label} raised {e}"))
+            finally:
+                capture.current = None
+
+    @staticmethod
+    def _explain_all(db, commands):
+        """Explain each distinct (method, command shape) once; repeats (N+1 loops) are counted"""
+        results = {}
+        for label, database_name, command_name, command in commands:
+            shape = query_shape(command_filter(command_name, command))
+            collection = command.get(command_name)
+            key = (label, command_name, collection, json.dumps(shape, sort_keys=True, default=str))
+            if key in results:
+                results[key]['calls'] += 1
+                continue
+            try:
+                explain = db.client[database_name].command(
+                    {'explain': explainable_command(command), 'verbosity': 'executionStats'}
+                )
+                summary = summarize_explain(explain)
+                problems = _plan_problems(summary['plan'])
+            except Exception as e:
+                summary, problems = {'error': str(e)}, ['EXPLAIN FAILED']
+            results[key] = {
+                'method': label,
+                'command': command_name,
+                'collection': collection,
+                'filter': shape,
+                'calls': 1,
+                'problems': problems,
+                **summary,
+            }
+        return list(results.values())
+
+    def _report(self, results, allowed):
+        failures = 0
+        for result in results:
+            method = result['method'].split(' ')[0]
+            examined = result.get('docs_examined')
+            returned = result.get('n_returned')
+            repeat = f" x{result['calls']}" if result['calls'] > 1 else ''
+            line = (
+                f"{result['method']}: {result['command']} {result['collection']}{repeat} | "
+                f"{result.get('plan') or result.get('error')} | "
+                f"examined {examined if examined is not None else '?'} docs / "
+                f"{result.get('keys_examined') if result.get('keys_examined') is not None else '?'} keys, "
+                f"returned {returned if returned is not None else '?'}"
+            )
+            if not result['problems']:
+                self.stdout.write(f"✓ {line}")
+            elif method in allowed:
+                self.stdout.write(self.style.WARNING(f"⚠ {line} [{', '.join(result['problems'])}, allowed]"))
+            else:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"❌ {line} [{', '.join(result['problems'])}]"))
+                self.stdout.write(f"   filter: {json.dumps(result['filter'], default=str)}")
+        return failures
@@ -0,0 +1,31 @@
+"""
+Django management command to scan all patients for likely duplicate registrations
+Usage: python manage.py find_duplicate_patients [--threshold 0.92]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from predictions.db_service import db_service
+from predictions.duplicates import find_duplicates
+
+
+class Command(BaseCommand):
+    help = 'Find patients likely registered more than once and queue them for review'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=None,
+            help='Minimum name similarity (0-1) to record a pair (default: DUPLICATE_MATCH_THRESHOLD)',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        result = find_duplicates(db_service, threshold=options['threshold'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {result['blocks']} block(s): "
+            f"compared {result['pairs_compared']} pair(s), recorded {result['candidates']} candidate(s) "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
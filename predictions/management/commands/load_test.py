@@ -0,0 +1,123 @@
+"""
+Django management command to load test a running MamaCare server with a mix of realistic traffic
+Usage: python manage.py load_test --url http://127.0.0.1:8000/ --create-users [--clients 20] [--duration 60]
+
+Health worker clients log in, run predictions and look up history and
+patients; staff clients load the dashboard (shell and panels), analytics JSON
+and CSV exports. Results (throughput and p50/p95/p99 per endpoint, plus the
+raw latencies) are saved as JSON so runs can be compared across code versions
+and gunicorn settings.
+"""
+import json
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from predictions.benchmarks import git_commit
+from predictions.loadtest import run_load_test
+
+
+def _credentials(values):
+    pairs = []
+    for value in values:
+        username, sep, password = value.partition(':')
+        if not sep:
+            raise CommandError(f"Expected USERNAME:PASSWORD, got '{value}'")
+        pairs.append((username, password))
+    return pairs
+
+
+class Command(BaseCommand):
+    help = 'Drive a running server with concurrent health worker and staff clients and report latency per endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/', help='Base URL of the running server')
+        parser.add_argument('--clients', type=int, default=20, help='Concurrent clients')
+        parser.add_argument('--staff-clients', type=int, default=None,
+                            help='How many of the clients are staff (default: one in five)')
+        parser.add_argument('--duration', type=int, default=60, help='Seconds of measured traffic')
+        parser.add_argument('--warmup', type=int, default=10, help='Seconds of unrecorded traffic first')
+        parser.add_argument('--think-ms', type=int, default=500, help="Mean pause between a client's requests")
+        parser.add_argument('--timeout', type=int, default=30, help='Per-request timeout in seconds')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the clients\' choices and form data')
+        parser.add_argument('--user', action='append', default=[], metavar='USERNAME:PASSWORD',
+                            help='Health worker account to use (repeatable)')
+        parser.add_argument('--staff-user', action='append', default=[], metavar='USERNAME:PASSWORD',
+                            help='Staff account to use (repeatable)')
+        parser.add_argument('--create-users', action='store_true',
+                            help='Create loadtest_worker_N / loadtest_staff_N accounts in this project\'s database')
+        parser.add_argument('--password', default='loadtest-Passw0rd',
+                            help='Password for --create-users accounts')
+        parser.add_argument('--label', default='', help='Free text stored with the results (e.g. "gunicorn -w 4")')
+        parser.add_argument('--output', default=None,
+                            help='Results file (default: var/loadtest/<timestamp>.json)')
+
+    def handle(self, *args, **options):
+        clients = options['clients']
+        staff_clients = options['staff_clients']
+        if staff_clients is None:
+            staff_clients = max(1, clients // 5) if clients > 1 else 0
+        if not 0 <= staff_clients <= clients:
+            raise CommandError('--staff-clients must be between 0 and --clients')
+
+        workers = _credentials(options['user'])
+        staff = _credentials(options['staff_user'])
+        if options['create_users']:
+            workers = workers or self._create_users('loadtest_worker', clients - staff_clients, options['password'], False)
+            staff = staff or self._create_users('loadtest_staff', staff_clients, options['password'], True)
+        if (clients > staff_clients and not workers) or (staff_clients and not staff):
+            raise CommandError('Pass --user / --staff-user credentials or --create-users')
+
+        started_at = datetime.now()
+        results = run_load_test(
+            options['url'], workers, staff, clients, staff_clients,
+            duration=options['duration'], warmup=options['warmup'], think_ms=options['think_ms'],
+            seed=options['seed'], timeout=options['timeout'], progress=self.stdout.write
+        )
+        results = {
+            'kind': 'http_load_test',
+            'label': options['label'],
+            'started_at': started_at.isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            **results,
+        }
+
+        self._print_table(results)
+        output = Path(options['output'] or Path(settings.BASE_DIR) / 'var' / 'loadtest' / f'{started_at:%Y%m%d-%H%M%S}.json')
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"✓ Results saved to {output}"))
+
+    def _create_users(self, prefix, count, password, is_staff):
+        """Create (or reset the password of) count accounts named prefix_N"""
+        accounts = []
+        for index in range(1, max(count, 0) + 1):
+            username = f'{prefix}_{index}'
+            user, _ = User.objects.get_or_create(username=username, defaults={'is_staff': is_staff})
+            user.is_staff = is_staff
+            user.is_active = True
+            user.set_password(password)
+            user.save()
+            accounts.append((username, password))
+        if accounts:
+            self.stdout.write(f"Using {len(accounts)} {'staff' if is_staff else 'health worker'} account(s) {prefix}_N")
+        return accounts
+
+    def _print_table(self, results):
+        header = f"{'endpoint':<18}{'requests':>9}{'errors':>8}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        rows = list(results['endpoints'].items()) + [('TOTAL', results['overall'])]
+        for endpoint, summary in rows:
+            cells = [
+                f"{summary[key]:>9.1f}" if summary[key] is not None else f"{'-':>9}"
+                for key in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms')
+            ]
+            line = (
+                f"{endpoint:<18}{summary['requests']:>9}{summary['errors']:>8}"
+                f"{summary['throughput_rps'] or 0:>8.1f}{''.join(cells)}"
+            )
+            self.stdout.write(self.style.ERROR(line) if summary['errors'] else line)
@@ -0,0 +1,22 @@
+"""
+Django management command to compute search and blocking keys for existing patients
+Usage: python manage.py rebuild_patient_search [--all]
+"""
+from django.core.management.base import BaseCommand
+
+from predictions.db_service import db_service
+
+
+class Command(BaseCommand):
+    help = 'Compute patient search keys and duplicate-detection blocking keys for patients missing them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recompute keys for every patient, not only those missing them',
+        )
+
+    def handle(self, *args, **options):
+        updated = db_service.rebuild_search_index(only_missing=not options['all'])
+        self.stdout.write(self.style.SUCCESS(f'Updated search keys for {updated} patient(s)'))
@@ -0,0 +1,36 @@
+"""
+Django management command to process queued export jobs in a separate process
+Usage: python manage.py run_export_jobs [--once] [--interval 5]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from predictions.export_jobs import purge_expired_artifacts, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Process queued CSV/Excel/PDF export jobs outside the web workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the current queue and exit',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds to wait between polls of the job table (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = run_pending_jobs()
+            purged = purge_expired_artifacts()
+            if processed or purged:
+                self.stdout.write(f'Processed {processed} job(s), purged {purged} expired artifact(s)')
+            if options['once']:
+                break
+            time.sleep(options['interval'])
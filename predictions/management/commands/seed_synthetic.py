@@ -0,0 +1,172 @@
+"""
+Django management command to fill a MongoDB database with synthetic patients, visits and audit logs
+Usage: python manage.py seed_synthetic [--patients 1000000] [--seed 0] [--database mamacare_synthetic] [--workers 4]
+
+Patients are generated in chunks, each from its own seed derived from --seed,
+and inserted with insert_many by a pool of worker processes. The same --seed,
+--end and starting patient sequence always produce the same documents, however
+many workers are used.
+"""
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from pymongo import MongoClient
+
+from predictions.synthetic import SyntheticPopulation
+
+
+_worker_db = None
+
+
+def _init_worker(uri, database):
+    """Give each worker process its own client (MongoClient is not fork-safe)"""
+    global _worker_db
+    _worker_db = MongoClient(uri, w=1)[database]
+
+
+def _insert_chunk(population, index, first_sequence, count, audit_rate):
+    """
+    Generate and insert one chunk of patients with their visits and audit logs
+
+    Returns:
+        dict: documents inserted per collection and seconds spent inserting
+    """
+    chunk = population.for_chunk(index)
+    patients, visits, logs = [], [], []
+    for sequence in range(first_sequence, first_sequence + count):
+        patient, patient_visits = chunk.pregnancy(sequence)
+        patients.append(patient)
+        visits.extend(patient_visits)
+        for visit in patient_visits:
+            logs.extend(chunk.visit_audit_logs(visit, audit_rate))
+
+    started = time.perf_counter()
+    _worker_db.patients.insert_many(patients, ordered=False)
+    if visits:
+        _worker_db.predictions.insert_many(visits, ordered=False)
+    if logs:
+        _worker_db.audit_logs.insert_many(logs, ordered=False)
+    return {
+        'patients': len(patients),
+        'predictions': len(visits),
+        'audit_logs': len(logs),
+        'insert_seconds': time.perf_counter() - started,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Generate a large, realistic and reproducible synthetic data set in MongoDB for load and scale testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=100000, help='Patients to generate (each with their visits)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (same seed, same data)')
+        parser.add_argument('--end', default=None,
+                            help='Date (YYYY-MM-DD) of the most recent visit (default: today; fix it for reproducible data)')
+        parser.add_argument('--days', type=int, default=365, help='Patients book over this many days before --end')
+        parser.add_argument('--health-workers', type=int, default=50, help='Distinct health worker user_ids')
+        parser.add_argument('--workload-skew', type=float, default=1.1,
+                            help='Zipf exponent of the workload per health worker (0 = even)')
+        parser.add_argument('--audit-rate', type=float, default=1.5,
+                            help='Audit log entries per visit besides its prediction_made entry')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Patients generated and inserted per batch')
+        parser.add_argument('--workers', type=int, default=max(1, multiprocessing.cpu_count() - 1),
+                            help='Parallel worker processes')
+        parser.add_argument('--uri', default=None,
+                            help='MongoDB connection string (default: MONGODB_SETTINGS host and credentials)')
+        parser.add_argument('--database', default='mamacare_synthetic',
+                            help='Database to fill (point MONGODB_NAME at it to run the app against the data)')
+        parser.add_argument('--drop', action='store_true', help='Drop the database first')
+        parser.add_argument('--allow-configured-db', action='store_true',
+                            help='Allow writing into the database the app is configured to use')
+
+    def handle(self, *args, **options):
+        # Imported here: db_service pulls in pymongo
+        from predictions.db_service import MongoDBService
+
+        service = MongoDBService.__new__(MongoDBService)
+        service._indexes_ensured = True
+        service._init_connection_state()
+        uri, configured_db = service._build_connection_string()
+        uri = options['uri'] or uri
+        database = options['database']
+        if database == configured_db and not options['allow_configured_db']:
+            raise CommandError(f"'{database}' is the configured database; pass --allow-configured-db to seed it anyway")
+
+        try:
+            end = datetime.strptime(options['end'], '%Y-%m-%d') if options['end'] else None
+        except ValueError:
+            raise CommandError('--end must be a date like 2025-06-30')
+        end = (end or datetime.utcnow()).replace(hour=23, minute=59, second=59, microsecond=0)
+
+        client = MongoClient(uri, serverSelectionTimeoutMS=10000)
+        try:
+            client.admin.command('ping')
+        except Exception as e:
+            raise CommandError(f"Cannot reach MongoDB: {e}")
+        db = client[database]
+        if options['drop']:
+            client.drop_database(database)
+            self.stdout.write(f"Dropped {database}")
+
+        # Continue after any patients already allocated so IDs never collide
+        counter = db.counters.find_one({'_id': 'patient_id'})
+        first_sequence = counter['seq'] if counter else 0
+
+        population = SyntheticPopulation(
+            seed=options['seed'], health_workers=options['health_workers'], days=options['days'],
+            end=end, workload_skew=options['workload_skew']
+        )
+        total, chunk_size = options['patients'], options['chunk_size']
+        chunks = [
+            (index, first_sequence + offset, min(chunk_size, total - offset))
+            for index, offset in enumerate(range(0, total, chunk_size))
+        ]
+        self.stdout.write(
+            f"Seeding {database}: {total} patients in {len(chunks)} chunks on {options['workers']} workers "
+            f"(seed {options['seed']}, visits up to {end:%Y-%m-%d})"
+        )
+
+        inserted = {'patients': 0, 'predictions': 0, 'audit_logs': 0}
+        started = time.perf_counter()
+        # spawn: the parent already runs driver threads, which fork would copy mid-flight
+        with ProcessPoolExecutor(max_workers=options['workers'], mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(uri, database)) as executor:
+            futures = [
+                executor.submit(_insert_chunk, population, index, sequence, count, options['audit_rate'])
+                for index, sequence, count in chunks
+            ]
+            for done, future in enumerate(as_completed(futures), start=1):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    for pending in futures:
+                        pending.cancel()
+                    raise CommandError(f"Inserting a chunk failed: {e}")
+                for collection in inserted:
+                    inserted[collection] += result[collection]
+                elapsed = time.perf_counter() - started
+                documents = sum(inserted.values())
+                self.stdout.write(
+                    f"  {done}/{len(chunks)} chunks: {inserted['patients']} patients, {inserted['predictions']} visits, "
+                    f"{inserted['audit_logs']} audit logs ({documents / elapsed:,.0f} inserts/s)"
+                )
+
+        elapsed = time.perf_counter() - started
+        db.counters.update_one({'_id': 'patient_id'}, {'$max': {'seq': first_sequence + total}}, upsert=True)
+
+        self.stdout.write("Creating indexes...")
+        index_started = time.perf_counter()
+        service.client, service._db = client, db
+        service._ensure_indexes()
+        index_seconds = time.perf_counter() - index_started
+        client.close()
+
+        documents = sum(inserted.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Inserted {documents:,} documents in {elapsed:.1f}s ({documents / elapsed:,.0f} inserts/s): "
+            f"{inserted['patients']:,} patients, {inserted['predictions']:,} visits, {inserted['audit_logs']:,} audit logs; "
+            f"indexes built in {index_seconds:.1f}s"
+        ))
@@ -0,0 +1,102 @@
+"""
+Prometheus metrics for MamaCare
+Request, storage and model latency, aggregated across gunicorn workers when PROMETHEUS_MULTIPROC_DIR is set
+"""
+import os
+import time
+from functools import wraps
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+
+
+REQUESTS = Counter(
+    'mamacare_http_requests_total', 'HTTP requests handled',
+    ['view', 'method', 'status']
+)
+REQUEST_LATENCY = Histogram(
+    'mamacare_http_request_duration_seconds', 'Time to produce a response, per view',
+    ['view']
+)
+STORAGE_LATENCY = Histogram(
+    'mamacare_storage_operation_duration_seconds', 'Storage backend call latency, per method',
+    ['backend', 'method']
+)
+STORAGE_ERRORS = Counter(
+    'mamacare_storage_operation_errors_total', 'Storage backend calls that raised',
+    ['backend', 'method']
+)
+MODEL_LATENCY = Histogram(
+    'mamacare_model_predict_duration_seconds', 'Time for predict_all_risks (all three models)'
+)
+# One series per live worker: imports, django_setup, migrate, ready, ml_models, ...
+BOOT_PHASE_SECONDS = Gauge(
+    'mamacare_boot_phase_seconds', 'Time each start-up phase took in this worker',
+    ['phase'], multiprocess_mode='liveall'
+)
+# Summed over live workers; each worker reports its own queue after every request
+AUDIT_QUEUE_DEPTH = Gauge(
+    'mamacare_audit_log_queue_depth', 'Audit log entries waiting to be written',
+    multiprocess_mode='livesum'
+)
+
+
+def render_metrics():
+    """
+    The text exposition of every metric
+
+    Returns:
+        tuple: (body bytes, content type)
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        # Each worker writes its samples to files in that directory; merge them all
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        from prometheus_client import REGISTRY as registry
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def timed_model(func):
+    """Decorator recording a prediction call in MODEL_LATENCY"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with MODEL_LATENCY.time():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+class InstrumentedStorage:
+    """
+    Storage proxy timing every public method call into STORAGE_LATENCY
+
+    Attributes that are not methods are passed straight through. Generators
+    (iter_patients, iter_predictions) are timed until they are returned, not
+    while they are consumed.
+    """
+
+    def __init__(self, backend):
+        self._backend = backend
+        self._label = getattr(backend, 'name', type(backend).__name__)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._backend, name)
+        if name.startswith('_') or not callable(attribute):
+            return attribute
+        histogram = STORAGE_LATENCY.labels(self._label, name)
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return attribute(*args, **kwargs)
+            except Exception:
+                STORAGE_ERRORS.labels(self._label, name).inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return timed
+
+
+def instrumented(backend):
+    """Wrap a storage backend in InstrumentedStorage"""
+    return InstrumentedStorage(backend)
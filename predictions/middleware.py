@@ -0,0 +1,90 @@
+"""
+Middleware for MamaCare
+"""
+import time
+
+from django.conf import settings
+
+from .metrics import AUDIT_QUEUE_DEPTH, REQUESTS, REQUEST_LATENCY
+from .profiling import profiler
+from .query_monitor import track_queries
+
+
+class MetricsMiddleware:
+    """Counts requests and records their latency per view (by URL name) for /metrics"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        REQUESTS.labels(view, request.method, str(response.status_code)).inc()
+        REQUEST_LATENCY.labels(view).observe(elapsed)
+
+        # Imported here: db_service imports pymongo; requests that never used
+        # storage (login form, errors) don't build the backend just to report it
+        from .db_service import db_service
+        if db_service.loaded:
+            audit_writer = getattr(db_service, 'audit_writer', None)
+            if audit_writer is not None:
+                AUDIT_QUEUE_DEPTH.set(audit_writer.queue_depth())
+        return response
+
+
+class QueryBudgetMiddleware:
+    """
+    Reports each request's MongoDB round trips and flags the expensive ones
+
+    Adds a Server-Timing header (visible in the browser's network panel) with
+    the time spent in MongoDB and in the whole view, and logs requests that
+    exceed MONGO_QUERY_BUDGET round trips or MONGO_LATENCY_BUDGET_MS in MongoDB.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with track_queries() as stats:
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        timing = (
+            f'mongo;dur={stats.duration_ms:.1f};desc="{stats.commands} queries, {stats.documents} docs", '
+            f'app;dur={total_ms:.1f}'
+        )
+        if response.has_header('Server-Timing'):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response['Server-Timing'] = timing
+
+        over_count = stats.commands > settings.MONGO_QUERY_BUDGET
+        over_time = stats.duration_ms > settings.MONGO_LATENCY_BUDGET_MS
+        if over_count or over_time:
+            print(
+                f"⚠ Query budget exceeded: {request.method} {request.path} made {stats.commands} "
+                f"MongoDB queries in {stats.duration_ms:.1f} ms (budget {settings.MONGO_QUERY_BUDGET} / "
+                f"{settings.MONGO_LATENCY_BUDGET_MS} ms): {stats.summary()}"
+            )
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Runs requests to the view chosen on the profiling page under cProfile
+
+    While no profiling session is armed this is a single attribute check.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        session = profiler.active
+        if session is None:
+            return self.get_response(request)
+        return profiler.handle(session, request, self.get_response)
@@ -3,12 +3,13 @@ ML Model Service for MamaCare
 Handles loading and using the three trained models for unified predictions
 """
 import os
-import joblib
-import pandas as pd
-import numpy as np
+import threading
 from django.conf import settings
 from pathlib import Path
 
+from .metrics import timed_model
+from .startup import boot_timer
+
 
 class MLModelService:
     """
@@ -30,11 +31,31 @@ class MLModelService:
         self.gdm_scaler = None
         self.gdm_features = None
         
+        self._load_lock = threading.Lock()
+    
+    def ensure_loaded(self):
+        """
+        Load the models (and pandas / scikit-learn with them) on first use
+        
+        Nothing heavy is imported with this module, so workers that never
+        predict never pay for it; set ML_WARM_UP to load in the background at boot.
+        """
+        if self.models_loaded:
+            return
+        with self._load_lock:
+            if not self.models_loaded:
+                with boot_timer.phase('ml_models'):
+                    import pandas  # noqa: F401 (first prediction would import it anyway)
+                    self.load_models()
+    
     def load_models(self):
         """Load all three ML models and their preprocessors"""
         if self.models_loaded:
             return
         
+        # Imported here: joblib brings numpy and (unpickling) scikit-learn with it
+        import joblib
+        
         models_dir = settings.ML_MODELS_DIR
         
         try:
@@ -95,6 +116,7 @@ class MLModelService:
     
     def _create_placeholder_models(self):
         """Create placeholder models for development/testing"""
+        import numpy as np
         from sklearn.linear_model import LogisticRegression
         from sklearn.preprocessing import StandardScaler, LabelEncoder
         
@@ -141,6 +163,7 @@ class MLModelService:
         self.gdm_scaler.fit(dummy_X)
         self.gdm_model.fit(self.gdm_scaler.transform(dummy_X), dummy_y)
     
+    @timed_model
     def predict_all_risks(self, input_data):
         """
         Unified prediction function that combines all three models
@@ -152,8 +175,8 @@ class MLModelService:
         Returns:
             dict: Unified risk assessment with all three predictions
         """
-        if not self.models_loaded:
-            self.load_models()
+        self.ensure_loaded()
+        import pandas as pd
         
         # Extract input values
         age = input_data.get('age', 25)
@@ -0,0 +1,68 @@
+"""
+Django models for MamaCare
+Clinical data lives in MongoDB; only local bookkeeping tables are kept here
+"""
+from django.conf import settings
+from django.db import models
+from django.db.models import Q
+
+
+class ExportJob(models.Model):
+    """A background export or report whose artifact is written to MEDIA_ROOT"""
+
+    FORMAT_CSV = 'csv'
+    FORMAT_XLSX = 'xlsx'
+    FORMAT_PDF = 'pdf'
+    FORMAT_CHOICES = [
+        (FORMAT_CSV, 'CSV'),
+        (FORMAT_XLSX, 'Excel'),
+        (FORMAT_PDF, 'PDF summary'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    ACTIVE_STATUSES = (STATUS_PENDING, STATUS_RUNNING)
+
+    export_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    # Identical requests (same format and date range) share one job
+    fingerprint = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL
+    )
+    file_path = models.CharField(max_length=500, blank=True)
+    file_name = models.CharField(max_length=200, blank=True)
+    file_size = models.BigIntegerField(default=0)
+    row_count = models.BigIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # At most one queued or running job per fingerprint, even across workers
+            models.UniqueConstraint(
+                fields=['fingerprint'],
+                condition=Q(status__in=['pending', 'running']),
+                name='unique_active_export_job',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_export_format_display()} export #{self.pk} ({self.status})"
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
@@ -0,0 +1,98 @@
+"""
+Patient ID allocation for MamaCare
+Hands out MC-XXXXXX IDs from blocks reserved on a shared counter, so new patients need no lookup
+"""
+import os
+import random
+import string
+import threading
+
+
+ALPHABET = string.digits + string.ascii_uppercase
+ID_LENGTH = 6
+ID_SPACE = len(ALPHABET) ** ID_LENGTH
+
+# Sequence numbers are scattered over the ID space with an affine permutation
+# (the multiplier is coprime with 36 ** 6, so distinct sequences always give
+# distinct IDs) to keep consecutive patients' IDs from looking sequential
+MULTIPLIER = 1_664_525_057
+OFFSET = 711_283_904
+
+
+def format_patient_id(sequence):
+    """The MC-XXXXXX patient ID for a sequence number"""
+    if not 0 <= sequence < ID_SPACE:
+        raise ValueError(f"Patient ID sequence {sequence} is outside the MC-XXXXXX space")
+    value = (sequence * MULTIPLIER + OFFSET) % ID_SPACE
+    chars = []
+    for _ in range(ID_LENGTH):
+        value, digit = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    return 'MC-' + ''.join(reversed(chars))
+
+
+def random_patient_id():
+    """A random MC-XXXXXX ID (uniqueness not guaranteed; used only when no block can be reserved)"""
+    return f"MC-{''.join(random.choices(string.ascii_uppercase + string.digits, k=ID_LENGTH))}"
+
+
+class PatientIdAllocator:
+    """
+    Per-process patient ID allocator
+
+    Each process reserves a block of sequence numbers from a shared counter in
+    one atomic increment and then hands IDs out of it from memory. Blocks never
+    overlap, so IDs are unique across workers without checking each one; the
+    only lookup is one batched query per block, which skips IDs already taken
+    by patients registered before the counter existed (random legacy IDs).
+    """
+
+    def __init__(self, reserve_block, find_taken=None, block_size=100):
+        """
+        Args:
+            reserve_block: Callable(count) atomically advancing the shared counter by
+                           count and returning the first reserved sequence number,
+                           or None if the store is unavailable
+            find_taken: Optional callable(ids) returning the subset already in use
+            block_size: Sequence numbers reserved per round trip
+        """
+        self._reserve_block = reserve_block
+        self._find_taken = find_taken
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._available = []
+
+    def next_id(self):
+        """
+        The next unused patient ID
+
+        Returns:
+            str: An MC-XXXXXX ID, or None if a new block was needed but could not be reserved
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                # A forked child must not hand out its parent's remaining block
+                self._pid = os.getpid()
+                self._available = []
+            while not self._available:
+                if not self._refill():
+                    return None
+            return self._available.pop()
+
+    def _refill(self):
+        start = self._reserve_block(self.block_size)
+        if start is None:
+            return False
+        ids = [format_patient_id(sequence) for sequence in range(start, start + self.block_size)]
+        if self._find_taken:
+            taken = set(self._find_taken(ids))
+            ids = [patient_id for patient_id in ids if patient_id not in taken]
+        # pop() from the end, so reverse to hand IDs out in sequence order
+        self._available = ids[::-1]
+        return True
+
+    def discard(self):
+        """Forget the rest of the current block (e.g. in tests after wiping the store)"""
+        with self._lock:
+            self._available = []
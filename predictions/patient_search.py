@@ -0,0 +1,180 @@
+"""
+Patient search keys for MamaCare
+Prefix keys stored on each patient so name / ID lookups hit an index instead of scanning with $regex
+"""
+import re
+import unicodedata
+
+
+# Longer query tokens are matched on their first MAX_PREFIX characters via the
+# index and then checked in full against the candidates
+MAX_PREFIX = 10
+
+# Upper bound on index hits ranked per query; enough for autocomplete and the
+# management list while keeping one-letter queries cheap
+MAX_CANDIDATES = 200
+
+# Whole name tokens and the whole ID code are also stored as '=<token>' keys, so
+# exact matches are fetched on their own instead of competing for MAX_CANDIDATES
+EXACT_MARK = '='
+
+# Prefixes of the whole ID with its punctuation removed ('mcab12') are stored as
+# '#<prefix>' keys, so ID lookups typed with the 'MC-' part ('MC-', 'MC-00',
+# 'mc0'), which the name-token keys cannot match, keep working
+ID_MARK = '#'
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+_ID_PREFIX = re.compile(r'mc[a-z0-9]{0,6}')
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse punctuation to spaces"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(' ', text.lower()).strip()
+
+
+def name_tokens(name):
+    """Normalised tokens of a patient name"""
+    return normalize(name).split()
+
+
+def id_code(patient_id):
+    """The searchable part of a patient ID ('MC-AB12CD' -> 'ab12cd')"""
+    code = normalize(patient_id).replace(' ', '')
+    return code[2:] if code.startswith('mc') and len(code) > 2 else code
+
+
+def compact_id(patient_id):
+    """A patient ID without punctuation ('MC-AB12CD' -> 'mcab12cd')"""
+    return normalize(patient_id).replace(' ', '')
+
+
+def _prefixes(token):
+    return [token[:length] for length in range(1, min(len(token), MAX_PREFIX) + 1)]
+
+
+def search_keys(patient_id, patient_name):
+    """
+    Index keys for a patient: every prefix of each name token and of the ID code,
+    each whole token marked with EXACT_MARK, and every prefix of the compact ID
+    marked with ID_MARK
+
+    Returns:
+        list: Distinct keys, stored in the patient's multikey-indexed search_keys field
+    """
+    tokens = name_tokens(patient_name)
+    code = id_code(patient_id)
+    if code:
+        tokens.append(code)
+    keys = set()
+    for token in tokens:
+        keys.update(_prefixes(token))
+        keys.add(EXACT_MARK + token)
+    # From 'mc' on: every ID starts with it, so shorter prefixes would select nothing
+    keys.update(ID_MARK + prefix for prefix in _prefixes(compact_id(patient_id))[1:])
+    return sorted(keys)
+
+
+def query_tokens(query):
+    """Normalised tokens of a search query, without a leading 'MC' ID prefix"""
+    tokens = normalize(query).split()
+    if len(tokens) > 1 and tokens[0] == 'mc':
+        tokens = tokens[1:]
+    elif len(tokens) == 1 and re.fullmatch(r'mc[a-z0-9]{6}', tokens[0]):
+        # A full ID typed without the dash
+        tokens = [tokens[0][2:]]
+    return tokens
+
+
+def query_keys(query):
+    """
+    Index keys every match must have, most selective (longest) first
+
+    Returns:
+        list: Keys for a {'search_keys': {'$all': keys}} filter (empty for a blank query)
+    """
+    keys = {token[:MAX_PREFIX] for token in query_tokens(query)}
+    return sorted(keys, key=len, reverse=True)
+
+
+def id_prefix(query):
+    """The compact ID prefix a query spells out ('MC-00' -> 'mc00'), or None if it is not the start of an ID"""
+    compact = compact_id(query)
+    return compact if _ID_PREFIX.fullmatch(compact) else None
+
+
+def id_prefix_keys(query):
+    """
+    Index key of patients whose ID starts with the query, e.g. 'MC-' or 'MC-00'
+
+    Returns:
+        list: Keys for a {'search_keys': {'$all': keys}} filter (empty unless the query looks like an ID prefix)
+    """
+    prefix = id_prefix(query)
+    return [ID_MARK + prefix[:MAX_PREFIX]] if prefix else []
+
+
+def exact_keys(query):
+    """
+    Index keys of patients whose ID code or whole name tokens equal every query token
+
+    Returns:
+        list: Keys for a {'search_keys': {'$all': keys}} filter (empty for a blank query)
+    """
+    return sorted({EXACT_MARK + token for token in query_tokens(query)})
+
+
+def _score(patient, tokens, prefix=None):
+    """Relevance of a patient to the query tokens (or to the ID prefix the query spells), or None if it does not match"""
+    code = id_code(patient.get('patient_id'))
+    names = name_tokens(patient.get('patient_name'))
+    if len(tokens) == 1 and tokens[0] == code:
+        return 100
+    if prefix and compact_id(patient.get('patient_id')).startswith(prefix):
+        return 9
+    score = 0
+    for token in tokens:
+        if token in names:
+            score += 10
+        elif code.startswith(token):
+            score += 8
+        elif any(name.startswith(token) for name in names):
+            score += 5
+        else:
+            return None
+    # Earlier name tokens (first names) matching ranks slightly higher
+    if names and names[0].startswith(tokens[0]):
+        score += 1
+    return score
+
+
+def matches(patient, query):
+    """True if the patient matches every token of the query"""
+    tokens = query_tokens(query)
+    return bool(tokens) and _score(patient, tokens, id_prefix(query)) is not None
+
+
+def rank_patients(candidates, query, limit=10):
+    """
+    Best matches first: exact ID, whole-name-token matches, ID prefixes, then name prefixes
+
+    Args:
+        candidates: Patient dicts (with patient_id and patient_name) from the index lookup
+        query: The raw search text
+        limit: Maximum results
+
+    Returns:
+        list: Matching patients, best first
+    """
+    tokens = query_tokens(query)
+    if not tokens:
+        return []
+    prefix = id_prefix(query)
+    scored = []
+    for patient in candidates:
+        score = _score(patient, tokens, prefix)
+        if score is not None:
+            scored.append((-score, len(patient.get('patient_name') or ''), patient.get('patient_id') or '', patient))
+    scored.sort(key=lambda item: item[:3])
+    return [item[3] for item in scored[:limit]]
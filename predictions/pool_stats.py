@@ -0,0 +1,76 @@
+"""
+Connection pool statistics for MamaCare's MongoClient
+Tracks checked-out and waiting connections so workers can be sized against Atlas connection limits
+"""
+import threading
+from collections import defaultdict
+
+from pymongo import monitoring
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Keeps live per-server counters from the driver's connection pool events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers = defaultdict(lambda: {
+            'open': 0,
+            'checked_out': 0,
+            'waiting': 0,
+            'checkouts': 0,
+            'checkout_failures': 0,
+            'pool_cleared': 0,
+        })
+
+    def _update(self, address, **deltas):
+        with self._lock:
+            counters = self._servers[f'{address[0]}:{address[1]}']
+            for key, delta in deltas.items():
+                counters[key] += delta
+
+    def snapshot(self):
+        """Copy of the counters, per server and summed"""
+        with self._lock:
+            servers = {address: dict(counters) for address, counters in self._servers.items()}
+        totals = defaultdict(int)
+        for counters in servers.values():
+            for key, value in counters.items():
+                totals[key] += value
+        return {'totals': dict(totals), 'servers': servers}
+
+    # Pool lifecycle
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._update(event.address, pool_cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    # Connection lifecycle
+    def connection_created(self, event):
+        self._update(event.address, open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event.address, open=-1)
+
+    # Checkout lifecycle: a checkout that has started but neither succeeded nor
+    # failed yet is a request waiting in the pool's wait queue
+    def connection_check_out_started(self, event):
+        self._update(event.address, waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._update(event.address, waiting=-1, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._update(event.address, waiting=-1, checked_out=1, checkouts=1)
+
+    def connection_checked_in(self, event):
+        self._update(event.address, checked_out=-1)
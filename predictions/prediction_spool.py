@@ -0,0 +1,348 @@
+"""
+Write-behind persistence for MamaCare predictions
+Visits are made durable in a local append-only spool, then replayed into MongoDB in bulk
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from . import spool_files
+
+
+class PredictionSpool:
+    """
+    Local durable spool for patient visits, flushed to MongoDB by a background thread
+
+    Each record holds the patient and prediction documents for one visit. The
+    prediction carries a client-generated _id and both writes are upserts with
+    $setOnInsert, so replaying a record any number of times (after a crash
+    mid-flush, say) stores it exactly once.
+
+    A visit MongoDB rejects (a validation or duplicate key error, not an
+    outage) is retried on later flushes without holding up the others, and
+    moved to a dead-letter file after max_attempts. A visit registering a new
+    patient under an ID another patient already has (a random fallback ID can
+    collide) is dead-lettered at once, with any later visits under that ID,
+    rather than being added to the other patient's record.
+
+    Patients of spooled visits are kept in an in-memory index (see
+    find_patient), so checking an ID during an outage does not rescan the spool.
+    """
+
+    def __init__(self, get_db, spool_path, batch_size=500, flush_interval=1.0, fsync=True, on_flushed=None,
+                 max_attempts=5):
+        """
+        Args:
+            get_db: Callable returning the MongoDB database, or None if unavailable
+            spool_path: Append-only file visits are written to before MongoDB
+            batch_size: Maximum visits per bulk write
+            flush_interval: Seconds between flushes
+            fsync: fsync every append so a visit survives a host crash
+            on_flushed: Optional callable run after visits reach MongoDB (e.g. cache invalidation)
+            max_attempts: Rejections before a visit is moved to the dead-letter file
+        """
+        self._get_db = get_db
+        self.spool_path = Path(spool_path)
+        self.dead_letter_path = spool_files.dead_letter_path(spool_path)
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.on_flushed = on_flushed
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.appended = 0
+        self.flushed = 0
+        self.dead_lettered = 0
+        self.last_flush_at = None
+        self.last_error = None
+        # Spooled patients by file ((device, inode), which survives claim()'s rename):
+        # {file: {patient_id: patient document}}, and how far each file has been read
+        self._index = {}
+        self._index_offsets = {}
+        self._index_lock = threading.Lock()
+        # IDs found to belong to another patient when a new registration was replayed
+        self._collided_ids = set()
+
+    def append(self, patient_doc, prediction_doc, new_patient=False):
+        """
+        Durably record a visit; returns once it is on local disk
+
+        Args:
+            patient_doc: The visit's patient document
+            prediction_doc: The prediction document, with a client-generated _id
+            new_patient: The visit registers patient_doc under a freshly generated ID
+        """
+        record = {'patient': patient_doc, 'prediction': prediction_doc}
+        if new_patient:
+            record['new_patient'] = True
+        spool_files.append_records(self.spool_path, [record], fsync=self.fsync)
+        self.appended += 1
+        self._ensure_thread()
+        self._wakeup.set()
+
+    def _ensure_thread(self):
+        """Start the flusher thread (again, after a fork) on first use"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='prediction-spool', daemon=True)
+            self._thread.start()
+
+    def start(self):
+        """Start flushing in the background (e.g. to drain a spool left by a previous run)"""
+        self._ensure_thread()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            # Let a burst of visits accumulate into one bulk write
+            time.sleep(min(self.flush_interval, 0.2))
+            try:
+                self.flush()
+            except Exception as e:
+                self.last_error = f"{datetime.utcnow().isoformat()}: {e}"
+                print(f"Error flushing prediction spool: {e}")
+
+    def flush(self):
+        """
+        Replay all spooled visits into MongoDB
+
+        Returns:
+            int: Number of visits written (0 if MongoDB is unavailable)
+        """
+        db = self._get_db()
+        if db is None or not spool_files.pending_files(self.spool_path):
+            return 0
+
+        spool_files.adopt_orphans(self.spool_path)
+        replay_path = spool_files.claim(self.spool_path)
+        if replay_path is None:
+            return 0
+
+        written = 0
+        retry = []
+        batch = []
+        for record in spool_files.iter_records(replay_path):
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                written += self._write_records(db, batch, retry)
+                batch = []
+        if batch:
+            written += self._write_records(db, batch, retry)
+        if retry:
+            # Rejected visits go back in the spool (with their attempt counts) for the next flush
+            spool_files.append_records(self.spool_path, retry, fsync=self.fsync)
+
+        # Only discard the claimed records once every batch has been acknowledged;
+        # if we fail before this point they are replayed, and the upserts dedupe them
+        os.remove(replay_path)
+        self.flushed += written
+        self.last_flush_at = datetime.utcnow()
+        self.last_error = None
+        if written and self.on_flushed:
+            self.on_flushed()
+        return written
+
+    def _write_records(self, db, batch, retry):
+        """
+        Write a batch; if MongoDB rejects part of it, write its visits one by one
+
+        Visits rejected individually are added to retry, or dead-lettered once
+        they have used up max_attempts. Outages are raised (the whole claimed
+        file is replayed later).
+
+        Returns:
+            int: Number of visits written
+        """
+        if not any(record['patient'].get('patient_id') in self._collided_ids for record in batch):
+            try:
+                return self._write_batch(db, batch)
+            except Exception as e:
+                if self._is_transient(e):
+                    raise
+        written = 0
+        for record in batch:
+            patient_id = record['patient'].get('patient_id')
+            if patient_id in self._collided_ids and not record.get('new_patient'):
+                # A later visit of the patient whose registration collided
+                self._reject(record, f"Patient ID {patient_id} belongs to another patient", retry, final=True)
+                continue
+            try:
+                written += self._write_batch(db, [record])
+            except Exception as e:
+                if self._is_transient(e):
+                    raise
+                collided = record.get('new_patient') and self._is_duplicate_key(e)
+                if collided:
+                    self._collided_ids.add(patient_id)
+                    e = f"Patient ID {patient_id} already belongs to another patient"
+                self._reject(record, e, retry, final=collided)
+        return written
+
+    @staticmethod
+    def _is_transient(error):
+        """Whether a write failed because MongoDB was unavailable, rather than rejecting the data"""
+        from pymongo.errors import BulkWriteError, ConnectionFailure, PyMongoError, WriteConcernError
+
+        if isinstance(error, (ConnectionFailure, WriteConcernError)):
+            return True
+        if isinstance(error, BulkWriteError):
+            # Only write concern errors: the writes themselves were accepted
+            return not error.details.get('writeErrors')
+        return isinstance(error, PyMongoError) and error.has_error_label('RetryableWriteError')
+
+    @staticmethod
+    def _is_duplicate_key(error):
+        from pymongo.errors import BulkWriteError
+
+        return isinstance(error, BulkWriteError) and any(
+            write_error.get('code') == 11000 for write_error in error.details.get('writeErrors', [])
+        )
+
+    def _reject(self, record, error, retry, final=False):
+        """Count a rejection against a visit, dead-lettering it after max_attempts (at once if final)"""
+        record['attempts'] = record.get('attempts', 0) + 1
+        if record['attempts'] < self.max_attempts and not final:
+            retry.append(record)
+            return
+        record['error'] = str(error)[:1000]
+        record['dead_lettered_at'] = datetime.utcnow()
+        try:
+            spool_files.append_records(self.dead_letter_path, [record], fsync=self.fsync)
+        except OSError as e:
+            print(f"❌ Could not dead-letter visit {record['prediction'].get('_id')}: {e}")
+            retry.append(record)
+            return
+        self.dead_lettered += 1
+        print(f"❌ Moved visit {record['prediction'].get('_id')} to {self.dead_letter_path} "
+              f"after {record['attempts']} rejected writes: {error}")
+
+    @staticmethod
+    def _write_batch(db, batch):
+        """Idempotently upsert a batch of visits"""
+        from pymongo import UpdateOne
+
+        patient_ops = {}
+        prediction_ops = []
+        for record in batch:
+            # The filter field is copied into the upserted document by MongoDB
+            patient = dict(record['patient'])
+            patient_id = patient.pop('patient_id')
+            patient_filter = {'patient_id': patient_id}
+            if record.get('new_patient'):
+                # Match only this registration (so replays stay idempotent): if another
+                # patient has the ID, the unique index rejects the upsert instead
+                patient_filter['created_at'] = patient.pop('created_at')
+            patient_ops.setdefault(patient_id, UpdateOne(
+                patient_filter,
+                {'$setOnInsert': patient},
+                upsert=True
+            ))
+            prediction = dict(record['prediction'])
+            prediction_id = prediction.pop('_id')
+            prediction_ops.append(UpdateOne(
+                {'_id': prediction_id},
+                {'$setOnInsert': prediction},
+                upsert=True
+            ))
+
+        db.patients.bulk_write(list(patient_ops.values()), ordered=False)
+        db.predictions.bulk_write(prediction_ops, ordered=False)
+        return len(prediction_ops)
+
+    def find_patient(self, patient_id):
+        """The patient document of a visit still waiting in the spool, or None"""
+        with self._index_lock:
+            self._refresh_index()
+            for patients in self._index.values():
+                if patient_id in patients:
+                    return patients[patient_id]
+        return None
+
+    def _refresh_index(self):
+        """
+        Catch the spooled-patient index up with the spool files
+
+        Only what was appended since the last refresh is read (by any worker:
+        the spool file is shared), and files that have been replayed and
+        removed are forgotten, so a lookup costs a stat per pending file.
+        """
+        live = {}
+        for path in spool_files.pending_files(self.spool_path):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue  # Claimed and flushed meanwhile (MongoDB has it now)
+            live[(st.st_dev, st.st_ino)] = (path, st.st_size)
+        for key in list(self._index_offsets):
+            if key not in live:
+                self._index.pop(key, None)
+                del self._index_offsets[key]
+
+        for key, (path, size) in live.items():
+            offset = self._index_offsets.get(key, 0)
+            if size < offset:
+                # Shorter than what we read: a new file reusing the inode
+                offset = 0
+                self._index.pop(key, None)
+            if size == offset:
+                continue
+            try:
+                records, offset = spool_files.read_from(path, offset)
+            except FileNotFoundError:
+                continue
+            patients = self._index.setdefault(key, {})
+            for record in records:
+                patients.setdefault(record['patient']['patient_id'], record['patient'])
+            self._index_offsets[key] = offset
+
+    def backlog(self):
+        """
+        Visibility into visits not yet written to MongoDB
+
+        Returns:
+            dict: pending visit count, spool bytes, age of the oldest pending visit,
+                  visits in the dead-letter file, and this process's flush counters
+        """
+        pending = 0
+        size = 0
+        oldest = None
+        for path in spool_files.pending_files(self.spool_path):
+            try:
+                size += path.stat().st_size
+                for record in spool_files.iter_records(path):
+                    pending += 1
+                    created_at = record['prediction'].get('created_at')
+                    if created_at and (oldest is None or created_at < oldest):
+                        oldest = created_at
+            except FileNotFoundError:
+                # Claimed and flushed while we were looking
+                continue
+
+        dead_letters = 0
+        try:
+            dead_letters = sum(1 for _ in spool_files.iter_records(self.dead_letter_path))
+        except FileNotFoundError:
+            pass
+
+        return {
+            'pending_visits': pending,
+            'spool_bytes': size,
+            'oldest_pending_at': oldest,
+            'oldest_pending_age_seconds': (datetime.utcnow() - oldest).total_seconds() if oldest else 0,
+            'appended': self.appended,
+            'flushed': self.flushed,
+            'dead_letter_visits': dead_letters,
+            'dead_lettered': self.dead_lettered,
+            'last_flush_at': self.last_flush_at,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,221 @@
+"""
+On-demand profiling for MamaCare
+Staff arm a session that runs the next N requests to one view under cProfile (and optionally
+tracemalloc); while no session is armed nothing is measured
+"""
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+from django.urls import Resolver404, resolve
+
+
+# Stack depth tracemalloc keeps per allocation (deeper is slower)
+TRACEMALLOC_FRAMES = 10
+
+
+class ProfilingSession:
+    """Aggregated cProfile stats (and memory figures) for the next `requests` requests to one view"""
+
+    def __init__(self, view_name, requests, memory=False, started_by=None, timeout=900):
+        """
+        Args:
+            view_name: URL name of the view to profile
+            requests: Number of requests to profile
+            memory: Also trace allocations with tracemalloc
+            started_by: Username shown on the profiling page
+            timeout: Seconds after which an unfinished session is stopped
+        """
+        self.view_name = view_name
+        self.requested = requests
+        self.memory = memory
+        self.started_by = started_by
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self.started_at = datetime.utcnow()
+        self.finished_at = None
+        self.stop_reason = None
+        self.stats = None
+        self.requests = []
+        self.memory_growth = []
+        self._claimed = 0
+        self._started = time.monotonic()
+        self._baseline = None
+        self._started_tracemalloc = False
+        self._lock = threading.Lock()
+
+        if memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self._started_tracemalloc = True
+            self._baseline = tracemalloc.take_snapshot()
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    @property
+    def completed(self):
+        return len(self.requests)
+
+    def expired(self):
+        return time.monotonic() - self._started > self.timeout
+
+    def claim(self):
+        """Reserve one of the remaining requests (False once all are taken)"""
+        with self._lock:
+            if self.finished or self._claimed >= self.requested:
+                return False
+            self._claimed += 1
+            return True
+
+    def add(self, profile, path, status, elapsed_ms, peak_kb=None):
+        """Merge one profiled request; returns True when it was the last one"""
+        with self._lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+            self.requests.append({
+                'path': path,
+                'status': status,
+                'elapsed_ms': round(elapsed_ms, 1),
+                'peak_kb': peak_kb,
+            })
+            return len(self.requests) >= self.requested
+
+    def finish(self, reason='completed', limit=25):
+        """Stop the session; with memory tracing, diff the heap against the start of the session"""
+        with self._lock:
+            if self.finished:
+                return
+            self.finished_at = datetime.utcnow()
+            self.stop_reason = reason
+        if self._baseline is not None and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ])
+            for stat in snapshot.compare_to(self._baseline, 'lineno')[:limit]:
+                frame = stat.traceback[0]
+                self.memory_growth.append({
+                    'location': f"{frame.filename}:{frame.lineno}",
+                    'size_diff_kb': round(stat.size_diff / 1024, 1),
+                    'size_kb': round(stat.size / 1024, 1),
+                    'count_diff': stat.count_diff,
+                })
+            self._baseline = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+    def report(self, sort='cumulative', limit=60):
+        """The aggregated stats as pstats prints them"""
+        if self.stats is None:
+            return 'No requests profiled yet.'
+        stream = io.StringIO()
+        with self._lock:
+            self.stats.stream = stream
+            self.stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def dump(self):
+        """The aggregated stats in pstats' file format (for snakeviz / pstats.Stats(path))"""
+        with self._lock:
+            return marshal.dumps(self.stats.stats) if self.stats else b''
+
+
+class Profiler:
+    """
+    This worker's profiling switch (one session at a time)
+
+    ProfilingMiddleware only reads `active`, so requests pay nothing while it is None.
+    """
+
+    def __init__(self):
+        self.active = None
+        self.last = None
+        self._lock = threading.Lock()
+
+    def start(self, view_name, requests, memory=False, started_by=None, timeout=900):
+        with self._lock:
+            if self.active is not None:
+                raise ValueError(f"A session for '{self.active.view_name}' is already running")
+            session = ProfilingSession(view_name, requests, memory, started_by, timeout)
+            self.active = self.last = session
+        return session
+
+    def stop(self, reason='stopped'):
+        with self._lock:
+            session, self.active = self.active, None
+        if session is not None:
+            session.finish(reason)
+        return session
+
+    def _finish(self, session, reason):
+        with self._lock:
+            if self.active is session:
+                self.active = None
+        session.finish(reason)
+
+    def handle(self, session, request, get_response):
+        """Serve a request while a session is armed, profiling it if it is one of the session's"""
+        if session.expired():
+            self._finish(session, 'timed out')
+            return get_response(request)
+        try:
+            url_name = resolve(request.path_info).url_name
+        except Resolver404:
+            url_name = None
+        if url_name != session.view_name or not session.claim():
+            return get_response(request)
+
+        profile = cProfile.Profile()
+        if session.memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profile.disable()
+
+        if response.streaming:
+            # The work of a streamed response (e.g. the CSV export) happens while it is sent
+            response.streaming_content = self._profiled_stream(
+                response.streaming_content, session, profile, request.path, response.status_code, started
+            )
+        else:
+            self._record(session, profile, request.path, response.status_code, started)
+        return response
+
+    def _profiled_stream(self, content, session, profile, path, status, started):
+        iterator = iter(content)
+        try:
+            while True:
+                profile.enable()
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    profile.disable()
+                yield chunk
+        finally:
+            self._record(session, profile, path, status, started)
+
+    def _record(self, session, profile, path, status, started):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        peak_kb = None
+        if session.memory and tracemalloc.is_tracing():
+            peak_kb = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        if session.add(profile, path, status, elapsed_ms, peak_kb):
+            self._finish(session, 'completed')
+
+
+profiler = Profiler()
@@ -0,0 +1,152 @@
+"""
+MongoDB command monitoring for MamaCare
+Attributes every command the driver sends to the request (or block of code) that issued it
+"""
+import contextvars
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from pymongo import monitoring
+
+
+# Connection setup and authentication, not queries a view asked for
+IGNORED_COMMANDS = frozenset({
+    'hello', 'ismaster', 'isMaster', 'ping', 'saslStart', 'saslContinue', 'endSessions',
+})
+
+_current = contextvars.ContextVar('mamacare_query_stats', default=None)
+
+
+class QueryStats:
+    """Round trips, time and documents returned for one request"""
+
+    def __init__(self, parent=None):
+        # Stats of the enclosing track_queries() block, which counts these commands too
+        self.parent = parent
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.commands = 0
+        self.failures = 0
+        self.duration_ms = 0.0
+        self.documents = 0
+        self.by_command = Counter()
+
+    def _started(self, request_id, label):
+        with self._lock:
+            self._pending[request_id] = label
+
+    def _finished(self, request_id, duration_micros, documents=0, failed=False):
+        with self._lock:
+            label = self._pending.pop(request_id, '?')
+            self.commands += 1
+            self.failures += int(failed)
+            self.duration_ms += duration_micros / 1000
+            self.documents += documents
+            self.by_command[label] += 1
+
+    def summary(self, top=5):
+        """Most frequent commands, e.g. 'find patients x12, aggregate predictions x2'"""
+        return ', '.join(f'{label} x{count}' for label, count in self.by_command.most_common(top))
+
+    def as_dict(self):
+        return {
+            'commands': self.commands,
+            'failures': self.failures,
+            'duration_ms': round(self.duration_ms, 2),
+            'documents': self.documents,
+            'by_command': dict(self.by_command),
+        }
+
+
+def current_query_stats():
+    """Stats being collected for the current request, or None outside one"""
+    return _current.get()
+
+
+@contextmanager
+def track_queries():
+    """
+    Collect MongoDB commands issued inside the block (and by fan_out work it starts)
+
+    Blocks nest: a command counts towards every enclosing block, so a test's
+    budget still sees the commands the per-request middleware tracks.
+
+    Yields:
+        QueryStats: Filled in as commands complete
+    """
+    stats = QueryStats(parent=_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def assert_max_mongo_queries(limit, max_ms=None):
+    """
+    Fail if the block makes more than limit MongoDB round trips (or takes more than max_ms in MongoDB)
+
+    For tests, e.g.:
+        with assert_max_mongo_queries(3):
+            client.get(reverse('dashboard'))
+    """
+    with track_queries() as stats:
+        yield stats
+    if stats.commands > limit:
+        raise AssertionError(
+            f"Expected at most {limit} MongoDB queries, made {stats.commands}: {stats.summary(top=10)}"
+        )
+    if max_ms is not None and stats.duration_ms > max_ms:
+        raise AssertionError(
+            f"Expected at most {max_ms} ms in MongoDB, took {stats.duration_ms:.1f} ms: {stats.summary(top=10)}"
+        )
+
+
+def _returned_documents(reply):
+    """Documents a command reply carries back (cursor batches; 0 for writes and commands)"""
+    cursor = reply.get('cursor') if isinstance(reply, dict) else None
+    if isinstance(cursor, dict):
+        return len(cursor.get('firstBatch') or cursor.get('nextBatch') or [])
+    return 0
+
+
+def _trackers():
+    """The current QueryStats and those of the blocks enclosing it"""
+    stats = _current.get()
+    while stats is not None:
+        yield stats
+        stats = stats.parent
+
+
+class QueryMonitorListener(monitoring.CommandListener):
+    """
+    Adds each command to the QueryStats of the context that issued it
+
+    pymongo publishes command events on the thread running the operation, so
+    the context variable set by track_queries() identifies the request.
+    Commands from background threads (audit writer, prediction spool) run
+    outside any request and are not counted.
+    """
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        target = event.command.get(event.command_name)
+        label = f'{event.command_name} {target}' if isinstance(target, str) else event.command_name
+        for stats in _trackers():
+            stats._started(event.request_id, label)
+
+    def succeeded(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        documents = _returned_documents(event.reply)
+        for stats in _trackers():
+            stats._finished(event.request_id, event.duration_micros, documents)
+
+    def failed(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        for stats in _trackers():
+            stats._finished(event.request_id, event.duration_micros, failed=True)
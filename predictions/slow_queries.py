@@ -0,0 +1,228 @@
+"""
+Slow query log for MamaCare's MongoDB access
+Keeps the most recent slow commands (with redacted filters and sampled explain plans) for the admin pages
+"""
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from pymongo import monitoring
+
+
+# Read commands explain() can be run for; writes are never re-run, not even explained
+EXPLAINABLE_COMMANDS = {'find', 'aggregate', 'count', 'distinct'}
+
+# Commands that carry no query of their own
+IGNORED_COMMANDS = frozenset({
+    'hello', 'ismaster', 'isMaster', 'ping', 'saslStart', 'saslContinue', 'endSessions',
+    'explain', 'getMore', 'killCursors',
+})
+
+# Driver bookkeeping fields dropped from a command before it is explained
+_DRIVER_FIELDS = ('lsid', 'txnNumber', 'autocommit', 'startTransaction', 'readConcern', 'writeConcern')
+
+
+def query_shape(value):
+    """
+    A filter / pipeline with every value replaced by '?'
+
+    Field names, operators and '$field' references are kept so queries of the
+    same shape look the same; patient names, IDs and dates never reach the log.
+    """
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            shape = query_shape(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    if isinstance(value, str) and value.startswith('$'):
+        return value
+    return '?'
+
+
+def explainable_command(command):
+    """A command as recorded by the driver, minus the session / transaction fields explain rejects"""
+    return {key: value for key, value in command.items()
+            if not key.startswith('$') and key not in _DRIVER_FIELDS}
+
+
+def command_filter(command_name, command):
+    """The part of a command that selects documents"""
+    if command_name == 'find':
+        return command.get('filter', {})
+    if command_name == 'aggregate':
+        return command.get('pipeline', [])
+    if command_name in ('count', 'distinct', 'findAndModify'):
+        return command.get('query', {})
+    if command_name in ('update', 'delete'):
+        statements = command.get('updates') or command.get('deletes') or []
+        return [statement.get('q', {}) for statement in statements]
+    return {}
+
+
+def _returned(reply):
+    """nReturned for a reply: the first cursor batch, or n for counts and writes"""
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        return len(cursor.get('firstBatch') or [])
+    n = reply.get('n')
+    return n if isinstance(n, int) else None
+
+
+def _plan_stages(plan):
+    """'FETCH > IXSCAN(created_at_1)' for a winning plan tree"""
+    stages = []
+    while isinstance(plan, dict):
+        plan = plan.get('queryPlan', plan)
+        stage = plan.get('stage', '?')
+        if plan.get('indexName'):
+            stage = f"{stage}({plan['indexName']})"
+        stages.append(stage)
+        plan = plan.get('inputStage') or (plan.get('inputStages') or [None])[0]
+    return ' > '.join(stages)
+
+
+def _find_key(document, key):
+    """The first value stored under key anywhere in an explain document"""
+    if isinstance(document, dict):
+        if key in document:
+            return document[key]
+        values = document.values()
+    elif isinstance(document, list):
+        values = document
+    else:
+        return None
+    for value in values:
+        found = _find_key(value, key)
+        if found is not None:
+            return found
+    return None
+
+
+def summarize_explain(explain):
+    """
+    The useful (and value-free) parts of explain('executionStats')
+
+    Returns:
+        dict: winning plan stages, whether it scans the whole collection, and
+              documents / keys examined against documents returned
+    """
+    planner = _find_key(explain, 'queryPlanner') or {}
+    stats = _find_key(explain, 'executionStats') or {}
+    plan = _plan_stages(planner.get('winningPlan'))
+    return {
+        'plan': plan,
+        'collection_scan': 'COLLSCAN' in plan,
+        'docs_examined': stats.get('totalDocsExamined'),
+        'keys_examined': stats.get('totalKeysExamined'),
+        'n_returned': stats.get('nReturned'),
+        'execution_ms': stats.get('executionTimeMillis'),
+    }
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    """
+    Ring buffer of this worker's slowest recent MongoDB commands
+
+    Commands taking at least threshold_ms are recorded from the driver's
+    command events. A sampled fraction is re-run as explain('executionStats')
+    on a background thread (reads only), so plans like COLLSCAN show up next
+    to the timing without slowing the request that was already slow.
+    """
+
+    def __init__(self, threshold_ms=100, capacity=200, explain_rate=0.1, explain=None):
+        """
+        Args:
+            threshold_ms: Commands at least this slow are recorded
+            capacity: Entries kept (oldest dropped first)
+            explain_rate: Fraction (0-1) of explainable slow commands to explain
+            explain: Callable(database_name, command) returning the explain output
+        """
+        self.threshold_ms = threshold_ms
+        self.explain_rate = explain_rate
+        self._explain = explain
+        self._entries = deque(maxlen=capacity)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self.recorded = 0
+
+    # CommandListener
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        with self._lock:
+            self._pending[event.request_id] = (event.command, event.database_name)
+
+    def succeeded(self, event):
+        self._finished(event, reply=event.reply)
+
+    def failed(self, event):
+        self._finished(event, error=(event.failure or {}).get('errmsg'))
+
+    def _finished(self, event, reply=None, error=None):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        with self._lock:
+            command, database_name = self._pending.pop(event.request_id, (None, None))
+        duration_ms = event.duration_micros / 1000
+        if command is None or duration_ms < self.threshold_ms:
+            return
+
+        name = event.command_name
+        target = command.get(name)
+        entry = {
+            'at': datetime.utcnow(),
+            'command': name,
+            'collection': target if isinstance(target, str) else None,
+            'filter': query_shape(command_filter(name, command)),
+            'sort': dict(command['sort']) if isinstance(command.get('sort'), dict) else None,
+            'duration_ms': round(duration_ms, 1),
+            'n_returned': _returned(reply) if reply else None,
+            'error': error,
+            'explain': None,
+        }
+        with self._lock:
+            self._entries.append(entry)
+            self.recorded += 1
+
+        if (self._explain and name in EXPLAINABLE_COMMANDS and error is None
+                and random.random() < self.explain_rate
+                and not any('$out' in stage or '$merge' in stage for stage in command.get('pipeline', []))):
+            self._get_executor().submit(self._capture_explain, entry, database_name, explainable_command(command))
+
+    def _get_executor(self):
+        """Lazily create the single background thread that runs explains"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query-explain')
+        return self._executor
+
+    def _capture_explain(self, entry, database_name, command):
+        try:
+            entry['explain'] = summarize_explain(self._explain(database_name, command))
+        except Exception as e:
+            entry['explain'] = {'error': str(e)}
+
+    def entries(self, limit=None):
+        """Recorded slow commands, newest first"""
+        with self._lock:
+            entries = list(self._entries)
+        entries.reverse()
+        return entries[:limit] if limit else entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            'threshold_ms': self.threshold_ms,
+            'explain_rate': self.explain_rate,
+            'recorded': self.recorded,
+            'buffered': len(self._entries),
+        }
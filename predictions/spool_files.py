@@ -0,0 +1,180 @@
+"""
+Append-only spool files shared by MamaCare's background writers
+Appends and claims are serialised across threads and worker processes with a lock file
+"""
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from bson import json_util
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines: fall back to in-process locking
+    fcntl = None
+
+
+_thread_lock = threading.Lock()
+
+
+@contextmanager
+def _locked(path):
+    """Hold an exclusive lock for `path` (via `<path>.lock`) across threads and processes"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _thread_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(path.with_name(path.name + '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def append_records(path, records, fsync=False):
+    """
+    Append records to a spool file as extended-JSON lines
+
+    Args:
+        path: Spool file path
+        records: Iterable of BSON-compatible dicts
+        fsync: Force the data to stable storage before returning
+    """
+    data = ''.join(json_util.dumps(record) + '\n' for record in records)
+    with _locked(path):
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def dead_letter_path(path):
+    """File that records rejected too many times are moved to, for inspection"""
+    path = Path(path)
+    return path.with_name(path.name + '.dead')
+
+
+def _process_start(pid):
+    """Start time of a process in clock ticks since boot, or None without /proc (or once it has exited)"""
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Fields after the command name, which is in parentheses and may contain spaces;
+    # starttime is field 22 of the whole line
+    return stat[stat.rindex(b')') + 2:].split()[19].decode()
+
+
+_owner_tags = {}
+
+
+def _owner_tag():
+    """This process's `<pid>-<start time>` (just `<pid>` without /proc), so a reused pid is not mistaken for it"""
+    pid = os.getpid()
+    if pid not in _owner_tags:
+        start = _process_start(pid)
+        _owner_tags[pid] = f'{pid}-{start}' if start else str(pid)
+    return _owner_tags[pid]
+
+
+def _owner_alive(tag):
+    """Whether the process that wrote a replay file's owner tag is still running"""
+    pid, _, start = tag.partition('-')
+    try:
+        pid = int(pid)
+    except ValueError:
+        return True  # Not a replay file we named; leave it alone
+    if start:
+        return _process_start(pid) == start
+    return _pid_alive(pid)
+
+
+def claim(path):
+    """
+    Atomically take ownership of everything currently in a spool file
+
+    The file is renamed to `<path>.<pid>-<start time>.replay`, so appends that
+    happen afterwards start a fresh spool and only one process replays each record.
+
+    Returns:
+        Path of the claimed file, or None if the spool was empty
+    """
+    path = Path(path)
+    claimed = path.with_name(f'{path.name}.{_owner_tag()}.replay')
+    with _locked(path):
+        if claimed.exists():
+            # A previous replay in this process did not finish; keep both batches
+            if path.exists():
+                with open(path, encoding='utf-8') as src, open(claimed, 'a', encoding='utf-8') as dst:
+                    dst.write(src.read())
+                os.remove(path)
+            return claimed
+        try:
+            os.replace(path, claimed)
+        except FileNotFoundError:
+            return None
+    return claimed
+
+
+def adopt_orphans(path):
+    """Re-claim replay files left behind by worker processes that have exited"""
+    path = Path(path)
+    mine = path.with_name(f'{path.name}.{_owner_tag()}.replay')
+    adopted = 0
+    with _locked(path):
+        for replay in path.parent.glob(f'{path.name}.*.replay'):
+            if replay == mine or _owner_alive(replay.name[len(path.name) + 1:-len('.replay')]):
+                continue
+            with open(replay, encoding='utf-8') as src, open(mine, 'a', encoding='utf-8') as dst:
+                dst.write(src.read())
+            os.remove(replay)
+            adopted += 1
+    return adopted
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def iter_records(path):
+    """Yield the records stored in a spool or replay file"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json_util.loads(line)
+
+
+def read_from(path, offset):
+    """
+    Records appended to a spool or replay file after byte offset (complete lines only)
+
+    Returns:
+        tuple: (list of records, offset to read from next time)
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    # A concurrent append may be half written: leave a partial last line for next time
+    end = data.rfind(b'\n') + 1
+    records = [json_util.loads(line) for line in data[:end].splitlines() if line.strip()]
+    return records, offset + end
+
+
+def pending_files(path):
+    """The spool file plus any replay files that still hold unwritten records"""
+    path = Path(path)
+    files = [path] if path.exists() else []
+    files += sorted(path.parent.glob(f'{path.name}.*.replay')) if path.parent.exists() else []
+    return files
@@ -0,0 +1,197 @@
+"""
+Worker start-up for MamaCare
+Times each boot phase and brings the Django schema up to date without migrating in every worker
+"""
+import hashlib
+import os
+import pkgutil
+import sys
+import time
+from contextlib import contextmanager
+from importlib import import_module
+
+
+class BootTimer:
+    """
+    Durations of this worker's start-up phases
+
+    Phases timed before report() are printed together once the worker is
+    ready; lazy ones (ML models, MongoDB) are printed when they happen.
+    Every phase is also exported as mamacare_boot_phase_seconds.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.reported = False
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        self.phases[name] = seconds
+        if self.reported:
+            print(f"✓ Worker {os.getpid()}: {name} took {seconds:.2f}s", file=sys.stderr)
+            self._publish(name, seconds)
+
+    def report(self):
+        """Print (and export) the boot phases so far and the total time to ready"""
+        total = time.perf_counter() - self.started
+        phases = ', '.join(f"{name} {seconds:.2f}s" for name, seconds in self.phases.items())
+        print(f"✓ Worker {os.getpid()} ready in {total:.2f}s ({phases})", file=sys.stderr)
+        self.phases['ready'] = total
+        for name, seconds in self.phases.items():
+            self._publish(name, seconds)
+        self.reported = True
+
+    @staticmethod
+    def _publish(name, seconds):
+        try:
+            from .metrics import BOOT_PHASE_SECONDS
+            BOOT_PHASE_SECONDS.labels(name).set(seconds)
+        except Exception as e:
+            print(f"⚠ Could not export boot phase {name}: {e}", file=sys.stderr)
+
+
+boot_timer = BootTimer()
+
+
+def migration_fingerprint():
+    """
+    The migrations on disk, found by listing migration packages (nothing is imported but the packages)
+
+    Returns:
+        tuple: (set of (app_label, migration name), short hash of them)
+    """
+    from django.apps import apps
+    from django.db.migrations.loader import MigrationLoader
+
+    migrations = set()
+    for app_config in apps.get_app_configs():
+        module_name, _ = MigrationLoader.migrations_module(app_config.label)
+        if module_name is None:
+            continue
+        try:
+            module = import_module(module_name)
+        except ImportError:
+            continue
+        for _, name, is_package in pkgutil.iter_modules(getattr(module, '__path__', [])):
+            if not is_package and name[0] not in '_~':
+                migrations.add((app_config.label, name))
+    digest = hashlib.sha1(repr(sorted(migrations)).encode()).hexdigest()[:12]
+    return migrations, digest
+
+
+def pending_migrations(connection):
+    """Migrations on disk that the database has not recorded as applied (one query)"""
+    from django.db.migrations.recorder import MigrationRecorder
+
+    on_disk, _ = migration_fingerprint()
+    recorder = MigrationRecorder(connection)
+    applied = set(recorder.applied_migrations()) if recorder.has_table() else set()
+    return on_disk - applied
+
+
+@contextmanager
+def file_lock(path, timeout=300):
+    """Exclusive lock on a file shared by every worker on this machine"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    deadline = time.monotonic() + timeout
+    with open(path, 'a+') as handle:
+        try:
+            import fcntl
+        except ImportError:
+            # Windows
+            import msvcrt
+            lock = lambda: msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+            unlock = lambda: msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            lock = lambda: fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            unlock = lambda: fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        while True:
+            try:
+                lock()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Timed out waiting for {path}")
+                time.sleep(0.1)
+        try:
+            yield
+        finally:
+            unlock()
+
+
+def ensure_admin_user():
+    """
+    Create the admin user if it is missing (create_admin is idempotent)
+
+    Runs on every boot, not only after migrating: an up-to-date schema whose
+    admin was never created (or whose first create_admin failed) still gets one.
+    """
+    from django.core.management import call_command
+    from django.db import IntegrityError
+
+    try:
+        call_command('create_admin')
+    except IntegrityError:
+        # Another worker created it between the existence check and the insert
+        pass
+
+
+def ensure_schema():
+    """
+    Apply missing Django migrations once, whichever worker gets there first
+
+    Up-to-date databases cost one query against django_migrations. Otherwise
+    the first worker takes STARTUP_LOCK_PATH and migrates; workers waiting on
+    the lock find nothing left to do. Every worker then makes sure the admin
+    user exists (a fresh database on Render's ephemeral disk has none).
+
+    Returns:
+        str: What happened ('up to date', 'migrated', 'disabled' or 'failed')
+    """
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+
+    if not settings.MIGRATE_ON_STARTUP:
+        return 'disabled'
+    try:
+        if connection.vendor == 'sqlite':
+            db_dir = os.path.dirname(str(settings.DATABASES['default']['NAME']))
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+        with boot_timer.phase('db_connect'):
+            connection.ensure_connection()
+        with boot_timer.phase('schema_check'):
+            pending = pending_migrations(connection)
+        status = 'up to date'
+
+        if pending:
+            with boot_timer.phase('migrate'):
+                with file_lock(settings.STARTUP_LOCK_PATH):
+                    # Another worker may have migrated while this one waited
+                    pending = pending_migrations(connection)
+                    if pending:
+                        print(f"Applying {len(pending)} migration(s) on startup...", file=sys.stderr)
+                        call_command('migrate', interactive=False, run_syncdb=True, verbosity=1)
+                        _, digest = migration_fingerprint()
+                        print(f"✓ Database schema up to date (migrations {digest})", file=sys.stderr)
+                        status = 'migrated'
+
+        with boot_timer.phase('admin_user'):
+            ensure_admin_user()
+        return status
+    except Exception as e:
+        # Don't fail startup: pages that need no database still work
+        print(f"❌ Database initialization failed: {e}", file=sys.stderr)
+        import traceback
+        traceback.print_exc(file=sys.stderr)
+        print("WARNING: Application will start but login/registration may not work!", file=sys.stderr)
+        return 'failed'
@@ -0,0 +1,74 @@
+"""
+Pluggable storage backends for MamaCare
+settings.STORAGE_BACKEND picks where patients, predictions and audit logs live
+"""
+import threading
+
+from django.conf import settings
+
+from .base import StorageBackend
+from .memory import InMemoryStorage
+from .sqlite import SQLiteStorage
+
+
+BACKENDS = ('mongodb', 'sqlite', 'memory')
+
+
+def get_storage_backend(name=None):
+    """
+    Build the configured storage backend
+
+    Args:
+        name: Backend name; defaults to MONGODB_SETTINGS['backend'] if set,
+              otherwise settings.STORAGE_BACKEND
+
+    Returns:
+        StorageBackend: A new backend instance
+    """
+    name = (name or settings.MONGODB_SETTINGS.get('backend') or getattr(settings, 'STORAGE_BACKEND', 'mongodb')).lower()
+    if name == 'mongodb':
+        # Imported here: db_service builds the global instance through this function
+        from ..db_service import MongoDBService
+        return MongoDBService()
+    if name == 'sqlite':
+        return SQLiteStorage(settings.SQLITE_STORAGE_PATH)
+    if name == 'memory':
+        return InMemoryStorage()
+    raise ValueError(f"Unknown STORAGE_BACKEND '{name}' (expected one of: {', '.join(BACKENDS)})")
+
+
+class LazyStorage:
+    """
+    Proxy that builds its backend on first use
+
+    Importing a module holding one costs nothing: no client, background
+    writers or files exist until something actually needs storage.
+    """
+
+    def __init__(self, factory):
+        """
+        Args:
+            factory: Callable returning the backend (called at most once)
+        """
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        """Whether the backend has been built yet"""
+        return self._instance is not None
+
+    def get(self):
+        """The backend, building it if needed"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+__all__ = ['BACKENDS', 'InMemoryStorage', 'LazyStorage', 'SQLiteStorage', 'StorageBackend', 'get_storage_backend']
@@ -0,0 +1,201 @@
+"""
+Storage interface for MamaCare
+Every backend (MongoDB, SQLite, in-memory) implements the methods the views rely on
+"""
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+
+from ..patient_ids import PatientIdAllocator, random_patient_id
+
+
+class StorageBackend(ABC):
+    """
+    Patients, predictions, audit logs and statistics
+
+    Documents are plain dicts shaped like the MongoDB documents: `_id` as a
+    string, naive UTC datetimes in `created_at` / `updated_at`, and the raw
+    form values under `input_data`. Read methods return empty results (and
+    write methods None) when the store is unavailable rather than raising.
+    """
+
+    #: Short name used in logs and status endpoints
+    name = 'base'
+
+    # --- Patients ---
+
+    @property
+    def patient_ids(self):
+        """This backend's patient ID allocator (created on first use)"""
+        allocator = self.__dict__.get('_patient_id_allocator')
+        if allocator is None:
+            allocator = self.__dict__.setdefault('_patient_id_allocator', PatientIdAllocator(
+                self._reserve_patient_ids,
+                find_taken=self._taken_patient_ids,
+                block_size=getattr(settings, 'PATIENT_ID_BLOCK_SIZE', 100)
+            ))
+        return allocator
+
+    def generate_patient_id(self):
+        """Generate a unique patient ID (format: MC-XXXXXX) without a lookup per patient"""
+        patient_id = self.patient_ids.next_id()
+        if patient_id is None:
+            print("⚠ Warning: Could not reserve patient IDs, falling back to a random ID")
+            return random_patient_id()
+        return patient_id
+
+    @abstractmethod
+    def _reserve_patient_ids(self, count):
+        """Atomically advance the patient ID counter by count; returns the first reserved sequence or None"""
+
+    @abstractmethod
+    def _taken_patient_ids(self, patient_ids):
+        """The subset of patient_ids already registered"""
+
+    @abstractmethod
+    def get_or_create_patient(self, patient_id=None, patient_name=None):
+        """Get existing patient or create new one; returns {'patient_id', 'patient_name'} or None"""
+
+    @abstractmethod
+    def search_patient(self, patient_id):
+        """Look up a patient by ID; returns {'patient_id', 'patient_name', 'created_at'} or None"""
+
+    @abstractmethod
+    def search_patients(self, query, limit=10):
+        """Patients whose name tokens or ID start with the query's tokens, best match first"""
+
+    @abstractmethod
+    def rebuild_search_index(self, only_missing=True):
+        """(Re)compute patient search and blocking keys; returns the number of patients updated"""
+
+    @abstractmethod
+    def iter_patients(self, batch_size=1000):
+        """Stream every patient's {'patient_id', 'patient_name'}"""
+
+    @abstractmethod
+    def get_all_patients(self, search_term=None, limit=100):
+        """Patients (optionally matching search_term) with visit_count, last_visit and last_risk"""
+
+    @abstractmethod
+    def get_patients_list(self, search_query=None, limit=100):
+        """Newest patients (optionally matching search_query) with prediction_count"""
+
+    # --- Predictions ---
+
+    @abstractmethod
+    def save_prediction(self, user_id, patient_id, patient_name, input_data, predictions):
+        """Store a prediction; returns its ID as a string, or None on failure"""
+
+    def save_visit(self, user_id, patient_id, patient_name, input_data, predictions):
+        """
+        Record a patient visit (patient + prediction)
+
+        Backends with a slow or remote store may defer the writes; the default
+        writes both immediately. An existing patient_id must be registered; the
+        visit is recorded under its registered name.
+
+        Returns:
+            tuple: (patient dict, prediction ID str or None);
+                   (None, None) if patient_id is not registered
+        """
+        if patient_id and self.search_patient(patient_id) is None:
+            return None, None
+        patient = self.get_or_create_patient(patient_id=patient_id, patient_name=patient_name)
+        if not patient:
+            patient = {'patient_id': patient_id or self.generate_patient_id(), 'patient_name': patient_name or 'Unknown'}
+        prediction_id = self.save_prediction(
+            user_id, patient['patient_id'], patient['patient_name'], input_data, predictions
+        )
+        return patient, prediction_id
+
+    @abstractmethod
+    def get_user_predictions(self, user_id, limit=50):
+        """Recent predictions made by a health worker, newest first"""
+
+    @abstractmethod
+    def get_patient_predictions(self, patient_id, limit=50):
+        """Recent predictions for a patient, newest first"""
+
+    @abstractmethod
+    def get_all_predictions(self, limit=100):
+        """Recent predictions across all users, newest first"""
+
+    @abstractmethod
+    def get_predictions_by_date_range(self, start_date, end_date, limit=1000):
+        """Predictions created between start_date and end_date, newest first"""
+
+    @abstractmethod
+    def iter_predictions(self, start_date=None, end_date=None, projection=None, batch_size=1000):
+        """Stream predictions newest first without materialising them all in memory (errors partway through propagate)"""
+
+    # --- Statistics ---
+
+    @abstractmethod
+    def get_statistics(self):
+        """Totals by risk, unique patients / health workers and last-7-day count"""
+
+    @abstractmethod
+    def get_statistics_by_date_range(self, start_date, end_date):
+        """Totals by risk for predictions created in the date range"""
+
+    @abstractmethod
+    def get_daily_statistics(self, days=30):
+        """Per-day [{'_id': 'YYYY-MM-DD', 'count', 'high_risk', 'low_risk'}] for the last N days"""
+
+    @abstractmethod
+    def get_report_summary(self, start_date=None, end_date=None, top_workers=10):
+        """Totals, monthly trend and top health workers for the PDF summary report"""
+
+    @abstractmethod
+    def get_health_worker_stats(self, user_id):
+        """Totals and first / last prediction dates for one health worker"""
+
+    @abstractmethod
+    def get_all_health_workers(self):
+        """Every health worker with activity stats, most active first"""
+
+    # --- Duplicate patients ---
+
+    @abstractmethod
+    def find_patients_by_block_keys(self, keys, limit=200):
+        """Patients sharing at least one duplicate-detection blocking key"""
+
+    @abstractmethod
+    def iter_block_members(self, batch_size=1000):
+        """Stream (blocking key, {'patient_id', 'patient_name'}) for every key of every patient, in key order"""
+
+    @abstractmethod
+    def save_duplicate_candidates(self, candidates):
+        """Upsert likely-duplicate pairs for review (keeping any review status); returns the count"""
+
+    @abstractmethod
+    def get_duplicate_candidates(self, status='pending', limit=100):
+        """Likely-duplicate pairs with the given review status, highest score first"""
+
+    @abstractmethod
+    def set_duplicate_candidate_status(self, candidate_id, status, user_id):
+        """Record a reviewer's decision on a pair; returns True if it was found"""
+
+    # --- Audit logs ---
+
+    @abstractmethod
+    def log_action(self, user_id, action_type, details):
+        """Record an audit log entry; returns its ID as a string, or None on failure"""
+
+    @abstractmethod
+    def get_audit_logs(self, user_id=None, action_type=None, limit=100):
+        """Audit log entries (optionally filtered), newest first"""
+
+    # --- Operational status ---
+
+    def pool_stats(self):
+        """Connection / pool status for the status endpoint"""
+        return {'backend': self.name}
+
+    def write_behind_stats(self):
+        """Backlog of writes not yet persisted (empty when writes are synchronous)"""
+        return {}
+
+    def slow_queries(self, limit=None):
+        """Recent slow database commands, newest first (empty when the backend does not record them)"""
+        return []
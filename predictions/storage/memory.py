@@ -0,0 +1,355 @@
+"""
+In-memory storage backend for MamaCare
+Keeps everything in process memory; for tests, benchmarks and local development without MongoDB
+"""
+import copy
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from ..duplicates import block_keys
+from ..patient_search import matches, rank_patients
+from .base import StorageBackend
+
+
+def _risk_counts(predictions):
+    """Totals by risk level, as returned by get_statistics"""
+    return {
+        'total_predictions': len(predictions),
+        'high_risk_count': sum(1 for p in predictions if p.get('general_risk') == 'High'),
+        'low_risk_count': sum(1 for p in predictions if p.get('general_risk') == 'Low'),
+        'preeclampsia_count': sum(1 for p in predictions if 'Present' in (p.get('preeclampsia_risk') or '')),
+        'gdm_count': sum(1 for p in predictions if 'GDM' in (p.get('gdm_risk') or '')),
+    }
+
+
+class InMemoryStorage(StorageBackend):
+    """
+    Storage backend holding patients, predictions and audit logs in dicts
+
+    Data lives only as long as the process and is not shared between workers.
+    Documents are copied on the way in and out so callers cannot mutate the store.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        """Drop all stored data"""
+        with self._lock:
+            self._patients = {}
+            self._predictions = []
+            self._audit_logs = []
+            self._duplicate_candidates = {}
+            self._patient_id_sequence = 0
+        self.patient_ids.discard()
+
+    def _newest_first(self, documents, limit=None):
+        ordered = sorted(documents, key=lambda d: d['created_at'], reverse=True)
+        if limit is not None:
+            ordered = ordered[:limit]
+        return [copy.deepcopy(d) for d in ordered]
+
+    def _in_range(self, start_date, end_date):
+        with self._lock:
+            return [p for p in self._predictions if start_date <= p['created_at'] <= end_date]
+
+    # --- Patients ---
+
+    def _reserve_patient_ids(self, count):
+        with self._lock:
+            start = self._patient_id_sequence
+            self._patient_id_sequence += count
+            return start
+
+    def _taken_patient_ids(self, patient_ids):
+        with self._lock:
+            return [patient_id for patient_id in patient_ids if patient_id in self._patients]
+
+    def get_or_create_patient(self, patient_id=None, patient_name=None):
+        """Get existing patient or create new one"""
+        with self._lock:
+            if patient_id and patient_id in self._patients:
+                patient = self._patients[patient_id]
+                return {'patient_id': patient_id, 'patient_name': patient.get('patient_name', 'Unknown')}
+            if not patient_name:
+                return None
+            patient_id = patient_id or self.generate_patient_id()
+            now = datetime.utcnow()
+            self._patients[patient_id] = {
+                '_id': uuid.uuid4().hex,
+                'patient_id': patient_id,
+                'patient_name': patient_name,
+                'created_at': now,
+                'updated_at': now
+            }
+            return {'patient_id': patient_id, 'patient_name': patient_name}
+
+    def search_patient(self, patient_id):
+        """Search for a patient by ID"""
+        with self._lock:
+            patient = self._patients.get(patient_id)
+            if not patient:
+                return None
+            return {
+                'patient_id': patient['patient_id'],
+                'patient_name': patient.get('patient_name', 'Unknown'),
+                'created_at': patient.get('created_at')
+            }
+
+    def _find_patients(self, search_term):
+        with self._lock:
+            patients = list(self._patients.values())
+        if search_term:
+            patients = [p for p in patients if matches(p, search_term)]
+        return patients
+
+    def search_patients(self, query, limit=10):
+        """Ranked patient search for autocomplete (a scan; fine at in-memory sizes)"""
+        return [
+            {key: patient.get(key) for key in ('patient_id', 'patient_name', 'created_at')}
+            for patient in rank_patients(self._find_patients(query), query, limit)
+        ]
+
+    def rebuild_search_index(self, only_missing=True):
+        """Nothing to rebuild: search and blocking keys are computed on the fly"""
+        return 0
+
+    def iter_patients(self, batch_size=1000):
+        """Stream every patient's ID and name"""
+        for patient in self._find_patients(None):
+            yield {'patient_id': patient['patient_id'], 'patient_name': patient.get('patient_name')}
+
+    def get_all_patients(self, search_term=None, limit=100):
+        """Get all patients with optional search"""
+        patients = [copy.deepcopy(p) for p in self._find_patients(search_term)[:limit]]
+        for patient in patients:
+            visits = self.get_patient_predictions(patient['patient_id'], limit=None)
+            patient['visit_count'] = len(visits)
+            patient['last_visit'] = visits[0]['created_at'] if visits else None
+            patient['last_risk'] = visits[0].get('general_risk') if visits else None
+        return patients
+
+    def get_patients_list(self, search_query=None, limit=100):
+        """Get list of all patients with optional search"""
+        patients = self._newest_first(self._find_patients(search_query), limit)
+        with self._lock:
+            counts = defaultdict(int)
+            for pred in self._predictions:
+                counts[pred['patient_id']] += 1
+        for patient in patients:
+            patient['prediction_count'] = counts[patient['patient_id']]
+        return patients
+
+    # --- Predictions ---
+
+    def save_prediction(self, user_id, patient_id, patient_name, input_data, predictions):
+        """Save prediction results in memory"""
+        now = datetime.utcnow()
+        prediction_doc = {
+            '_id': uuid.uuid4().hex,
+            'user_id': str(user_id),
+            'patient_id': patient_id,
+            'patient_name': patient_name,
+            'input_data': copy.deepcopy(input_data),
+            'predictions': copy.deepcopy(predictions),
+            'general_risk': predictions.get('general_risk'),
+            'preeclampsia_risk': predictions.get('preeclampsia_risk'),
+            'gdm_risk': predictions.get('gdm_risk'),
+            'overall_assessment': predictions.get('overall_assessment'),
+            'created_at': now,
+            'updated_at': now
+        }
+        with self._lock:
+            self._predictions.append(prediction_doc)
+        return prediction_doc['_id']
+
+    def get_user_predictions(self, user_id, limit=50):
+        """Get recent predictions made by a specific health worker"""
+        with self._lock:
+            matching = [p for p in self._predictions if p['user_id'] == str(user_id)]
+        return self._newest_first(matching, limit)
+
+    def get_patient_predictions(self, patient_id, limit=50):
+        """Get all predictions for a specific patient (by patient_id)"""
+        with self._lock:
+            matching = [p for p in self._predictions if p['patient_id'] == patient_id]
+        return self._newest_first(matching, limit)
+
+    def get_all_predictions(self, limit=100):
+        """Get all predictions (for admin dashboard)"""
+        with self._lock:
+            return self._newest_first(self._predictions, limit)
+
+    def get_predictions_by_date_range(self, start_date, end_date, limit=1000):
+        """Get predictions filtered by date range"""
+        return self._newest_first(self._in_range(start_date, end_date), limit)
+
+    def iter_predictions(self, start_date=None, end_date=None, projection=None, batch_size=1000):
+        """Stream predictions newest first (projection is ignored: whole documents are returned)"""
+        if start_date and end_date:
+            predictions = self.get_predictions_by_date_range(start_date, end_date, limit=None)
+        else:
+            predictions = self.get_all_predictions(limit=None)
+        yield from predictions
+
+    # --- Statistics ---
+
+    def get_statistics(self):
+        """Get aggregated statistics for dashboard"""
+        with self._lock:
+            predictions = list(self._predictions)
+        seven_days_ago = datetime.utcnow() - timedelta(days=7)
+        stats = _risk_counts(predictions)
+        stats.update({
+            'unique_patients': len({p['patient_id'] for p in predictions}),
+            'unique_health_workers': len({p['user_id'] for p in predictions}),
+            'recent_predictions': sum(1 for p in predictions if p['created_at'] >= seven_days_ago)
+        })
+        return stats
+
+    def get_statistics_by_date_range(self, start_date, end_date):
+        """Get statistics filtered by date range"""
+        stats = _risk_counts(self._in_range(start_date, end_date))
+        stats.update({'start_date': start_date, 'end_date': end_date})
+        return stats
+
+    def get_daily_statistics(self, days=30):
+        """Get daily statistics for charting"""
+        end_date = datetime.utcnow()
+        days_by_date = defaultdict(lambda: {'count': 0, 'high_risk': 0, 'low_risk': 0})
+        for pred in self._in_range(end_date - timedelta(days=days), end_date):
+            day = days_by_date[pred['created_at'].strftime('%Y-%m-%d')]
+            day['count'] += 1
+            day['high_risk'] += pred.get('general_risk') == 'High'
+            day['low_risk'] += pred.get('general_risk') == 'Low'
+        return [{'_id': key, **value} for key, value in sorted(days_by_date.items())]
+
+    def get_report_summary(self, start_date=None, end_date=None, top_workers=10):
+        """Totals, monthly trend and top health workers for the PDF summary report"""
+        if start_date and end_date:
+            predictions = self._in_range(start_date, end_date)
+        else:
+            with self._lock:
+                predictions = list(self._predictions)
+
+        totals = _risk_counts(predictions)
+        totals['unique_patients'] = len({p['patient_id'] for p in predictions})
+        totals['unique_health_workers'] = len({p['user_id'] for p in predictions})
+
+        months = defaultdict(lambda: {'count': 0, 'high_risk': 0, 'preeclampsia': 0, 'gdm': 0})
+        workers = defaultdict(lambda: {'total_predictions': 0, 'high_risk_count': 0})
+        for pred in predictions:
+            month = months[pred['created_at'].strftime('%Y-%m')]
+            month['count'] += 1
+            month['high_risk'] += pred.get('general_risk') == 'High'
+            month['preeclampsia'] += 'Present' in (pred.get('preeclampsia_risk') or '')
+            month['gdm'] += 'GDM' in (pred.get('gdm_risk') or '')
+            worker = workers[pred['user_id']]
+            worker['total_predictions'] += 1
+            worker['high_risk_count'] += pred.get('general_risk') == 'High'
+
+        health_workers = sorted(
+            ({'_id': key, **value} for key, value in workers.items()),
+            key=lambda w: w['total_predictions'], reverse=True
+        )
+        return {
+            'totals': totals,
+            'monthly': [{'_id': key, **value} for key, value in sorted(months.items())],
+            'health_workers': health_workers[:top_workers],
+            'start_date': start_date,
+            'end_date': end_date
+        }
+
+    def get_health_worker_stats(self, user_id):
+        """Get statistics for a specific health worker"""
+        predictions = self.get_user_predictions(user_id, limit=None)
+        return {
+            'total_predictions': len(predictions),
+            'high_risk_count': sum(1 for p in predictions if p.get('general_risk') == 'High'),
+            'first_prediction': predictions[-1]['created_at'] if predictions else None,
+            'last_prediction': predictions[0]['created_at'] if predictions else None
+        }
+
+    def get_all_health_workers(self):
+        """Get list of all health workers with their activity stats"""
+        with self._lock:
+            user_ids = {p['user_id'] for p in self._predictions}
+        health_workers = [{'user_id': user_id, **self.get_health_worker_stats(user_id)} for user_id in user_ids]
+        health_workers.sort(key=lambda x: x['total_predictions'], reverse=True)
+        return health_workers
+
+    # --- Duplicate patients ---
+
+    def find_patients_by_block_keys(self, keys, limit=200):
+        """Patients sharing at least one blocking key (a scan; fine at in-memory sizes)"""
+        keys = set(keys)
+        found = [
+            patient for patient in self.iter_patients()
+            if keys.intersection(block_keys(patient['patient_name']))
+        ]
+        return found[:limit]
+
+    def iter_block_members(self, batch_size=1000):
+        """Stream (blocking key, patient) pairs in key order (sorted in memory; fine at in-memory sizes)"""
+        members = [
+            (key, patient)
+            for patient in self.iter_patients()
+            for key in block_keys(patient['patient_name'])
+        ]
+        members.sort(key=lambda member: (member[0], member[1]['patient_id']))
+        yield from members
+
+    def save_duplicate_candidates(self, candidates):
+        """Upsert likely-duplicate pairs, keeping any review decision"""
+        with self._lock:
+            for candidate in candidates:
+                existing = self._duplicate_candidates.get(candidate['_id'], {'status': 'pending'})
+                self._duplicate_candidates[candidate['_id']] = {**existing, **copy.deepcopy(candidate)}
+        return len(candidates)
+
+    def get_duplicate_candidates(self, status='pending', limit=100):
+        """Likely-duplicate pairs with the given review status, highest score first"""
+        with self._lock:
+            matching = [c for c in self._duplicate_candidates.values() if c['status'] == status]
+        matching.sort(key=lambda c: c['score'], reverse=True)
+        return [copy.deepcopy(c) for c in matching[:limit]]
+
+    def set_duplicate_candidate_status(self, candidate_id, status, user_id):
+        """Record a reviewer's decision on a pair"""
+        with self._lock:
+            candidate = self._duplicate_candidates.get(candidate_id)
+            if candidate is None:
+                return False
+            candidate.update({'status': status, 'reviewed_by': str(user_id), 'reviewed_at': datetime.utcnow()})
+            return True
+
+    # --- Audit logs ---
+
+    def log_action(self, user_id, action_type, details):
+        """Log system actions for audit trail"""
+        log_entry = {
+            '_id': uuid.uuid4().hex,
+            'user_id': str(user_id),
+            'action_type': action_type,
+            'details': copy.deepcopy(details),
+            'created_at': datetime.utcnow(),
+            'ip_address': None
+        }
+        with self._lock:
+            self._audit_logs.append(log_entry)
+        return log_entry['_id']
+
+    def get_audit_logs(self, user_id=None, action_type=None, limit=100):
+        """Get audit logs with optional filters"""
+        with self._lock:
+            logs = [
+                log for log in self._audit_logs
+                if (not user_id or log['user_id'] == str(user_id))
+                and (not action_type or log['action_type'] == action_type)
+            ]
+        return self._newest_first(logs, limit)
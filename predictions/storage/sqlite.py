@@ -0,0 +1,701 @@
+"""
+SQLite storage backend for MamaCare
+A single local database file for small clinics running offline, without a MongoDB server
+"""
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from ..duplicates import block_keys
+from ..patient_ids import random_patient_id
+from ..patient_search import (
+    EXACT_MARK, ID_MARK, MAX_CANDIDATES, exact_keys, id_prefix_keys, query_keys, rank_patients, search_keys
+)
+from .base import StorageBackend
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    _id TEXT PRIMARY KEY,
+    patient_id TEXT NOT NULL UNIQUE,
+    patient_name TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS patients_created_at ON patients (created_at);
+
+-- One row per search key (name token / ID prefix) per patient
+CREATE TABLE IF NOT EXISTS patient_search_keys (
+    key TEXT NOT NULL,
+    patient_id TEXT NOT NULL,
+    PRIMARY KEY (key, patient_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS patient_search_keys_patient ON patient_search_keys (patient_id);
+
+-- Duplicate-detection blocking keys, one row per key per patient
+CREATE TABLE IF NOT EXISTS patient_block_keys (
+    key TEXT NOT NULL,
+    patient_id TEXT NOT NULL,
+    PRIMARY KEY (key, patient_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS patient_block_keys_patient ON patient_block_keys (patient_id);
+
+CREATE TABLE IF NOT EXISTS duplicate_candidates (
+    _id TEXT PRIMARY KEY,
+    patient_a TEXT NOT NULL,
+    patient_b TEXT NOT NULL,
+    name_a TEXT,
+    name_b TEXT,
+    score REAL NOT NULL,
+    block_key TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    detected_at TEXT NOT NULL,
+    reviewed_by TEXT,
+    reviewed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS duplicate_candidates_status_score ON duplicate_candidates (status, score);
+
+CREATE TABLE IF NOT EXISTS predictions (
+    _id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    patient_id TEXT NOT NULL,
+    patient_name TEXT,
+    input_data TEXT,
+    predictions TEXT,
+    general_risk TEXT,
+    preeclampsia_risk TEXT,
+    gdm_risk TEXT,
+    overall_assessment TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS predictions_created_at ON predictions (created_at);
+CREATE INDEX IF NOT EXISTS predictions_user_created_at ON predictions (user_id, created_at);
+CREATE INDEX IF NOT EXISTS predictions_patient_created_at ON predictions (patient_id, created_at);
+
+CREATE TABLE IF NOT EXISTS audit_logs (
+    _id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    action_type TEXT,
+    details TEXT,
+    created_at TEXT NOT NULL,
+    ip_address TEXT
+);
+CREATE INDEX IF NOT EXISTS audit_logs_created_at ON audit_logs (created_at);
+CREATE INDEX IF NOT EXISTS audit_logs_action_created_at ON audit_logs (action_type, created_at);
+CREATE INDEX IF NOT EXISTS audit_logs_user_created_at ON audit_logs (user_id, created_at);
+
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL
+);
+"""
+
+# Counts shared by the statistics queries; LIKE mirrors the $regex substring matches
+RISK_COUNTS_SQL = """
+    COUNT(*) AS total_predictions,
+    COALESCE(SUM(general_risk = 'High'), 0) AS high_risk_count,
+    COALESCE(SUM(general_risk = 'Low'), 0) AS low_risk_count,
+    COALESCE(SUM(preeclampsia_risk LIKE '%Present%'), 0) AS preeclampsia_count,
+    COALESCE(SUM(gdm_risk LIKE '%GDM%'), 0) AS gdm_count
+"""
+
+JSON_COLUMNS = ('input_data', 'predictions', 'details')
+DATETIME_COLUMNS = (
+    'created_at', 'updated_at', 'last_visit', 'first_prediction', 'last_prediction', 'detected_at', 'reviewed_at',
+)
+
+
+def _ts(value):
+    """Datetime to the sortable text form stored in created_at columns"""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ', timespec='microseconds')
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time()).isoformat(sep=' ', timespec='microseconds')
+    return value
+
+
+def _document(row):
+    """Turn a row into a dict shaped like the MongoDB document"""
+    doc = dict(row)
+    for key in JSON_COLUMNS:
+        if doc.get(key) is not None:
+            doc[key] = json.loads(doc[key])
+    for key in DATETIME_COLUMNS:
+        if doc.get(key) is not None:
+            doc[key] = datetime.fromisoformat(doc[key])
+    return doc
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Storage backend on an indexed SQLite database
+
+    Each thread gets its own connection (WAL mode, so readers never block the
+    writer); connections are re-opened after a fork. Datetimes are stored as
+    ISO text so range queries and ordering use the created_at indexes.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path, timeout=10.0):
+        """
+        Args:
+            path: Database file (created, along with its directory, if missing)
+            timeout: Seconds to wait for a write lock held by another process
+        """
+        self.path = Path(path)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _conn(self):
+        """This thread's connection, opened (and the schema created) on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=self.timeout)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        with self._schema_lock:
+            if not self._schema_ready:
+                conn.executescript(SCHEMA)
+                self._schema_ready = True
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _query(self, sql, params=()):
+        return [_document(row) for row in self._conn().execute(sql, params)]
+
+    def _query_one(self, sql, params=()):
+        rows = self._query(sql, params)
+        return rows[0] if rows else None
+
+    def _execute(self, sql, params=()):
+        conn = self._conn()
+        with conn:
+            conn.execute(sql, params)
+
+    # --- Patients ---
+
+    def _reserve_patient_ids(self, count):
+        """Advance the patient ID counter inside one write transaction"""
+        conn = self._conn()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO counters (name, seq) VALUES ('patient_id', ?) "
+                    "ON CONFLICT (name) DO UPDATE SET seq = seq + excluded.seq",
+                    (count,)
+                )
+                seq = conn.execute("SELECT seq FROM counters WHERE name = 'patient_id'").fetchone()[0]
+            return seq - count
+        except sqlite3.Error as e:
+            print(f"Error reserving patient IDs: {e}")
+            return None
+
+    def _taken_patient_ids(self, patient_ids):
+        placeholders = ', '.join('?' * len(patient_ids))
+        try:
+            rows = self._conn().execute(
+                f'SELECT patient_id FROM patients WHERE patient_id IN ({placeholders})', patient_ids
+            ).fetchall()
+            return [row['patient_id'] for row in rows]
+        except sqlite3.Error as e:
+            print(f"Error checking patient IDs: {e}")
+            return []
+
+    def get_or_create_patient(self, patient_id=None, patient_name=None):
+        """Get existing patient or create new one"""
+        try:
+            if patient_id:
+                patient = self.search_patient(patient_id)
+                if patient:
+                    return {'patient_id': patient['patient_id'], 'patient_name': patient['patient_name']}
+            if not patient_name:
+                return None
+            patient_id = patient_id or self.generate_patient_id()
+            now = _ts(datetime.utcnow())
+            conn = self._conn()
+            with conn:
+                inserted = conn.execute(
+                    'INSERT OR IGNORE INTO patients (_id, patient_id, patient_name, created_at, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (uuid.uuid4().hex, patient_id, patient_name, now, now)
+                ).rowcount
+                if inserted:
+                    self._index_patient(conn, patient_id, patient_name)
+            return {'patient_id': patient_id, 'patient_name': patient_name}
+        except sqlite3.Error as e:
+            print(f"Error in get_or_create_patient: {e}")
+            return {'patient_id': patient_id or random_patient_id(), 'patient_name': patient_name or 'Unknown'}
+
+    def search_patient(self, patient_id):
+        """Search for a patient by ID"""
+        try:
+            patient = self._query_one(
+                'SELECT patient_id, patient_name, created_at FROM patients WHERE patient_id = ?', (patient_id,)
+            )
+            if patient:
+                patient['patient_name'] = patient['patient_name'] or 'Unknown'
+            return patient
+        except sqlite3.Error as e:
+            print(f"Error searching patient: {e}")
+            return None
+
+    @staticmethod
+    def _index_patient(conn, patient_id, patient_name):
+        for table, keys in (
+            ('patient_search_keys', search_keys(patient_id, patient_name)),
+            ('patient_block_keys', block_keys(patient_name)),
+        ):
+            conn.execute(f'DELETE FROM {table} WHERE patient_id = ?', (patient_id,))
+            conn.executemany(
+                f'INSERT INTO {table} (key, patient_id) VALUES (?, ?)', [(key, patient_id) for key in keys]
+            )
+
+    @staticmethod
+    def _patient_filter(search_term, keys=None):
+        """WHERE clause matching every token of search_term (or every one of keys) through the search key index"""
+        if not search_term:
+            return '', ()
+        id_keys = [] if keys else id_prefix_keys(search_term)
+        keys = keys or query_keys(search_term)
+        if not keys:
+            return 'WHERE 0', ()
+        lookups = ' INTERSECT '.join(['SELECT patient_id FROM patient_search_keys WHERE key = ?'] * len(keys))
+        if id_keys:
+            # 'MC-00' style ID prefixes, which the name-token keys don't cover
+            return (
+                f'WHERE p.patient_id IN ({lookups}) '
+                f'OR p.patient_id IN (SELECT patient_id FROM patient_search_keys WHERE key = ?)',
+                (*keys, *id_keys)
+            )
+        return f'WHERE p.patient_id IN ({lookups})', tuple(keys)
+
+    def search_patients(self, query, limit=10):
+        """Ranked patient search for autocomplete"""
+        if not query_keys(query):
+            return []
+        try:
+            # Exact ID / whole-token matches and 'MC-00' style ID prefixes first, as the
+            # prefix lookup stops at MAX_CANDIDATES
+            candidates = []
+            seen = set()
+            for keys in (exact_keys(query), id_prefix_keys(query), query_keys(query)):
+                if not keys:
+                    continue
+                where, params = self._patient_filter(query, keys)
+                for patient in self._query(
+                    f'SELECT p.patient_id, p.patient_name, p.created_at FROM patients p {where} LIMIT ?',
+                    (*params, MAX_CANDIDATES)
+                ):
+                    if patient['patient_id'] not in seen:
+                        seen.add(patient['patient_id'])
+                        candidates.append(patient)
+            return rank_patients(candidates, query, limit)
+        except sqlite3.Error as e:
+            print(f"Error searching patients: {e}")
+            return []
+
+    def rebuild_search_index(self, only_missing=True):
+        """Compute search and blocking keys for patients (only those without any, or without whole-token or ID-prefix keys, by default)"""
+        where = (
+            'WHERE patient_id NOT IN (SELECT patient_id FROM patient_block_keys)'
+            ' OR patient_id NOT IN (SELECT patient_id FROM patient_search_keys WHERE key >= ? AND key < ?)'
+            ' OR patient_id NOT IN (SELECT patient_id FROM patient_search_keys WHERE key >= ? AND key < ?)'
+        ) if only_missing else ''
+        params = (
+            EXACT_MARK, chr(ord(EXACT_MARK) + 1), ID_MARK, chr(ord(ID_MARK) + 1)
+        ) if only_missing else ()
+        conn = self._conn()
+        try:
+            patients = conn.execute(f'SELECT patient_id, patient_name FROM patients {where}', params).fetchall()
+            with conn:
+                for patient in patients:
+                    self._index_patient(conn, patient['patient_id'], patient['patient_name'])
+            return len(patients)
+        except sqlite3.Error as e:
+            print(f"Error rebuilding patient search index: {e}")
+            return 0
+
+    def iter_patients(self, batch_size=1000):
+        """Stream every patient's ID and name"""
+        try:
+            cursor = self._conn().execute('SELECT patient_id, patient_name FROM patients')
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+        except sqlite3.Error as e:
+            print(f"Error streaming patients: {e}")
+
+    def get_all_patients(self, search_term=None, limit=100):
+        """Get all patients with optional search"""
+        where, params = self._patient_filter(search_term)
+        try:
+            # Latest visit per patient via the (patient_id, created_at) index
+            return self._query(f"""
+                SELECT p.*,
+                    (SELECT COUNT(*) FROM predictions WHERE patient_id = p.patient_id) AS visit_count,
+                    latest.created_at AS last_visit,
+                    latest.general_risk AS last_risk
+                FROM patients p
+                LEFT JOIN predictions latest ON latest._id = (
+                    SELECT _id FROM predictions WHERE patient_id = p.patient_id
+                    ORDER BY created_at DESC LIMIT 1
+                )
+                {where}
+                LIMIT ?
+            """, (*params, limit))
+        except sqlite3.Error as e:
+            print(f"Error fetching patients: {e}")
+            return []
+
+    def get_patients_list(self, search_query=None, limit=100):
+        """Get list of all patients with optional search"""
+        where, params = self._patient_filter(search_query)
+        try:
+            return self._query(f"""
+                SELECT p.*,
+                    (SELECT COUNT(*) FROM predictions WHERE patient_id = p.patient_id) AS prediction_count
+                FROM patients p
+                {where}
+                ORDER BY p.created_at DESC
+                LIMIT ?
+            """, (*params, limit))
+        except sqlite3.Error as e:
+            print(f"Error fetching patients list: {e}")
+            return []
+
+    # --- Predictions ---
+
+    def save_prediction(self, user_id, patient_id, patient_name, input_data, predictions):
+        """Save prediction results to SQLite"""
+        prediction_id = uuid.uuid4().hex
+        now = _ts(datetime.utcnow())
+        try:
+            self._execute("""
+                INSERT INTO predictions (
+                    _id, user_id, patient_id, patient_name, input_data, predictions, general_risk,
+                    preeclampsia_risk, gdm_risk, overall_assessment, created_at, updated_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                prediction_id, str(user_id), patient_id, patient_name,
+                json.dumps(input_data, default=str), json.dumps(predictions, default=str),
+                predictions.get('general_risk'), predictions.get('preeclampsia_risk'),
+                predictions.get('gdm_risk'), predictions.get('overall_assessment'), now, now
+            ))
+            print(f"✓ Prediction saved to SQLite with ID: {prediction_id}")
+            return prediction_id
+        except sqlite3.Error as e:
+            print(f"❌ Error saving prediction to SQLite: {e}")
+            return None
+
+    def _predictions(self, where='', params=(), limit=None):
+        sql = f'SELECT * FROM predictions {where} ORDER BY created_at DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params = (*params, limit)
+        try:
+            return self._query(sql, params)
+        except sqlite3.Error as e:
+            print(f"Error fetching predictions: {e}")
+            return []
+
+    def get_user_predictions(self, user_id, limit=50):
+        """Get recent predictions made by a specific health worker"""
+        return self._predictions('WHERE user_id = ?', (str(user_id),), limit)
+
+    def get_patient_predictions(self, patient_id, limit=50):
+        """Get all predictions for a specific patient (by patient_id)"""
+        return self._predictions('WHERE patient_id = ?', (patient_id,), limit)
+
+    def get_all_predictions(self, limit=100):
+        """Get all predictions (for admin dashboard)"""
+        return self._predictions(limit=limit)
+
+    def get_predictions_by_date_range(self, start_date, end_date, limit=1000):
+        """Get predictions filtered by date range"""
+        return self._predictions('WHERE created_at BETWEEN ? AND ?', (_ts(start_date), _ts(end_date)), limit)
+
+    def iter_predictions(self, start_date=None, end_date=None, projection=None, batch_size=1000):
+        """Stream predictions newest first (projection is ignored: whole rows are returned)"""
+        where, params = '', ()
+        if start_date and end_date:
+            where, params = 'WHERE created_at BETWEEN ? AND ?', (_ts(start_date), _ts(end_date))
+        try:
+            cursor = self._conn().execute(f'SELECT * FROM predictions {where} ORDER BY created_at DESC', params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield _document(row)
+        except sqlite3.Error as e:
+            # Re-raised: a stream that just stopped would look like a complete export
+            print(f"Error streaming predictions: {e}")
+            raise
+
+    # --- Statistics ---
+
+    def get_statistics(self):
+        """Get aggregated statistics for dashboard"""
+        seven_days_ago = _ts(datetime.utcnow() - timedelta(days=7))
+        try:
+            return dict(self._conn().execute(f"""
+                SELECT {RISK_COUNTS_SQL},
+                    COUNT(DISTINCT patient_id) AS unique_patients,
+                    COUNT(DISTINCT user_id) AS unique_health_workers,
+                    COALESCE(SUM(created_at >= ?), 0) AS recent_predictions
+                FROM predictions
+            """, (seven_days_ago,)).fetchone())
+        except sqlite3.Error as e:
+            print(f"Error fetching statistics: {e}")
+            return {}
+
+    def get_statistics_by_date_range(self, start_date, end_date):
+        """Get statistics filtered by date range"""
+        try:
+            stats = dict(self._conn().execute(
+                f'SELECT {RISK_COUNTS_SQL} FROM predictions WHERE created_at BETWEEN ? AND ?',
+                (_ts(start_date), _ts(end_date))
+            ).fetchone())
+            stats.update({'start_date': start_date, 'end_date': end_date})
+            return stats
+        except sqlite3.Error as e:
+            print(f"Error fetching date range statistics: {e}")
+            return {}
+
+    def get_daily_statistics(self, days=30):
+        """Get daily statistics for charting"""
+        end_date = datetime.utcnow()
+        try:
+            rows = self._conn().execute("""
+                SELECT substr(created_at, 1, 10) AS _id,
+                    COUNT(*) AS count,
+                    SUM(general_risk = 'High') AS high_risk,
+                    SUM(general_risk = 'Low') AS low_risk
+                FROM predictions
+                WHERE created_at BETWEEN ? AND ?
+                GROUP BY substr(created_at, 1, 10)
+                ORDER BY 1
+            """, (_ts(end_date - timedelta(days=days)), _ts(end_date))).fetchall()
+            return [dict(row) for row in rows]
+        except sqlite3.Error as e:
+            print(f"Error fetching daily statistics: {e}")
+            return []
+
+    def get_report_summary(self, start_date=None, end_date=None, top_workers=10):
+        """Totals, monthly trend and top health workers for the PDF summary report"""
+        where, params = '', ()
+        if start_date and end_date:
+            where, params = 'WHERE created_at BETWEEN ? AND ?', (_ts(start_date), _ts(end_date))
+        conn = self._conn()
+        try:
+            totals = dict(conn.execute(f"""
+                SELECT {RISK_COUNTS_SQL},
+                    COUNT(DISTINCT patient_id) AS unique_patients,
+                    COUNT(DISTINCT user_id) AS unique_health_workers
+                FROM predictions {where}
+            """, params).fetchone())
+            monthly = conn.execute(f"""
+                SELECT substr(created_at, 1, 7) AS _id,
+                    COUNT(*) AS count,
+                    SUM(general_risk = 'High') AS high_risk,
+                    SUM(IFNULL(preeclampsia_risk, '') LIKE '%Present%') AS preeclampsia,
+                    SUM(IFNULL(gdm_risk, '') LIKE '%GDM%') AS gdm
+                FROM predictions {where}
+                GROUP BY substr(created_at, 1, 7)
+                ORDER BY 1
+            """, params).fetchall()
+            health_workers = conn.execute(f"""
+                SELECT user_id AS _id,
+                    COUNT(*) AS total_predictions,
+                    SUM(general_risk = 'High') AS high_risk_count
+                FROM predictions {where}
+                GROUP BY user_id
+                ORDER BY total_predictions DESC
+                LIMIT ?
+            """, (*params, top_workers)).fetchall()
+            return {
+                'totals': totals,
+                'monthly': [dict(row) for row in monthly],
+                'health_workers': [dict(row) for row in health_workers],
+                'start_date': start_date,
+                'end_date': end_date
+            }
+        except sqlite3.Error as e:
+            print(f"Error building report summary: {e}")
+            return {}
+
+    def _health_worker_rows(self, where='', params=()):
+        return self._query(f"""
+            SELECT user_id,
+                COUNT(*) AS total_predictions,
+                SUM(general_risk = 'High') AS high_risk_count,
+                MIN(created_at) AS first_prediction,
+                MAX(created_at) AS last_prediction
+            FROM predictions {where}
+            GROUP BY user_id
+            ORDER BY total_predictions DESC
+        """, params)
+
+    def get_health_worker_stats(self, user_id):
+        """Get statistics for a specific health worker"""
+        try:
+            rows = self._health_worker_rows('WHERE user_id = ?', (str(user_id),))
+            if not rows:
+                return {'total_predictions': 0, 'high_risk_count': 0, 'first_prediction': None, 'last_prediction': None}
+            stats = rows[0]
+            stats.pop('user_id')
+            return stats
+        except sqlite3.Error as e:
+            print(f"Error fetching health worker stats: {e}")
+            return {}
+
+    def get_all_health_workers(self):
+        """Get list of all health workers with their activity stats"""
+        try:
+            return self._health_worker_rows()
+        except sqlite3.Error as e:
+            print(f"Error fetching health workers: {e}")
+            return []
+
+    # --- Duplicate patients ---
+
+    def find_patients_by_block_keys(self, keys, limit=200):
+        """Patients sharing at least one duplicate-detection blocking key"""
+        if not keys:
+            return []
+        placeholders = ', '.join('?' * len(keys))
+        try:
+            return self._query(f"""
+                SELECT patient_id, patient_name FROM patients
+                WHERE patient_id IN (SELECT patient_id FROM patient_block_keys WHERE key IN ({placeholders}))
+                LIMIT ?
+            """, (*keys, limit))
+        except sqlite3.Error as e:
+            print(f"Error finding patients by blocking key: {e}")
+            return []
+
+    def iter_block_members(self, batch_size=1000):
+        """Stream (blocking key, patient) pairs in key order, straight off the (key, patient_id) primary key"""
+        try:
+            cursor = self._conn().execute("""
+                SELECT k.key, p.patient_id, p.patient_name
+                FROM patient_block_keys k JOIN patients p ON p.patient_id = k.patient_id
+                ORDER BY k.key, k.patient_id
+            """)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row['key'], {'patient_id': row['patient_id'], 'patient_name': row['patient_name']}
+        except sqlite3.Error as e:
+            # Re-raised: a scan that just stopped would look complete
+            print(f"Error streaming blocking keys: {e}")
+            raise
+
+    def save_duplicate_candidates(self, candidates):
+        """Upsert likely-duplicate pairs, keeping any review decision"""
+        try:
+            conn = self._conn()
+            with conn:
+                conn.executemany("""
+                    INSERT INTO duplicate_candidates
+                        (_id, patient_a, patient_b, name_a, name_b, score, block_key, detected_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (_id) DO UPDATE SET
+                        name_a = excluded.name_a, name_b = excluded.name_b, score = excluded.score,
+                        block_key = excluded.block_key, detected_at = excluded.detected_at
+                """, [
+                    (c['_id'], *c['patient_ids'], *c['patient_names'], c['score'], c['block_key'],
+                     _ts(c['detected_at']))
+                    for c in candidates
+                ])
+            return len(candidates)
+        except sqlite3.Error as e:
+            print(f"Error saving duplicate candidates: {e}")
+            return 0
+
+    def get_duplicate_candidates(self, status='pending', limit=100):
+        """Likely-duplicate pairs with the given review status, highest score first"""
+        try:
+            rows = self._query(
+                'SELECT * FROM duplicate_candidates WHERE status = ? ORDER BY score DESC LIMIT ?', (status, limit)
+            )
+        except sqlite3.Error as e:
+            print(f"Error fetching duplicate candidates: {e}")
+            return []
+        for row in rows:
+            row['patient_ids'] = [row.pop('patient_a'), row.pop('patient_b')]
+            row['patient_names'] = [row.pop('name_a'), row.pop('name_b')]
+        return rows
+
+    def set_duplicate_candidate_status(self, candidate_id, status, user_id):
+        """Record a reviewer's decision on a pair"""
+        try:
+            conn = self._conn()
+            with conn:
+                updated = conn.execute(
+                    'UPDATE duplicate_candidates SET status = ?, reviewed_by = ?, reviewed_at = ? WHERE _id = ?',
+                    (status, str(user_id), _ts(datetime.utcnow()), candidate_id)
+                ).rowcount
+            return updated > 0
+        except sqlite3.Error as e:
+            print(f"Error updating duplicate candidate: {e}")
+            return False
+
+    # --- Audit logs ---
+
+    def log_action(self, user_id, action_type, details):
+        """Log system actions for audit trail"""
+        log_id = uuid.uuid4().hex
+        try:
+            self._execute(
+                'INSERT INTO audit_logs (_id, user_id, action_type, details, created_at, ip_address) '
+                'VALUES (?, ?, ?, ?, ?, NULL)',
+                (log_id, str(user_id), action_type, json.dumps(details, default=str), _ts(datetime.utcnow()))
+            )
+            return log_id
+        except sqlite3.Error as e:
+            print(f"Error logging action: {e}")
+            return None
+
+    def get_audit_logs(self, user_id=None, action_type=None, limit=100):
+        """Get audit logs with optional filters"""
+        conditions, params = [], []
+        if user_id:
+            conditions.append('user_id = ?')
+            params.append(str(user_id))
+        if action_type:
+            conditions.append('action_type = ?')
+            params.append(action_type)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        try:
+            return self._query(
+                f'SELECT * FROM audit_logs {where} ORDER BY created_at DESC LIMIT ?', (*params, limit)
+            )
+        except sqlite3.Error as e:
+            print(f"Error fetching audit logs: {e}")
+            return []
+
+    def pool_stats(self):
+        """Database file and size for the status endpoint"""
+        return {
+            'backend': self.name,
+            'path': str(self.path),
+            'size_bytes': self.path.stat().st_size if self.path.exists() else 0,
+        }
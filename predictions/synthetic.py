@@ -0,0 +1,298 @@
+"""
+Synthetic data for MamaCare
+Deterministic fake patients, visits and audit logs for index checks and scale testing
+"""
+import random
+from bisect import bisect
+from datetime import datetime, timedelta
+
+from .duplicates import block_keys
+from .patient_ids import format_patient_id
+from .patient_search import search_keys
+
+
+FIRST_NAMES = [
+    'Wanjiru', 'Akinyi', 'Achieng', 'Njeri', 'Wambui', 'Atieno', 'Nyambura', 'Chebet',
+    'Jepkoech', 'Mwikali', 'Zawadi', 'Amina', 'Fatuma', 'Halima', 'Neema', 'Rehema',
+    'Grace', 'Faith', 'Mercy', 'Joyce', 'Esther', 'Mary', 'Nafula', 'Nekesa', 'Kerubo',
+]
+LAST_NAMES = [
+    'Kamau', 'Otieno', 'Mwangi', 'Odhiambo', 'Njoroge', 'Kiprotich', 'Mutua', 'Wafula',
+    'Ochieng', 'Kariuki', 'Mohamed', 'Ali', 'Omondi', 'Wekesa', 'Chepkemoi', 'Nyaga',
+    'Kimani', 'Onyango', 'Mutiso', 'Barasa', 'Juma', 'Hassan', 'Moraa', 'Nyamweya',
+]
+
+# Actions logged alongside visits (prediction_made is logged once per visit)
+AUDIT_ACTIONS = [
+    ('dashboard_view', 20), ('login', 15), ('patient_view', 8),
+    ('patients_management_view', 3), ('export_csv', 2), ('health_worker_view', 1), ('login_failed', 1),
+]
+
+
+# Antenatal schedule: (up to gestational week, weeks between visits)
+VISIT_INTERVALS = [(28, 4), (36, 2), (42, 1)]
+
+
+def _clamp(value, low, high, digits=None):
+    """Keep a generated value inside the range PredictionForm accepts"""
+    value = min(max(value, low), high)
+    return round(value, digits) if digits is not None else int(round(value))
+
+
+def overall_assessment(general_risk, preeclampsia_risk, gdm_risk):
+    """The overall assessment ml_service would report for these predictions"""
+    if general_risk == 'High' or 'Present' in preeclampsia_risk:
+        return 'HIGH RISK - Immediate medical attention recommended'
+    # ml_service matches 'GDM' as a substring, which 'Non-GDM' contains too
+    if 'GDM' in gdm_risk:
+        return 'MODERATE RISK - Regular monitoring advised'
+    return 'LOW RISK - Continue routine care'
+
+
+class SyntheticPopulation:
+    """
+    Generates documents in the shapes MongoDBService stores
+
+    The same seed (and end) always yields the same patients, visits and audit
+    logs. Each patient has a risk profile that their visits vary around: blood
+    pressure rises with gestation and with preeclampsia, visits follow the
+    antenatal schedule (monthly, fortnightly from 28 weeks, weekly from 36),
+    and a few health workers see most of the patients.
+    """
+
+    def __init__(self, seed=0, health_workers=25, days=365, end=None, workload_skew=1.1):
+        """
+        Args:
+            seed: Random seed (output is fully determined by it)
+            health_workers: Number of distinct user_ids visits are attributed to
+            days: Visits and logs are spread over this many days before end
+            end: Latest timestamp generated (default: now)
+            workload_skew: Zipf exponent of the health workers' share of patients (0 = even)
+        """
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.health_workers = [str(user_id) for user_id in range(1, health_workers + 1)]
+        self.end = end or datetime.utcnow()
+        self.start = self.end - timedelta(days=days)
+        self.days = days
+        self.workload_skew = workload_skew
+        total = 0
+        self._worker_weights = []
+        for rank in range(1, health_workers + 1):
+            total += 1 / rank ** workload_skew
+            self._worker_weights.append(total)
+
+    def for_chunk(self, index):
+        """
+        An independent population for one chunk of a larger data set
+
+        Chunk seeds derive from this seed alone, so a data set generated in
+        parallel chunks is the same whatever the number of workers.
+        """
+        return SyntheticPopulation(
+            seed=f'{self.seed}:{index}', health_workers=len(self.health_workers),
+            days=self.days, end=self.end, workload_skew=self.workload_skew
+        )
+
+    def _timestamp(self):
+        return self.start + (self.end - self.start) * self.random.random()
+
+    def health_worker(self):
+        """A health worker's user_id, weighted by workload"""
+        return self.health_workers[bisect(self._worker_weights, self.random.random() * self._worker_weights[-1])]
+
+    def patient_name(self):
+        name = f"{self.random.choice(FIRST_NAMES)} {self.random.choice(LAST_NAMES)}"
+        if self.random.random() < 0.3:
+            name = f"{name} {self.random.choice(LAST_NAMES)}"
+        return name
+
+    def patient(self, sequence, created_at=None):
+        """The patient document for a sequence number (IDs come from the allocator's permutation)"""
+        patient_id = format_patient_id(sequence)
+        patient_name = self.patient_name()
+        created_at = created_at or self._timestamp()
+        return {
+            'patient_id': patient_id,
+            'patient_name': patient_name,
+            'search_keys': search_keys(patient_id, patient_name),
+            'block_keys': block_keys(patient_name),
+            'created_at': created_at,
+            'updated_at': created_at
+        }
+
+    def profile(self):
+        """A patient's fixed characteristics and latent conditions"""
+        rng = self.random
+        age = _clamp(rng.gauss(27, 6), 15, 50)
+        gravida = _clamp(rng.expovariate(1 / 1.6) + 1, 1, 15)
+        chronic_hypertension = rng.random() < 0.05 + (0.05 if age >= 35 else 0)
+        bmi = _clamp(rng.lognormvariate(3.18, 0.18), 15, 50, 1)
+        prediabetes = rng.random() < 0.06 + (0.08 if bmi >= 30 else 0)
+        # Preeclampsia is likelier with hypertension, obesity, age 35+ and a first pregnancy
+        preeclampsia_odds = 0.04 + 0.15 * chronic_hypertension + 0.04 * (bmi >= 30) + 0.03 * (age >= 35) + 0.03 * (gravida == 1)
+        gdm_odds = 0.05 + 0.12 * prediabetes + 0.04 * (bmi >= 30) + 0.03 * (age >= 35)
+        return {
+            'age': age,
+            'gravida': gravida,
+            'parity': rng.randint(0, gravida - 1),
+            'bmi': bmi,
+            'baseline_systolic': rng.gauss(132 if chronic_hypertension else 112, 8),
+            'baseline_diastolic': rng.gauss(86 if chronic_hypertension else 72, 6),
+            'chronic_hypertension': chronic_hypertension,
+            'prediabetes': prediabetes,
+            'preeclampsia': rng.random() < preeclampsia_odds,
+            'preeclampsia_onset': rng.uniform(22, 36),
+            'gdm': rng.random() < gdm_odds,
+            'previous_complications': int(gravida > 1 and rng.random() < 0.15),
+            'family_history': int(rng.random() < 0.2),
+            'pcos': int(rng.random() < 0.08),
+            'sedentary': int(rng.random() < 0.35),
+            'mental_health': int(rng.random() < 0.1),
+            'hemoglobin': rng.gauss(11.8, 1.3),
+            'hdl': rng.gauss(55, 12),
+            'previous_gestation': 0 if gravida == 1 else _clamp(rng.gauss(38, 2), 20, 42),
+            'primary_worker': self.health_worker(),
+        }
+
+    def input_data(self, profile, gestational_age):
+        """The form values measured at a visit at gestational_age weeks"""
+        rng = self.random
+        preeclamptic = profile['preeclampsia'] and gestational_age >= profile['preeclampsia_onset']
+        # Blood pressure dips mid-pregnancy, climbs in the third trimester, and jumps with preeclampsia
+        trend = -3 if 14 <= gestational_age < 26 else max(0.0, gestational_age - 30) * 0.6
+        systolic = profile['baseline_systolic'] + trend + (rng.gauss(32, 10) if preeclamptic else 0) + rng.gauss(0, 6)
+        diastolic = profile['baseline_diastolic'] + trend * 0.6 + (rng.gauss(18, 6) if preeclamptic else 0) + rng.gauss(0, 4)
+        diastolic = min(diastolic, systolic - 20)
+        diabetic = profile['gdm'] and gestational_age >= 24
+        blood_sugar = rng.gauss(9.5, 1.8) if diabetic else rng.gauss(6.3 if profile['prediabetes'] else 5.4, 0.8)
+        return {
+            'age': profile['age'],
+            'systolic_bp': _clamp(systolic, 80, 200),
+            'diastolic_bp': _clamp(diastolic, 40, 120),
+            'bs': _clamp(blood_sugar, 3.0, 20.0, 1),
+            'body_temp': _clamp(rng.gauss(36.9, 0.35), 35.0, 42.0, 1),
+            'heart_rate': _clamp(rng.gauss(82 + gestational_age * 0.25, 9), 50, 150),
+            'previous_complications': profile['previous_complications'],
+            'preexisting_diabetes_flag': int(profile['prediabetes'] and profile['gdm']),
+            'gestational_diabetes_flag_gen_model': int(diabetic),
+            'mental_health': profile['mental_health'],
+            'bmi_val': _clamp(profile['bmi'] + gestational_age * 0.12, 15.0, 50.0, 1),
+            'gravida': profile['gravida'],
+            'parity': profile['parity'],
+            'gestational_age_weeks': round(gestational_age, 1),
+            'num_pregnancies': profile['gravida'],
+            'gestation_previous_pregnancy': profile['previous_gestation'],
+            'diabetes_history_preeclampsia': int(profile['prediabetes']),
+            'history_hypertension': int(profile['chronic_hypertension']),
+            'family_history': profile['family_history'],
+            'unexplained_prenatal_loss': int(profile['previous_complications'] and rng.random() < 0.3),
+            'large_child_birth_default': int(profile['gravida'] > 1 and rng.random() < 0.05),
+            'pcos': profile['pcos'],
+            'sedentary_lifestyle': profile['sedentary'],
+            'prediabetes_flag_gdm': int(profile['prediabetes']),
+            'hemoglobin_val': _clamp(profile['hemoglobin'] + rng.gauss(0, 0.4), 5.0, 20.0, 1),
+            'hdl': _clamp(profile['hdl'] + rng.gauss(0, 3), 20.0, 100.0, 1),
+            'ogtt': _clamp(rng.gauss(185, 25) if diabetic else rng.gauss(120, 15), 50.0, 300.0, 1),
+            'fetal_weight_kgs': _clamp(0.0035 * max(gestational_age - 12, 0) ** 2.2 + rng.gauss(0, 0.05), 0.1, 5.0, 2),
+            'protein_uria': _clamp(rng.gauss(2, 0.8), 1, 5) if preeclamptic else int(rng.random() < 0.03),
+            'amniotic_fluid_levels_cm': _clamp(rng.gauss(min(gestational_age * 0.5, 15), 2.5), 0.0, 30.0, 1),
+        }
+
+    @staticmethod
+    def predictions(input_data):
+        """Risk labels consistent with the measurements (standing in for the models)"""
+        hypertensive = input_data['systolic_bp'] >= 140 or input_data['diastolic_bp'] >= 90
+        preeclampsia = hypertensive and input_data['protein_uria'] > 0 and input_data['gestational_age_weeks'] >= 20
+        gdm = input_data['ogtt'] >= 153 or input_data['bs'] >= 9.0
+        high = (hypertensive or input_data['bs'] >= 11.0 or input_data['body_temp'] >= 38.5
+                or input_data['heart_rate'] >= 120 or input_data['previous_complications'])
+        predictions = {
+            'general_risk': 'High' if high else 'Low',
+            'preeclampsia_risk': 'Preeclampsia Present' if preeclampsia else 'No Preeclampsia',
+            'gdm_risk': 'Gestational Diabetes (GDM)' if gdm else 'Non Gestational Diabetes (Non-GDM)',
+        }
+        predictions['overall_assessment'] = overall_assessment(
+            predictions['general_risk'], predictions['preeclampsia_risk'], predictions['gdm_risk']
+        )
+        return predictions
+
+    def visit(self, patient, user_id=None, created_at=None, profile=None, gestational_age=None):
+        """A prediction document for one visit by the patient"""
+        profile = profile or self.profile()
+        created_at = created_at or self._timestamp()
+        if gestational_age is None:
+            gestational_age = self.random.uniform(8, 40)
+        input_data = self.input_data(profile, gestational_age)
+        predictions = self.predictions(input_data)
+        return {
+            'user_id': user_id or profile['primary_worker'],
+            'patient_id': patient['patient_id'],
+            'patient_name': patient['patient_name'],
+            'input_data': input_data,
+            'predictions': predictions,
+            'general_risk': predictions['general_risk'],
+            'preeclampsia_risk': predictions['preeclampsia_risk'],
+            'gdm_risk': predictions['gdm_risk'],
+            'overall_assessment': predictions['overall_assessment'],
+            'created_at': created_at,
+            'updated_at': created_at
+        }
+
+    def pregnancy(self, sequence):
+        """
+        A patient and their antenatal visits up to end
+
+        Booking happens between 8 and 24 weeks; later visits follow
+        VISIT_INTERVALS with a few days' jitter, some appointments are missed
+        and some patients stop attending.
+
+        Returns:
+            tuple: (patient document, list of visit documents, oldest first)
+        """
+        rng = self.random
+        profile = self.profile()
+        booked_at = self._timestamp()
+        gestational_age = min(rng.triangular(8, 24, 12), 24)
+        patient = self.patient(sequence, created_at=booked_at)
+        visits = []
+        visit_at = booked_at
+        while visit_at <= self.end and gestational_age <= 41:
+            # Another health worker covers one visit in ten
+            user_id = profile['primary_worker'] if rng.random() < 0.9 else self.health_worker()
+            visits.append(self.visit(patient, user_id, visit_at, profile, gestational_age))
+            if rng.random() < 0.04:
+                break
+            interval = next(weeks for limit, weeks in VISIT_INTERVALS if gestational_age < limit)
+            if rng.random() < 0.1:
+                interval *= 2
+            step = interval + rng.uniform(-3, 3) / 7
+            gestational_age += step
+            visit_at += timedelta(weeks=step)
+        patient['updated_at'] = visits[-1]['created_at']
+        return patient, visits
+
+    def audit_log(self, user_id=None, created_at=None, action_type=None, details=None):
+        """One audit log entry"""
+        actions, weights = zip(*AUDIT_ACTIONS)
+        return {
+            'user_id': user_id or self.health_worker(),
+            'action_type': action_type or self.random.choices(actions, weights)[0],
+            'details': details or {},
+            'created_at': created_at or self._timestamp(),
+            'ip_address': None
+        }
+
+    def visit_audit_logs(self, visit, extra_rate=1.0):
+        """The prediction_made entry for a visit plus about extra_rate other actions by the same worker"""
+        logs = [self.audit_log(visit['user_id'], visit['created_at'], 'prediction_made', {
+            'patient_id': visit['patient_id'],
+            'general_risk': visit['general_risk'],
+            'preeclampsia_risk': visit['preeclampsia_risk'],
+            'gdm_risk': visit['gdm_risk']
+        })]
+        extra = int(extra_rate) + (self.random.random() < extra_rate % 1)
+        for _ in range(extra):
+            at = visit['created_at'] + timedelta(minutes=self.random.uniform(-240, 240))
+            logs.append(self.audit_log(visit['user_id'], min(at, self.end)))
+        return logs
@@ -0,0 +1,8 @@
+"""
+Tests for MamaCare
+Run with: python manage.py test predictions
+
+Everything except the MongoDB query budgets runs on the in-memory and SQLite
+storage backends. The budgets run wherever a MongoDB server is reachable
+(TEST_MONGODB_URI, default mongodb://localhost:27017) and are skipped otherwise.
+"""
@@ -0,0 +1,77 @@
+"""
+Aggregate cache tests for MamaCare
+Cached dashboard aggregates, and their invalidation when new predictions are written
+"""
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from ..aggregate_cache import CachedAggregates, aggregates_version, invalidate_aggregates
+from ..storage import InMemoryStorage
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'aggregate-tests'}},
+    AGGREGATE_CACHE_ALIAS='default',
+)
+class CachedAggregatesTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.storage = InMemoryStorage()
+        self.calls = mock.patch.object(self.storage, 'get_statistics', wraps=self.storage.get_statistics).start()
+        self.addCleanup(mock.patch.stopall)
+        self.cached = CachedAggregates(self.storage, {'get_statistics': 60})
+        self.cached.save_prediction(1, 'MC-000001', 'Amina Wanjiru', {}, {'general_risk': 'High'})
+
+    def test_repeated_reads_hit_the_cache(self):
+        first = self.cached.get_statistics()
+        second = self.cached.get_statistics()
+        self.assertEqual(first, second)
+        self.assertEqual(first['total_predictions'], 1)
+        self.assertEqual(self.calls.call_count, 1)
+        self.assertEqual((self.cached.misses, self.cached.hits), (1, 1))
+
+    def test_writes_invalidate_cached_aggregates(self):
+        self.cached.get_statistics()
+        version = aggregates_version()
+        self.cached.save_prediction(1, 'MC-000002', 'Grace Akinyi', {}, {'general_risk': 'Low'})
+        self.assertNotEqual(aggregates_version(), version)
+        self.assertEqual(self.cached.get_statistics()['total_predictions'], 2)
+        self.assertEqual(self.calls.call_count, 2)
+
+    def test_every_invalidation_gets_a_new_version(self):
+        versions = {aggregates_version()}
+        for _ in range(5):
+            invalidate_aggregates()
+            versions.add(aggregates_version())
+        self.assertEqual(len(versions), 6)
+
+    def test_evicted_version_is_recreated(self):
+        self.cached.get_statistics()
+        caches['default'].clear()
+        self.assertIsNotNone(aggregates_version())
+        self.assertEqual(self.cached.get_statistics()['total_predictions'], 1)
+        self.assertEqual(self.calls.call_count, 2)
+
+    def test_empty_results_are_not_cached(self):
+        self.calls.return_value = {}
+        self.cached.get_statistics()
+        self.cached.get_statistics()
+        self.assertEqual(self.calls.call_count, 2)
+
+    def test_uncached_methods_pass_through(self):
+        self.assertEqual(len(self.cached.get_all_predictions(limit=10)), 1)
+        self.assertEqual(self.cached.name, 'memory')
+
+    def test_cache_outage_computes_directly(self):
+        with mock.patch.object(caches['default'], 'get', side_effect=ConnectionError('cache down')):
+            self.assertEqual(self.cached.get_statistics()['total_predictions'], 1)
+
+    def test_waits_for_another_worker_computing_the_same_key(self):
+        key = self.cached._key('get_statistics', (), {})
+        caches['default'].add(f'{key}:lock', 1)
+        cached = CachedAggregates(self.storage, {'get_statistics': 60}, lock_timeout=0.2)
+        # The other worker never finishes: compute it here once the lock wait is over
+        self.assertEqual(cached.get_statistics()['total_predictions'], 1)
+        self.assertEqual(cached.waits, 1)
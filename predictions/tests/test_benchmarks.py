@@ -0,0 +1,92 @@
+"""
+Benchmark comparison tests for MamaCare
+Significance testing between runs, and finding runs in the result store
+"""
+import random
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from ..benchmarks import ResultStore, compare_runs, mann_whitney_u, new_record
+
+
+def samples(center, spread=1.0, count=30, seed=0):
+    generator = random.Random(seed)
+    return [center + generator.uniform(-spread, spread) for _ in range(count)]
+
+
+class MannWhitneyTests(SimpleTestCase):
+    def test_clearly_larger_samples(self):
+        _, p_value = mann_whitney_u(samples(10), samples(20, seed=1))
+        self.assertLess(p_value, 0.001)
+
+    def test_same_distribution(self):
+        _, p_value = mann_whitney_u(samples(10), samples(10, seed=1))
+        self.assertGreater(p_value, 0.01)
+
+    def test_one_sided(self):
+        _, p_value = mann_whitney_u(samples(20), samples(10, seed=1))
+        self.assertGreater(p_value, 0.99)
+
+    def test_degenerate_inputs(self):
+        self.assertEqual(mann_whitney_u([], [1, 2]), (None, 1.0))
+        self.assertEqual(mann_whitney_u([5] * 10, [5] * 10)[1], 1.0)
+
+
+class CompareRunsTests(SimpleTestCase):
+    def _compare(self, before, after, **kwargs):
+        baseline = {'metrics': before}
+        candidate = {'metrics': after}
+        return {row['metric']: row for row in compare_runs(baseline, candidate, **kwargs)}
+
+    def test_statuses(self):
+        rows = self._compare(
+            {'slower': samples(10), 'faster': samples(20), 'same': samples(10), 'gone': samples(10)},
+            {'slower': samples(15, seed=1), 'faster': samples(10, seed=1), 'same': samples(10, seed=1),
+             'new': samples(10, seed=1)},
+        )
+        self.assertEqual(rows['slower']['status'], 'regression')
+        self.assertEqual(rows['faster']['status'], 'improvement')
+        self.assertEqual(rows['same']['status'], 'unchanged')
+        self.assertEqual(rows['gone']['status'], 'missing')
+        self.assertEqual((rows['new']['baseline_n'], rows['new']['candidate_n']), (0, 30))
+        self.assertAlmostEqual(rows['slower']['change'], 0.5, delta=0.1)
+
+    def test_significant_but_small_change_is_not_a_regression(self):
+        rows = self._compare({'query': samples(100, spread=0.1)}, {'query': samples(102, spread=0.1, seed=1)})
+        self.assertLess(rows['query']['p_value'], 0.01)
+        self.assertEqual(rows['query']['status'], 'unchanged')
+        rows = self._compare({'query': samples(100, spread=0.1)}, {'query': samples(102, spread=0.1, seed=1)},
+                             threshold=0.01)
+        self.assertEqual(rows['query']['status'], 'regression')
+
+    def test_large_but_noisy_change_is_not_a_regression(self):
+        rows = self._compare({'query': [1, 100, 1, 100]}, {'query': [100, 1, 100, 1]})
+        self.assertEqual(rows['query']['status'], 'unchanged')
+
+
+class ResultStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='mamacare_bench_')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.store = ResultStore(self.directory)
+
+    def test_runs_are_kept_in_order_and_resolved(self):
+        first = new_record('benchmark', {'db:get_statistics': [1.0, 2.0]}, label='first')
+        second = new_record('benchmark', {'db:get_statistics': [1.5, 2.5]}, label='second')
+        load = new_record('http_load_test', {'http:/': [5.0]})
+        for record in (first, second, load):
+            self.store.save(record)
+
+        self.assertEqual([run['label'] for run in self.store.runs('benchmark')], ['first', 'second'])
+        self.assertEqual(self.store.resolve('latest', kind='benchmark')['id'], second['id'])
+        self.assertEqual(self.store.resolve('previous', kind='benchmark')['id'], first['id'])
+        self.assertEqual(self.store.resolve(first['id'][:22])['id'], first['id'])
+        self.assertIsNone(self.store.resolve('no-such-run'))
+
+    def test_unreadable_files_are_skipped(self):
+        self.store.save(new_record('benchmark', {}))
+        with open(f'{self.directory}/broken.json', 'w') as f:
+            f.write('{not json')
+        self.assertEqual(len(self.store.runs()), 1)
@@ -0,0 +1,136 @@
+"""
+Duplicate patient tests for MamaCare
+Phonetic blocking, name scoring and the block-by-block scan on each backend
+"""
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from .. import duplicates
+from ..duplicates import block_keys, check_new_patient, find_duplicates, jaro_winkler, name_similarity, phonetic_key
+from ..storage import InMemoryStorage, SQLiteStorage
+
+
+class ScoringTests(SimpleTestCase):
+    def test_phonetic_key_folds_spelling_variants(self):
+        for first, second in (('Wanjiru', 'Wanjirru'), ('Mohamed', 'Muhammad'), ('Otieno', 'Atieno'),
+                              ('Mbugua', 'Bugua'), ('Njeri', 'Jeri')):
+            with self.subTest(names=(first, second)):
+                self.assertEqual(phonetic_key(first), phonetic_key(second))
+        self.assertNotEqual(phonetic_key('Wanjiru'), phonetic_key('Akinyi'))
+
+    def test_block_keys_ignore_token_order(self):
+        self.assertEqual(block_keys('Amina Wanjiru'), block_keys('Wanjiru Amina'))
+        self.assertTrue(set(block_keys('Amina Wanjiru')) & set(block_keys('Aminah Wanjirru')))
+        self.assertEqual(block_keys(''), [])
+
+    def test_jaro_winkler(self):
+        self.assertEqual(jaro_winkler('martha', 'martha'), 1.0)
+        self.assertAlmostEqual(jaro_winkler('martha', 'marhta'), 0.9611, places=4)
+        self.assertEqual(jaro_winkler('abc', ''), 0.0)
+
+    def test_name_similarity(self):
+        self.assertEqual(name_similarity('Amina Wanjiru', 'Wanjiru Amina'), 1.0)
+        self.assertGreaterEqual(name_similarity('Amina Wanjiru', 'Aminah Wanjirru'), 0.92)
+        self.assertLess(name_similarity('Amina Wanjiru', 'Grace Akinyi'), 0.6)
+        # An extra token lowers the score a little, not below a likely match
+        self.assertGreater(name_similarity('Amina Wanjiru', 'Amina Wanjiru Kamau'), 0.95)
+        self.assertEqual(name_similarity('', 'Amina'), 0.0)
+
+
+@override_settings(DUPLICATE_MATCH_THRESHOLD=0.92)
+class FindDuplicatesTests(SimpleTestCase):
+    PATIENTS = {
+        'MC-000001': 'Amina Wanjiru',
+        'MC-000002': 'Aminah Wanjirru',
+        'MC-000003': 'Wanjiru Amina',
+        'MC-000004': 'Grace Akinyi',
+        'MC-000005': 'Grace Akinyi Otieno',
+        'MC-000006': 'Mohamed Hassan',
+        'MC-000007': 'Muhammad Hasan',
+        'MC-000008': 'Zawadi Mwangi',
+    }
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='mamacare_duplicates_')
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+
+    def backends(self, patients=None):
+        backends = {'memory': InMemoryStorage(), 'sqlite': SQLiteStorage(Path(self.tmpdir) / 'data.sqlite3')}
+        for backend in backends.values():
+            for patient_id, name in (patients or self.PATIENTS).items():
+                backend.get_or_create_patient(patient_id=patient_id, patient_name=name)
+        return backends
+
+    def _pairs(self, backend):
+        return {tuple(candidate['patient_ids']) for candidate in backend.get_duplicate_candidates(limit=1000)}
+
+    def test_finds_respelled_patients(self):
+        expected = {
+            ('MC-000001', 'MC-000002'), ('MC-000001', 'MC-000003'), ('MC-000002', 'MC-000003'),
+            ('MC-000004', 'MC-000005'), ('MC-000006', 'MC-000007'),
+        }
+        for name, backend in self.backends().items():
+            with self.subTest(backend=name):
+                result = find_duplicates(backend)
+                self.assertEqual(self._pairs(backend), expected)
+                self.assertEqual(result['candidates'], len(expected))
+
+    def test_each_pair_is_compared_once(self):
+        scored = []
+
+        def counting_similarity(name_a, name_b):
+            scored.append(frozenset((name_a, name_b)))
+            return name_similarity(name_a, name_b)
+
+        for name, backend in self.backends().items():
+            with self.subTest(backend=name):
+                scored.clear()
+                with mock.patch.object(duplicates, 'name_similarity', counting_similarity):
+                    result = find_duplicates(backend)
+                # Pairs sharing several blocking keys are still scored once
+                self.assertEqual(len(scored), len(set(scored)))
+                self.assertEqual(result['pairs_compared'], len(scored))
+
+    def test_oversized_blocks_compare_a_window(self):
+        patients = {f'MC-{n:06d}': 'Amina Wanjiru' for n in range(40)}
+        with mock.patch.object(duplicates, 'MAX_BLOCK_SIZE', 10), mock.patch.object(duplicates, 'WINDOW', 3):
+            for name, backend in self.backends(patients).items():
+                with self.subTest(backend=name):
+                    result = find_duplicates(backend)
+                    # Both blocks (phonetic and exact tokens) hold everyone; only the
+                    # window is compared, once, instead of all 780 pairs
+                    self.assertEqual(result['blocks'], 2)
+                    self.assertLessEqual(result['pairs_compared'], 40 * 3)
+                    self.assertGreater(result['candidates'], 0)
+
+    def test_rescan_keeps_review_decisions(self):
+        for name, backend in self.backends().items():
+            with self.subTest(backend=name):
+                find_duplicates(backend)
+                candidate = backend.get_duplicate_candidates(limit=1)[0]
+                backend.set_duplicate_candidate_status(candidate['_id'], 'dismissed', user_id=1)
+                find_duplicates(backend)
+                pending = {c['_id'] for c in backend.get_duplicate_candidates(limit=1000)}
+                self.assertNotIn(candidate['_id'], pending)
+
+    def test_check_new_patient(self):
+        for name, backend in self.backends().items():
+            with self.subTest(backend=name):
+                backend.get_or_create_patient(patient_id='MC-000009', patient_name='Zawadi Mwangy')
+                self.assertEqual(check_new_patient(backend, 'MC-000009', 'Zawadi Mwangy'), 1)
+                self.assertIn(('MC-000008', 'MC-000009'), self._pairs(backend))
+                self.assertEqual(check_new_patient(backend, 'MC-000010', 'Nobody Similar'), 0)
+
+    def test_block_members_stream_in_key_order(self):
+        for name, backend in self.backends().items():
+            with self.subTest(backend=name):
+                keys = [key for key, _ in backend.iter_block_members()]
+                self.assertEqual(keys, sorted(keys))
+                expected = sorted((key, patient_id) for patient_id, patient_name in self.PATIENTS.items()
+                                  for key in block_keys(patient_name))
+                members = sorted((key, patient['patient_id']) for key, patient in backend.iter_block_members())
+                self.assertEqual(members, expected)
@@ -0,0 +1,210 @@
+"""
+Export tests for MamaCare
+Streamed CSV exports, ranged artifact downloads and the background ExportJob lifecycle
+"""
+import csv
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import export_jobs
+from ..exports import EXPORT_HEADERS
+from ..models import ExportJob
+from ..storage import InMemoryStorage
+
+
+def seeded_storage(visits=5):
+    """An in-memory backend holding `visits` predictions for one patient"""
+    storage = InMemoryStorage()
+    patient = storage.get_or_create_patient(patient_name='Amina Wanjiru')
+    for index in range(visits):
+        storage.save_prediction(
+            user_id=1,
+            patient_id=patient['patient_id'],
+            patient_name=patient['patient_name'],
+            input_data={'age': 25 + index, 'systolic_bp': 120},
+            predictions={'general_risk': 'High' if index % 2 else 'Low'},
+        )
+    return storage
+
+
+class ExportDirMixin:
+    """Artifacts go to a throwaway EXPORT_JOBS_DIR; jobs only run when a test runs them"""
+
+    def setUp(self):
+        super().setUp()
+        self.export_dir = tempfile.mkdtemp(prefix='mamacare_exports_')
+        self.addCleanup(shutil.rmtree, self.export_dir, ignore_errors=True)
+        overrides = override_settings(EXPORT_JOBS_DIR=self.export_dir, EXPORT_JOBS_IN_PROCESS=False)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.storage = seeded_storage()
+        for target in ('predictions.export_jobs.db_service', 'predictions.views.db_service'):
+            patcher = mock.patch(target, self.storage)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class StreamedExportTests(ExportDirMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('export_admin', password='unused', is_staff=True))
+
+    def test_csv_is_streamed_row_by_row(self):
+        response = self.client.get(reverse('export_csv'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual(rows[0], EXPORT_HEADERS)
+        self.assertEqual(len(rows), 6)
+
+    def test_cursor_error_aborts_the_stream(self):
+        def failing_cursor(*args, **kwargs):
+            yield from self.storage.get_all_predictions(limit=2)
+            raise RuntimeError('cursor lost')
+
+        with mock.patch.object(self.storage, 'iter_predictions', failing_cursor):
+            response = self.client.get(reverse('export_csv'))
+            # A truncated file must not look like a complete export
+            with self.assertRaises(RuntimeError):
+                b''.join(response.streaming_content)
+
+
+class RangedDownloadTests(ExportDirMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('export_admin', password='unused', is_staff=True))
+        self.content = bytes(range(256)) * 4
+        path = os.path.join(self.export_dir, 'artifact.csv')
+        with open(path, 'wb') as f:
+            f.write(self.content)
+        job = ExportJob.objects.create(
+            export_format=ExportJob.FORMAT_CSV, fingerprint='ranged', status=ExportJob.STATUS_DONE,
+            file_path=path, file_name='artifact.csv', file_size=len(self.content), finished_at=timezone.now(),
+        )
+        self.url = reverse('export_job_download', args=[job.pk])
+
+    def _get(self, range_header=None):
+        headers = {'HTTP_RANGE': range_header} if range_header else {}
+        return self.client.get(self.url, **headers)
+
+    def test_whole_file_without_range(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_byte_ranges(self):
+        size = len(self.content)
+        cases = {
+            'bytes=0-99': (0, 99),
+            'bytes=1000-': (1000, size - 1),
+            'bytes=-24': (size - 24, size - 1),
+            'bytes=1000-5000': (1000, size - 1),  # clamped to the file
+        }
+        for header, (first, last) in cases.items():
+            with self.subTest(range=header):
+                response = self._get(header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], f'bytes {first}-{last}/{size}')
+                self.assertEqual(response['Content-Length'], str(last - first + 1))
+                self.assertEqual(b''.join(response.streaming_content), self.content[first:last + 1])
+
+    def test_unsatisfiable_range(self):
+        for header in (f'bytes={len(self.content)}-', 'bytes=500-100'):
+            with self.subTest(range=header):
+                response = self._get(header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_expired_artifact_is_gone(self):
+        os.remove(os.path.join(self.export_dir, 'artifact.csv'))
+        self.assertEqual(self._get().status_code, 404)
+
+
+class ExportJobLifecycleTests(ExportDirMixin, TransactionTestCase):
+    # run_job() closes stale connections like a worker thread would, which a
+    # TestCase's wrapping transaction does not survive
+
+    def test_identical_requests_share_a_job(self):
+        job, created = export_jobs.submit_export(ExportJob.FORMAT_CSV)
+        again, created_again = export_jobs.submit_export(ExportJob.FORMAT_CSV)
+        other, created_other = export_jobs.submit_export(ExportJob.FORMAT_XLSX)
+        self.assertTrue(created)
+        self.assertEqual((again.pk, created_again), (job.pk, False))
+        self.assertTrue(created_other)
+        self.assertNotEqual(other.pk, job.pk)
+
+    def test_job_runs_once_and_writes_its_artifact(self):
+        job, _ = export_jobs.submit_export(ExportJob.FORMAT_CSV)
+        self.assertEqual(export_jobs.run_pending_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.STATUS_DONE)
+        self.assertEqual(job.row_count, 5)
+        self.assertEqual(job.file_size, os.path.getsize(job.file_path))
+        self.assertFalse(export_jobs.claim_job(job.pk))
+        self.assertEqual(export_jobs.run_pending_jobs(), 0)
+
+        # A finished job keeps serving identical requests while its artifact exists
+        shared, created = export_jobs.submit_export(ExportJob.FORMAT_CSV)
+        self.assertEqual((shared.pk, created), (job.pk, False))
+
+    def test_failed_job_leaves_no_partial_file(self):
+        job, _ = export_jobs.submit_export(ExportJob.FORMAT_CSV)
+        with mock.patch.object(self.storage, 'iter_predictions', side_effect=RuntimeError('cursor lost')):
+            export_jobs.run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.STATUS_FAILED)
+        self.assertIn('cursor lost', job.error)
+        self.assertEqual(os.listdir(self.export_dir), [])
+
+    def test_result_of_an_abandoned_job_is_discarded(self):
+        job, _ = export_jobs.submit_export(ExportJob.FORMAT_CSV)
+
+        def abandoned_meanwhile(*args, **kwargs):
+            ExportJob.objects.filter(pk=job.pk).update(status=ExportJob.STATUS_FAILED, error='Abandoned by worker')
+            return self.storage.get_all_predictions(limit=None)
+
+        with mock.patch.object(self.storage, 'iter_predictions', abandoned_meanwhile):
+            export_jobs.run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (ExportJob.STATUS_FAILED, 'Abandoned by worker'))
+        self.assertEqual(os.listdir(self.export_dir), [])
+
+    def test_stale_running_job_is_released(self):
+        job, _ = export_jobs.submit_export(ExportJob.FORMAT_CSV)
+        self.assertTrue(export_jobs.claim_job(job.pk))
+        ExportJob.objects.filter(pk=job.pk).update(
+            started_at=timezone.now() - export_jobs.STALE_AFTER - timedelta(minutes=1)
+        )
+        replacement, created = export_jobs.submit_export(ExportJob.FORMAT_CSV)
+        self.assertTrue(created)
+        self.assertNotEqual(replacement.pk, job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.STATUS_FAILED)
+
+    def test_purge_removes_expired_artifacts(self):
+        job, _ = export_jobs.submit_export(ExportJob.FORMAT_CSV)
+        export_jobs.run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(export_jobs.purge_expired_artifacts(), 0)
+
+        ExportJob.objects.filter(pk=job.pk).update(finished_at=timezone.now() - timedelta(days=30))
+        self.assertEqual(export_jobs.purge_expired_artifacts(), 1)
+        self.assertFalse(os.path.exists(job.file_path))
+        self.assertFalse(ExportJob.objects.filter(pk=job.pk).exists())
+
+    def test_purge_is_rate_limited(self):
+        with mock.patch.object(export_jobs, '_last_purge', None), \
+                mock.patch.object(export_jobs, '_get_executor') as get_executor:
+            export_jobs._schedule_purge()
+            export_jobs._schedule_purge()
+        self.assertEqual(get_executor.return_value.submit.call_count, 1)
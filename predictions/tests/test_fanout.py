@@ -0,0 +1,67 @@
+"""
+Page query tests for MamaCare
+Concurrent page queries and the per-request deadline they share
+"""
+import threading
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from ..fanout import fan_out, run_with_deadline, time_left
+
+
+@override_settings(PAGE_QUERY_WORKERS=4)
+class FanOutTests(SimpleTestCase):
+    def test_queries_run_concurrently(self):
+        barrier = threading.Barrier(3, timeout=2)
+        queries = {name: (lambda name=name: (barrier.wait(), name)[1]) for name in ('a', 'b', 'c')}
+        results, missing = fan_out(queries, timeout=3)
+        self.assertEqual(results, {'a': 'a', 'b': 'b', 'c': 'c'})
+        self.assertEqual(missing, [])
+
+    def test_late_query_gets_its_default_at_the_deadline(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        started = time.monotonic()
+        results, missing = fan_out(
+            {'fast': lambda: 1, 'slow': lambda: release.wait(5)},
+            timeout=0.2, defaults={'slow': []}
+        )
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(results, {'fast': 1, 'slow': []})
+        self.assertEqual(missing, ['slow'])
+
+    def test_failed_query_gets_its_default(self):
+        def broken():
+            raise RuntimeError('query failed')
+
+        results, missing = fan_out({'ok': lambda: 1, 'broken': broken}, timeout=1)
+        self.assertEqual(results, {'ok': 1, 'broken': None})
+        self.assertEqual(missing, ['broken'])
+
+    def test_queries_see_the_deadline(self):
+        self.assertIsNone(time_left())
+        results, _ = fan_out({'left': time_left}, timeout=2)
+        self.assertTrue(0 < results['left'] <= 2)
+        self.assertIsNone(time_left())
+
+
+class RunWithDeadlineTests(SimpleTestCase):
+    def test_runs_in_the_calling_thread_with_the_deadline(self):
+        thread, left = run_with_deadline(lambda: (threading.current_thread(), time_left()), timeout=2)
+        self.assertIs(thread, threading.current_thread())
+        self.assertTrue(0 < left <= 2)
+        # The deadline does not outlive the query
+        self.assertIsNone(time_left())
+
+    def test_errors_propagate(self):
+        def broken():
+            raise TimeoutError('late')
+
+        with self.assertRaises(TimeoutError):
+            run_with_deadline(broken, timeout=1)
+        self.assertIsNone(time_left())
+
+    def test_deadline_already_passed(self):
+        with self.assertRaises(TimeoutError):
+            run_with_deadline(lambda: 1, timeout=0)
@@ -0,0 +1,138 @@
+"""
+Patient ID tests for MamaCare
+Sequence-to-ID mapping and block allocation on a shared counter
+"""
+import re
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from ..patient_ids import ID_SPACE, PatientIdAllocator, format_patient_id
+from ..storage import InMemoryStorage, SQLiteStorage
+
+
+ID_PATTERN = re.compile(r'MC-[0-9A-Z]{6}')
+
+
+class SharedCounter:
+    """A counter several allocators reserve blocks from, like the one in the store"""
+
+    def __init__(self):
+        self.value = 0
+        self.reservations = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, count):
+        with self._lock:
+            start = self.value
+            self.value += count
+            self.reservations += 1
+            return start
+
+
+class FormatPatientIdTests(SimpleTestCase):
+    def test_distinct_sequences_give_distinct_ids(self):
+        ids = [format_patient_id(sequence) for sequence in range(20000)]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertTrue(all(ID_PATTERN.fullmatch(patient_id) for patient_id in ids))
+
+    def test_consecutive_ids_do_not_look_sequential(self):
+        self.assertNotEqual(format_patient_id(1)[:-1], format_patient_id(2)[:-1])
+
+    def test_sequence_outside_the_id_space(self):
+        format_patient_id(ID_SPACE - 1)
+        for sequence in (-1, ID_SPACE):
+            with self.assertRaises(ValueError):
+                format_patient_id(sequence)
+
+
+class PatientIdAllocatorTests(SimpleTestCase):
+    def test_one_reservation_per_block(self):
+        counter = SharedCounter()
+        allocator = PatientIdAllocator(counter.reserve, block_size=10)
+        ids = [allocator.next_id() for _ in range(25)]
+        self.assertEqual(ids, [format_patient_id(sequence) for sequence in range(25)])
+        self.assertEqual(counter.reservations, 3)
+
+    def test_allocators_sharing_a_counter_never_overlap(self):
+        counter = SharedCounter()
+        allocators = [PatientIdAllocator(counter.reserve, block_size=7) for _ in range(4)]
+        ids = []
+        lock = threading.Lock()
+
+        def allocate(allocator):
+            for _ in range(50):
+                patient_id = allocator.next_id()
+                with lock:
+                    ids.append(patient_id)
+
+        threads = [threading.Thread(target=allocate, args=(allocator,)) for allocator in allocators for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(ids), 400)
+        self.assertEqual(len(set(ids)), 400)
+
+    def test_taken_ids_are_skipped_with_one_lookup_per_block(self):
+        counter = SharedCounter()
+        taken = {format_patient_id(1), format_patient_id(3)}
+        lookups = []
+
+        def find_taken(ids):
+            lookups.append(ids)
+            return [patient_id for patient_id in ids if patient_id in taken]
+
+        allocator = PatientIdAllocator(counter.reserve, find_taken=find_taken, block_size=5)
+        ids = [allocator.next_id() for _ in range(3)]
+        self.assertEqual(ids, [format_patient_id(sequence) for sequence in (0, 2, 4)])
+        self.assertEqual(len(lookups), 1)
+
+    def test_no_id_when_no_block_can_be_reserved(self):
+        allocator = PatientIdAllocator(lambda count: None)
+        self.assertIsNone(allocator.next_id())
+
+    def test_discard_drops_the_rest_of_the_block(self):
+        counter = SharedCounter()
+        allocator = PatientIdAllocator(counter.reserve, block_size=10)
+        allocator.next_id()
+        allocator.discard()
+        self.assertEqual(allocator.next_id(), format_patient_id(10))
+
+
+class BackendPatientIdTests(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='mamacare_ids_')
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+
+    def backends(self):
+        return {
+            'memory': InMemoryStorage(),
+            'sqlite': SQLiteStorage(Path(self.tmpdir) / 'data.sqlite3'),
+        }
+
+    def test_new_patients_get_unique_ids(self):
+        for name, backend in self.backends().items():
+            with self.subTest(backend=name):
+                ids = [backend.get_or_create_patient(patient_name=f'Patient {n}')['patient_id'] for n in range(250)]
+                self.assertEqual(len(set(ids)), 250)
+                self.assertTrue(all(ID_PATTERN.fullmatch(patient_id) for patient_id in ids))
+
+    def test_ids_already_registered_are_not_reused(self):
+        for name, backend in self.backends().items():
+            with self.subTest(backend=name):
+                # A legacy patient registered under what will be the first sequential ID
+                legacy_id = format_patient_id(0)
+                backend.get_or_create_patient(patient_id=legacy_id, patient_name='Legacy Patient')
+                patient = backend.get_or_create_patient(patient_name='New Patient')
+                self.assertNotEqual(patient['patient_id'], legacy_id)
+                self.assertEqual(backend.search_patient(legacy_id)['patient_name'], 'Legacy Patient')
+
+    def test_sqlite_workers_share_the_counter(self):
+        path = Path(self.tmpdir) / 'shared.sqlite3'
+        first, second = SQLiteStorage(path), SQLiteStorage(path)
+        ids = {first.generate_patient_id(), second.generate_patient_id(), first.generate_patient_id()}
+        self.assertEqual(len(ids), 3)
@@ -0,0 +1,114 @@
+"""
+Patient search tests for MamaCare
+Search keys stored on patients, the keys queries look up, and ranked search on each backend
+"""
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from ..patient_search import (
+    EXACT_MARK, ID_MARK, MAX_PREFIX, id_code, id_prefix_keys, normalize, query_keys, rank_patients, search_keys
+)
+from ..storage import InMemoryStorage, SQLiteStorage
+
+
+class SearchKeyTests(SimpleTestCase):
+    def test_normalize_strips_accents_case_and_punctuation(self):
+        self.assertEqual(normalize("  Zoë  O'Neill-Achieng "), 'zoe o neill achieng')
+
+    def test_id_code(self):
+        self.assertEqual(id_code('MC-AB12CD'), 'ab12cd')
+        self.assertEqual(id_code('mc ab12cd'), 'ab12cd')
+
+    def test_keys_cover_name_and_id_prefixes(self):
+        keys = set(search_keys('MC-AB12CD', 'Amina Wanjiru'))
+        for key in ('a', 'am', 'amina', 'w', 'wanjiru', 'ab', 'ab12cd'):
+            self.assertIn(key, keys)
+        self.assertTrue({EXACT_MARK + 'amina', EXACT_MARK + 'wanjiru', EXACT_MARK + 'ab12cd'} <= keys)
+        # Compact-ID prefixes start at 'mc': shorter ones would match every patient
+        self.assertTrue({ID_MARK + 'mc', ID_MARK + 'mca', ID_MARK + 'mcab12cd'} <= keys)
+        self.assertNotIn(ID_MARK + 'm', keys)
+
+    def test_long_tokens_are_indexed_up_to_max_prefix(self):
+        keys = search_keys('MC-AB12CD', 'Nyamweya-Kipchumbaaaaa')
+        self.assertIn('kipchumbaaaaa'[:MAX_PREFIX], keys)
+        self.assertNotIn('kipchumbaaaaa'[:MAX_PREFIX + 1], keys)
+
+    def test_query_keys(self):
+        self.assertEqual(query_keys('amina wan'), ['amina', 'wan'])
+        self.assertEqual(query_keys('MC-AB12CD'), ['ab12cd'])
+        self.assertEqual(query_keys('mcab12cd'), ['ab12cd'])
+        self.assertEqual(query_keys('  '), [])
+
+    def test_id_prefix_keys(self):
+        self.assertEqual(id_prefix_keys('MC-'), [ID_MARK + 'mc'])
+        self.assertEqual(id_prefix_keys('MC-00'), [ID_MARK + 'mc00'])
+        self.assertEqual(id_prefix_keys('mc0'), [ID_MARK + 'mc0'])
+        self.assertEqual(id_prefix_keys('Amina'), [])
+
+    def test_ranking(self):
+        patients = [
+            {'patient_id': 'MC-AMI001', 'patient_name': 'Zawadi Mwangi'},
+            {'patient_id': 'MC-000002', 'patient_name': 'Aminata Otieno'},
+            {'patient_id': 'MC-000003', 'patient_name': 'Amina Wanjiru'},
+            {'patient_id': 'MC-000004', 'patient_name': 'Grace Akinyi'},
+        ]
+        ranked = [patient['patient_id'] for patient in rank_patients(patients, 'ami')]
+        # Name prefixes (first names first) after the ID code prefix; non-matches dropped
+        self.assertEqual(ranked, ['MC-AMI001', 'MC-000003', 'MC-000002'])
+        ranked = [patient['patient_id'] for patient in rank_patients(patients, 'amina')]
+        self.assertEqual(ranked[0], 'MC-000003')
+
+
+class BackendSearchTests(SimpleTestCase):
+    PATIENTS = {
+        'MC-00A1B2': 'Amina Wanjiru',
+        'MC-00C3D4': 'Aminata Otieno',
+        'MC-X9Y8Z7': 'Grace Wanjiku',
+        'MC-AMIN01': 'Zawadi Mwangi',
+    }
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='mamacare_search_')
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+
+    def backends(self):
+        backends = {'memory': InMemoryStorage(), 'sqlite': SQLiteStorage(Path(self.tmpdir) / 'data.sqlite3')}
+        for backend in backends.values():
+            for patient_id, name in self.PATIENTS.items():
+                backend.get_or_create_patient(patient_id=patient_id, patient_name=name)
+        return backends
+
+    def _search(self, backend, query):
+        return [patient['patient_id'] for patient in backend.search_patients(query)]
+
+    def test_search(self):
+        cases = {
+            'amina': ['MC-00A1B2', 'MC-00C3D4'],
+            'amin': ['MC-00A1B2', 'MC-00C3D4', 'MC-AMIN01'],
+            'wanj': ['MC-X9Y8Z7', 'MC-00A1B2'],
+            'amina wanjiru': ['MC-00A1B2'],
+            'MC-00A1B2': ['MC-00A1B2'],
+            'x9y8': ['MC-X9Y8Z7'],
+            'MC-00': ['MC-00A1B2', 'MC-00C3D4'],
+            'mc-x': ['MC-X9Y8Z7'],
+            'nobody': [],
+            '': [],
+        }
+        for name, backend in self.backends().items():
+            for query, expected in cases.items():
+                with self.subTest(backend=name, query=query):
+                    self.assertCountEqual(self._search(backend, query), expected)
+
+    def test_exact_match_ranks_first(self):
+        for name, backend in self.backends().items():
+            with self.subTest(backend=name):
+                self.assertEqual(self._search(backend, 'amina')[0], 'MC-00A1B2')
+                self.assertEqual(self._search(backend, 'MC-AMIN01')[0], 'MC-AMIN01')
+
+    def test_id_prefix_lists_every_patient(self):
+        for name, backend in self.backends().items():
+            with self.subTest(backend=name):
+                self.assertCountEqual(self._search(backend, 'MC-'), self.PATIENTS)
@@ -0,0 +1,182 @@
+"""
+Prediction spool tests for MamaCare
+Replaying spooled visits, retrying and dead-lettering rejected ones, and the spooled-patient index
+"""
+import shutil
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from .. import spool_files
+from ..prediction_spool import PredictionSpool
+
+
+class FakeCollection:
+    """
+    Just enough of a MongoDB collection for the spool's bulk upserts
+
+    Upserts match on every filter field and apply $setOnInsert; unique_field
+    behaves like a unique index. reject(predicate, code) makes matching
+    upserts fail with that write error, and outage() makes every write fail
+    as if the server were unreachable.
+    """
+
+    def __init__(self, unique_field=None):
+        self.documents = []
+        self.unique_field = unique_field
+        self.rejects = []
+        self.down = False
+
+    def reject(self, predicate, code=121):
+        self.rejects.append((predicate, code))
+
+    def outage(self, down=True):
+        self.down = down
+
+    def bulk_write(self, operations, ordered=True):
+        if self.down:
+            raise AutoReconnect('connection refused')
+        errors = []
+        for index, operation in enumerate(operations):
+            query, document = operation._filter, operation._doc['$setOnInsert']
+            code = next((code for predicate, code in self.rejects if predicate(query, document)), None)
+            if code is None and any(all(stored.get(k) == v for k, v in query.items()) for stored in self.documents):
+                continue
+            if code is None and self.unique_field in query and any(
+                    stored.get(self.unique_field) == query[self.unique_field] for stored in self.documents):
+                code = 11000
+            if code is not None:
+                errors.append({'index': index, 'code': code, 'errmsg': f'rejected ({code})'})
+                continue
+            self.documents.append({**query, **document})
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'writeConcernErrors': [], 'nInserted': 0})
+
+
+def visit(patient_id, name='Amina Wanjiru', created_at=None):
+    """A spool record's patient and prediction documents"""
+    created_at = created_at or datetime.utcnow()
+    patient = {'patient_id': patient_id, 'patient_name': name, 'created_at': created_at}
+    prediction = {'_id': uuid.uuid4().hex, 'patient_id': patient_id, 'created_at': created_at}
+    return patient, prediction
+
+
+class PredictionSpoolTests(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='mamacare_spool_')
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        self.db = SimpleNamespace(patients=FakeCollection(unique_field='patient_id'), predictions=FakeCollection())
+        self.available = True
+        self.flushed_callbacks = 0
+        self.spool = PredictionSpool(
+            lambda: self.db if self.available else None,
+            Path(self.tmpdir) / 'predictions.spool.jsonl',
+            batch_size=2, fsync=False, max_attempts=3, on_flushed=self._on_flushed,
+        )
+        # Tests flush by hand rather than through the background thread
+        self.spool._ensure_thread = lambda: None
+
+    def _on_flushed(self):
+        self.flushed_callbacks += 1
+
+    def _dead_letters(self):
+        try:
+            return list(spool_files.iter_records(self.spool.dead_letter_path))
+        except FileNotFoundError:
+            return []
+
+    def test_replay_writes_every_visit_once(self):
+        for index in range(5):
+            self.spool.append(*visit(f'MC-00000{index % 2}'))
+        self.assertEqual(self.spool.flush(), 5)
+        self.assertEqual(len(self.db.predictions.documents), 5)
+        self.assertEqual(len(self.db.patients.documents), 2)
+        self.assertEqual(self.spool.backlog()['pending_visits'], 0)
+        self.assertEqual(self.flushed_callbacks, 1)
+        self.assertEqual(self.spool.flush(), 0)
+
+    def test_replaying_a_record_twice_stores_it_once(self):
+        record = visit('MC-000001')
+        self.spool.append(*record)
+        self.spool.append(*record)
+        self.spool.flush()
+        self.assertEqual(len(self.db.predictions.documents), 1)
+
+    def test_nothing_is_replayed_while_mongodb_is_unavailable(self):
+        self.spool.append(*visit('MC-000001'))
+        self.available = False
+        self.assertEqual(self.spool.flush(), 0)
+        self.assertEqual(self.spool.backlog()['pending_visits'], 1)
+
+    def test_outage_mid_flush_keeps_the_claimed_visits(self):
+        self.spool.append(*visit('MC-000001'))
+        self.db.patients.outage()
+        with self.assertRaises(AutoReconnect):
+            self.spool.flush()
+        self.assertEqual(self.spool.backlog()['pending_visits'], 1)
+
+        self.db.patients.outage(False)
+        self.assertEqual(self.spool.flush(), 1)
+        self.assertEqual(self.spool.backlog()['pending_visits'], 0)
+        self.assertEqual(self._dead_letters(), [])
+
+    def test_rejected_visit_is_retried_then_dead_lettered(self):
+        self.spool.append(*visit('MC-BADBAD', name='Rejected'))
+        self.spool.append(*visit('MC-000001'))
+        self.spool.append(*visit('MC-000002'))
+        self.db.predictions.reject(lambda query, document: document['patient_id'] == 'MC-BADBAD')
+
+        # The others in its batch are written at once; it waits for later flushes
+        self.assertEqual(self.spool.flush(), 2)
+        self.assertEqual(self.spool.backlog()['pending_visits'], 1)
+        self.assertEqual(self.spool.flush(), 0)
+        self.assertEqual(self.spool.backlog()['pending_visits'], 1)
+
+        self.spool.flush()
+        self.assertEqual(self.spool.backlog()['pending_visits'], 0)
+        dead = self._dead_letters()
+        self.assertEqual(len(dead), 1)
+        self.assertEqual(dead[0]['attempts'], 3)
+        self.assertEqual(dead[0]['patient']['patient_id'], 'MC-BADBAD')
+        self.assertEqual(self.spool.backlog()['dead_letter_visits'], 1)
+
+    def test_new_patient_colliding_with_an_existing_id_is_dead_lettered(self):
+        registered = datetime.utcnow() - timedelta(days=30)
+        self.db.patients.documents.append({'patient_id': 'MC-TAKEN1', 'patient_name': 'Someone Else',
+                                           'created_at': registered})
+        self.spool.append(*visit('MC-TAKEN1', name='New Patient'), new_patient=True)
+        # A follow-up visit of the new patient, spooled before the collision is found
+        self.spool.append(*visit('MC-TAKEN1', name='New Patient'))
+        self.spool.append(*visit('MC-000001'))
+
+        self.assertEqual(self.spool.flush(), 1)
+        # Neither visit was added to the other patient's record, and neither is retried
+        self.assertEqual([p['patient_id'] for p in self.db.predictions.documents], ['MC-000001'])
+        self.assertEqual(self.spool.backlog()['pending_visits'], 0)
+        dead = self._dead_letters()
+        self.assertEqual(len(dead), 2)
+        self.assertTrue(all('another patient' in record['error'] for record in dead))
+
+    def test_replaying_a_new_patient_twice_is_not_a_collision(self):
+        patient, prediction = visit('MC-NEW001')
+        self.spool.append(patient, prediction, new_patient=True)
+        self.spool.flush()
+        self.spool.append(patient, prediction, new_patient=True)
+        self.spool.flush()
+        self.assertEqual(len(self.db.patients.documents), 1)
+        self.assertEqual(self._dead_letters(), [])
+
+    def test_spooled_patients_are_found_until_flushed(self):
+        self.assertIsNone(self.spool.find_patient('MC-000001'))
+        self.spool.append(*visit('MC-000001', name='Amina Wanjiru'))
+        self.assertEqual(self.spool.find_patient('MC-000001')['patient_name'], 'Amina Wanjiru')
+        self.spool.append(*visit('MC-000002', name='Grace Otieno'))
+        self.assertEqual(self.spool.find_patient('MC-000002')['patient_name'], 'Grace Otieno')
+
+        self.spool.flush()
+        self.assertIsNone(self.spool.find_patient('MC-000001'))
@@ -0,0 +1,150 @@
+"""
+Query budget tests for MamaCare
+How many MongoDB round trips the busiest pages may make
+
+The budget tests need a MongoDB server (TEST_MONGODB_URI, default
+mongodb://localhost:27017) and are skipped when none is reachable. They seed
+a throwaway database with synthetic data and drop it afterwards.
+
+Usage: TEST_MONGODB_URI=mongodb://localhost:27017 python manage.py test predictions
+"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from pymongo import MongoClient
+
+from ..db_service import MongoDBService
+from ..metrics import instrumented
+from ..query_monitor import assert_max_mongo_queries
+from ..synthetic import SyntheticPopulation
+
+
+TEST_MONGODB_URI = os.environ.get('TEST_MONGODB_URI', 'mongodb://localhost:27017')
+TEST_DATABASE = f'mamacare_test_{os.getpid()}'
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Cold (uncached) MongoDB round trips per page, pinned at today's counts
+
+    A page that starts looping over queries (an N+1) fails here. Lower a
+    budget when a page gets cheaper; raise one only with a reason.
+    """
+
+    BUDGETS = {
+        'stats': 8,                 # five counts, two distincts, the last-7-days count
+        'recent_predictions': 1,
+        'health_workers': 1,        # one $group over predictions, not queries per worker
+        'daily_chart': 1,
+        'patient_detail': 2,        # the patient, then their visits
+        'history': 1,
+        'history_patient': 2,       # the patient, then their visits
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        # Before TestCase.setUpClass, which opens transactions a skip would leave behind
+        probe = MongoClient(TEST_MONGODB_URI, serverSelectionTimeoutMS=2000)
+        try:
+            probe.admin.command('ping')
+        except Exception as e:
+            raise unittest.SkipTest(f"No MongoDB at {TEST_MONGODB_URI}: {e}")
+        finally:
+            probe.close()
+
+        cls._tmpdir = tempfile.mkdtemp(prefix='mamacare_test_')
+        cls._settings = override_settings(
+            MONGODB_SETTINGS={'host': TEST_MONGODB_URI, 'name': TEST_DATABASE},
+            PREDICTION_SPOOL_PATH=os.path.join(cls._tmpdir, 'prediction_spool.jsonl'),
+            AUDIT_LOG_SPILL_PATH=os.path.join(cls._tmpdir, 'audit_log_spill.jsonl'),
+            SLOW_QUERY_EXPLAIN_RATE=0,
+        )
+        cls._settings.enable()
+        cls.service = MongoDBService()
+        deadline = time.monotonic() + 10
+        while cls.service.db is None and time.monotonic() < deadline:
+            time.sleep(0.1)
+        if cls.service.db is None or cls.service._db.name != TEST_DATABASE:
+            cls._teardown_mongo()
+            raise RuntimeError(f"Could not open {TEST_DATABASE} (TEST_MONGODB_URI must not name a database)")
+
+        # Uncached, so every request reaches MongoDB and the counts do not depend on test order
+        cls._views_patch = mock.patch('predictions.views.db_service', instrumented(cls.service))
+        cls._views_patch.start()
+        try:
+            super().setUpClass()
+        except Exception:
+            cls._views_patch.stop()
+            cls._teardown_mongo()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._views_patch.stop()
+        cls._teardown_mongo()
+
+    @classmethod
+    def _teardown_mongo(cls):
+        cls.service.audit_writer.close()
+        if cls.service.client is not None:
+            cls.service.client.drop_database(TEST_DATABASE)
+            cls.service.client.close()
+        cls._settings.disable()
+        shutil.rmtree(cls._tmpdir, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('budget_admin', password='unused', is_staff=True)
+        cls.health_worker = User.objects.create_user('budget_worker', password='unused')
+
+        population = SyntheticPopulation(seed=0, health_workers=5, days=60)
+        db = cls.service._db
+        db.predictions.delete_many({})
+        db.patients.delete_many({})
+        patients = [population.patient(sequence) for sequence in range(50)]
+        db.patients.insert_many(patients)
+        visits = [
+            population.visit(patient, user_id=str(cls.health_worker.id) if index % 3 == 0 else None)
+            for index, patient in enumerate(patients)
+            for _ in range(4)
+        ]
+        db.predictions.insert_many(visits)
+        cls.patient_id = patients[0]['patient_id']
+
+    def _get_within_budget(self, budget, url):
+        with assert_max_mongo_queries(self.BUDGETS[budget]) as stats:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # Guards against a budget passing because the page never reached MongoDB
+        self.assertGreater(stats.commands, 0)
+        return response
+
+    def test_dashboard_panels(self):
+        self.client.force_login(self.admin)
+        for panel in ('stats', 'recent_predictions', 'health_workers', 'daily_chart'):
+            with self.subTest(panel=panel):
+                self._get_within_budget(panel, reverse('dashboard_panel', args=[panel]))
+
+    def test_patient_detail(self):
+        self.client.force_login(self.health_worker)
+        self._get_within_budget('patient_detail', reverse('patient_detail', args=[self.patient_id]))
+
+    def test_history(self):
+        self.client.force_login(self.health_worker)
+        response = self._get_within_budget('history', reverse('history'))
+        self.assertTrue(response.context['predictions'])
+        self._get_within_budget('history_patient', f"{reverse('history')}?patient_id={self.patient_id}")
+
+    def test_exceeding_budget_fails(self):
+        self.client.force_login(self.health_worker)
+        with self.assertRaises(AssertionError):
+            with assert_max_mongo_queries(0):
+                self.client.get(reverse('history'))
@@ -0,0 +1,107 @@
+"""
+Slow query log tests for MamaCare
+Value-free query shapes, explain summaries and which commands get recorded
+"""
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from ..slow_queries import SlowQueryLog, command_filter, query_shape, summarize_explain
+
+
+def command_events(request_id, name, command, duration_ms, reply=None, database='mamacare'):
+    """The started / succeeded events pymongo would emit for one command"""
+    started = SimpleNamespace(request_id=request_id, command_name=name, command=command, database_name=database)
+    succeeded = SimpleNamespace(request_id=request_id, command_name=name, duration_micros=int(duration_ms * 1000),
+                                reply=reply or {'ok': 1})
+    return started, succeeded
+
+
+class QueryShapeTests(SimpleTestCase):
+    def test_values_are_replaced(self):
+        shape = query_shape({'patient_id': 'MC-AB12CD', 'created_at': {'$gte': 'date', '$lt': 'date'}})
+        self.assertEqual(shape, {'patient_id': '?', 'created_at': {'$gte': '?', '$lt': '?'}})
+
+    def test_field_references_and_operators_are_kept(self):
+        pipeline = [
+            {'$match': {'user_id': '12'}},
+            {'$group': {'_id': '$user_id', 'total': {'$sum': 1}}},
+        ]
+        self.assertEqual(query_shape(pipeline), [
+            {'$match': {'user_id': '?'}},
+            {'$group': {'_id': '$user_id', 'total': {'$sum': '?'}}},
+        ])
+
+    def test_lists_of_same_shape_collapse(self):
+        self.assertEqual(query_shape({'patient_id': {'$in': ['MC-1', 'MC-2', 'MC-3']}}), {'patient_id': {'$in': ['?']}})
+        self.assertEqual(query_shape({'$or': [{'a': 1}, {'b': 2}, {'a': 3}]}), {'$or': [{'a': '?'}, {'b': '?'}]})
+
+    def test_names_never_reach_the_shape(self):
+        shape = repr(query_shape({'search_keys': {'$all': ['amina', 'wanj']}, 'patient_name': 'Amina Wanjiru'}))
+        self.assertNotIn('amina', shape.lower())
+
+    def test_command_filter(self):
+        self.assertEqual(command_filter('find', {'find': 'patients', 'filter': {'a': 1}}), {'a': 1})
+        self.assertEqual(command_filter('aggregate', {'aggregate': 'p', 'pipeline': [{'$match': {}}]}), [{'$match': {}}])
+        self.assertEqual(command_filter('delete', {'delete': 'p', 'deletes': [{'q': {'a': 1}}]}), [{'a': 1}])
+        self.assertEqual(command_filter('insert', {'insert': 'p'}), {})
+
+
+class SummarizeExplainTests(SimpleTestCase):
+    def test_collection_scan(self):
+        explain = {
+            'queryPlanner': {'winningPlan': {'stage': 'SORT', 'inputStage': {'stage': 'COLLSCAN'}}},
+            'executionStats': {'totalDocsExamined': 5000, 'totalKeysExamined': 0, 'nReturned': 10,
+                               'executionTimeMillis': 120},
+        }
+        summary = summarize_explain(explain)
+        self.assertEqual(summary['plan'], 'SORT > COLLSCAN')
+        self.assertTrue(summary['collection_scan'])
+        self.assertEqual((summary['docs_examined'], summary['n_returned']), (5000, 10))
+
+    def test_index_scan_nested_in_a_pipeline(self):
+        explain = {'stages': [{'$cursor': {
+            'queryPlanner': {'winningPlan': {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN',
+                                                                             'indexName': 'created_at_-1'}}},
+        }}]}
+        summary = summarize_explain(explain)
+        self.assertEqual(summary['plan'], 'FETCH > IXSCAN(created_at_-1)')
+        self.assertFalse(summary['collection_scan'])
+
+
+class SlowQueryLogTests(SimpleTestCase):
+    def test_only_slow_commands_are_recorded(self):
+        log = SlowQueryLog(threshold_ms=100, explain_rate=0)
+        for request_id, (name, duration) in enumerate((('find', 150), ('find', 20), ('hello', 500))):
+            started, succeeded = command_events(
+                request_id, name, {name: 'predictions', 'filter': {'patient_id': 'MC-AB12CD'}}, duration,
+                reply={'cursor': {'firstBatch': [{}, {}]}}
+            )
+            log.started(started)
+            log.succeeded(succeeded)
+        entries = log.entries()
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['collection'], 'predictions')
+        self.assertEqual(entries[0]['filter'], {'patient_id': '?'})
+        self.assertEqual(entries[0]['n_returned'], 2)
+
+    def test_capacity_keeps_the_newest(self):
+        log = SlowQueryLog(threshold_ms=0, capacity=2, explain_rate=0)
+        for request_id in range(3):
+            started, succeeded = command_events(request_id, 'find', {'find': f'c{request_id}'}, 1)
+            log.started(started)
+            log.succeeded(succeeded)
+        self.assertEqual([entry['collection'] for entry in log.entries()], ['c2', 'c1'])
+        self.assertEqual(log.stats()['recorded'], 3)
+
+    def test_writes_are_never_explained(self):
+        explained = []
+        log = SlowQueryLog(threshold_ms=0, explain_rate=1,
+                           explain=lambda database, command: explained.append(command) or {})
+        for request_id, name in enumerate(('update', 'find')):
+            started, succeeded = command_events(request_id, name, {name: 'patients', 'lsid': {'id': 1}}, 5)
+            log.started(started)
+            log.succeeded(succeeded)
+        log._executor.shutdown(wait=True)
+        # Session fields explain rejects are dropped from the re-run command
+        self.assertEqual(explained, [{'find': 'patients'}])
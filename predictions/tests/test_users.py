@@ -0,0 +1,64 @@
+"""
+Health worker lookup tests for MamaCare
+Resolving the user IDs stored on records in one query, and keeping the cache fresh
+"""
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from ..users import UserDirectory, display_name
+
+
+class UserDirectoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.amina = User.objects.create_user('amina', first_name='Amina', last_name='Wanjiru')
+        cls.grace = User.objects.create_user('grace')
+
+    def setUp(self):
+        self.directory = UserDirectory(ttl=60)
+
+    def test_resolves_many_users_in_one_query(self):
+        ids = [self.amina.id, str(self.grace.id), str(self.amina.id), 999999, None, 'not-a-user']
+        with self.assertNumQueries(1):
+            users = self.directory.resolve(ids)
+        self.assertEqual(users[self.amina.id], self.amina)
+        self.assertEqual(users[str(self.amina.id)], self.amina)
+        self.assertEqual(users[str(self.grace.id)], self.grace)
+        for missing in (999999, None, 'not-a-user'):
+            self.assertIsNone(users[missing])
+
+    def test_cached_users_need_no_query(self):
+        self.directory.resolve([self.amina.id, 999999])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.directory.get(self.amina.id), self.amina)
+            self.assertIsNone(self.directory.get(999999))
+        self.assertEqual(self.directory.stats()['hits'], 2)
+
+    def test_entries_expire(self):
+        self.directory.resolve([self.amina.id])
+        with mock.patch('predictions.users.time.monotonic', return_value=10 ** 9):
+            with self.assertNumQueries(1):
+                self.directory.resolve([self.amina.id])
+
+    def test_saved_and_deleted_users_are_forgotten(self):
+        from ..users import user_directory
+
+        user_directory.clear()
+        self.assertEqual(user_directory.get(self.grace.id).first_name, '')
+        self.grace.first_name = 'Grace'
+        self.grace.save()
+        self.assertEqual(user_directory.get(self.grace.id).first_name, 'Grace')
+        grace_id = self.grace.id
+        self.grace.delete()
+        self.assertIsNone(user_directory.get(grace_id))
+
+    def test_names(self):
+        names = self.directory.names([self.amina.id, self.grace.id, 42])
+        self.assertEqual(names, {self.amina.id: 'Amina Wanjiru', self.grace.id: 'grace', 42: 'User ID: 42'})
+        self.assertEqual(display_name(None, 7), 'User ID: 7')
+
+    def test_database_error_resolves_nothing(self):
+        with mock.patch.object(User.objects, 'in_bulk', side_effect=RuntimeError('database down')):
+            self.assertEqual(self.directory.resolve([self.amina.id]), {self.amina.id: None})
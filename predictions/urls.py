@@ -12,16 +12,31 @@ urlpatterns = [
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
     path('predict/', views.predict_view, name='predict'),
     path('dashboard/', views.dashboard_view, name='dashboard'),
+    path('dashboard/panels/<str:panel>/', views.dashboard_panel_view, name='dashboard_panel'),
     path('history/', views.history_view, name='history'),
+    path('patients/autocomplete/', views.patient_autocomplete_api, name='patient_autocomplete'),
     path('patient/<str:patient_id>/', views.patient_detail_view, name='patient_detail'),
     # Admin-only routes (using 'manage' prefix to avoid conflict with Django admin)
     path('manage/health-workers/', views.health_workers_view, name='health_workers'),
     path('manage/health-worker/<int:user_id>/', views.health_worker_detail_view, name='health_worker_detail'),
     path('manage/patients/', views.patients_management_view, name='patients_management'),
+    path('manage/patients/duplicates/', views.duplicate_patients_view, name='duplicate_patients'),
     path('manage/users/', views.users_management_view, name='users_management'),
     path('manage/audit-logs/', views.audit_logs_view, name='audit_logs'),
     path('manage/analytics/', views.analytics_charts_view, name='analytics'),
     path('manage/analytics/data/', views.analytics_data_api, name='analytics_data'),
+    path('manage/db/status/', views.db_status_api, name='db_status'),
+    path('metrics', views.metrics_view, name='metrics'),
+    path('manage/spool/status/', views.spool_status_api, name='spool_status'),
+    path('manage/db/slow-queries/', views.slow_queries_view, name='slow_queries'),
+    path('manage/profiling/', views.profiling_view, name='profiling'),
+    path('manage/profiling/report/', views.profiling_report_view, name='profiling_report'),
     path('manage/export/csv/', views.export_csv_view, name='export_csv'),
+    path('manage/export/xlsx/', views.export_xlsx_view, name='export_xlsx'),
+    path('manage/export/pdf/', views.export_pdf_view, name='export_pdf'),
+    path('manage/export/jobs/', views.export_job_create_view, name='export_job_create'),
+    path('manage/export/jobs/<int:job_id>/', views.export_job_view, name='export_job'),
+    path('manage/export/jobs/<int:job_id>/status/', views.export_job_status_view, name='export_job_status'),
+    path('manage/export/jobs/<int:job_id>/download/', views.export_job_download_view, name='export_job_download'),
 ]
 
@@ -0,0 +1,112 @@
+"""
+Health worker lookups for MamaCare
+Resolves the Django user IDs stored on MongoDB records in one query, with a short-lived in-process cache
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+
+
+def _as_user_id(value):
+    """The integer primary key a stored user_id refers to, or None if it cannot be one"""
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def display_name(user, user_id=None):
+    """How a health worker is shown next to their records"""
+    if user is not None:
+        return user.get_full_name() or user.username
+    return f"User ID: {user_id}"
+
+
+class UserDirectory:
+    """
+    Per-process cache of Django users keyed by ID
+
+    Views decorating predictions, audit logs or health worker aggregates pass
+    every user_id on the page to resolve(), which fetches the ones not cached
+    with a single in_bulk query. Entries (including IDs of deleted users)
+    expire after ttl seconds and are dropped as soon as a user is saved or
+    deleted in this process.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, user_ids):
+        """
+        Look up many users at once
+
+        Args:
+            user_ids: user_id values as stored on records (ints, numeric strings, None)
+
+        Returns:
+            dict: {user_id as given: User, or None if missing or invalid}
+        """
+        keys = {uid: _as_user_id(uid) for uid in user_ids}
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in set(keys.values()) - {None}:
+                entry = self._entries.get(key)
+                if entry and entry[0] > now:
+                    found[key] = entry[1]
+        self.hits += len(found)
+
+        missing = set(keys.values()) - {None} - set(found)
+        if missing:
+            self.misses += len(missing)
+            try:
+                users = User.objects.in_bulk(missing)
+            except Exception as e:
+                print(f"⚠ Warning: Could not look up users: {e}")
+                users = {}
+            expires = time.monotonic() + self.ttl
+            with self._lock:
+                if len(self._entries) > 10000:
+                    self._entries.clear()
+                for key in missing:
+                    self._entries[key] = (expires, users.get(key))
+                    found[key] = users.get(key)
+        return {uid: found.get(key) for uid, key in keys.items()}
+
+    def get(self, user_id):
+        """One user (or None); prefer resolve() for more than one"""
+        return self.resolve([user_id]).get(user_id)
+
+    def names(self, user_ids):
+        """{user_id as given: display name} for many users at once"""
+        return {uid: display_name(user, uid) for uid, user in self.resolve(user_ids).items()}
+
+    def forget(self, user_id):
+        with self._lock:
+            self._entries.pop(_as_user_id(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'cached': len(self._entries), 'hits': self.hits, 'misses': self.misses, 'ttl': self.ttl}
+
+
+# Global instance
+user_directory = UserDirectory(ttl=settings.USER_CACHE_SECONDS)
+
+
+def _forget_user(sender, instance, **kwargs):
+    user_directory.forget(instance.pk)
+
+
+post_save.connect(_forget_user, sender=User, dispatch_uid='mamacare_user_directory_save')
+post_delete.connect(_forget_user, sender=User, dispatch_uid='mamacare_user_directory_delete')
@@ -1,20 +1,36 @@
 """
 Views for MamaCare prediction system
 """
-from django.shortcuts import render, redirect
+from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import login, authenticate
 from django.contrib import messages
 from django.contrib.auth.models import User
 from django.conf import settings
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from urllib.parse import urlencode
 from datetime import datetime, timedelta
-import csv
+import io
 import json
+import os
+import re
+import tempfile
+import time
 from .forms import PredictionForm, UserRegistrationForm
+from .models import ExportJob
 from .ml_service import ml_service
+from .aggregate_cache import aggregates_version
 from .db_service import db_service
+from .duplicates import check_new_patient_async
+from .export_jobs import CONTENT_TYPES, submit_export
+from .fanout import run_with_deadline
+from .metrics import render_metrics
+from .profiling import profiler
+from .users import user_directory
+from .exports import EXPORT_PROJECTION, iter_csv, label_health_workers, write_summary_pdf, write_xlsx
 
 
 def register_view(request):
@@ -99,40 +115,37 @@ def predict_view(request):
                 messages.error(request, 'Patient name is required.')
                 return render(request, 'predictions/predict.html', {'form': form})
             
-            # Get or create patient
-            patient = db_service.get_or_create_patient(
-                patient_id=patient_id_input if patient_id_input else None,
-                patient_name=patient_name
-            )
-            
-            if not patient:
-                messages.error(request, 'Error creating/retrieving patient record.')
-                return render(request, 'predictions/predict.html', {'form': form})
-            
-            patient_id = patient['patient_id']
-            patient_name = patient['patient_name']
-            
             # Make prediction using ML service
             try:
                 predictions = ml_service.predict_all_risks(input_data)
                 
+                # Record the visit (write-behind: spooled locally, flushed to MongoDB in the background)
+                patient, prediction_id = db_service.save_visit(
+                    user_id=request.user.id,
+                    patient_id=patient_id_input if patient_id_input else None,
+                    patient_name=patient_name,
+                    input_data=input_data,
+                    predictions=predictions
+                )
+                if patient is None:
+                    messages.error(request, f'No patient is registered with ID {patient_id_input}. '
+                                            'Check the ID, or leave it blank to register a new patient.')
+                    return render(request, 'predictions/predict.html', {'form': form})
+                patient_id = patient['patient_id']
+                patient_name = patient['patient_name']
+                if not patient_id_input:
+                    # Newly registered: look for an earlier registration under another spelling
+                    check_new_patient_async(db_service, patient_id, patient_name)
+                
                 # Log prediction action
                 db_service.log_action(request.user.id, 'prediction_made', {
                     'patient_id': patient_id,
+                    'prediction_id': prediction_id,
                     'general_risk': predictions.get('general_risk'),
                     'preeclampsia_risk': predictions.get('preeclampsia_risk'),
                     'gdm_risk': predictions.get('gdm_risk')
                 })
                 
-                # Save to database (optional - predictions work without it)
-                prediction_id = db_service.save_prediction(
-                    user_id=request.user.id,
-                    patient_id=patient_id,
-                    patient_name=patient_name,
-                    input_data=input_data,
-                    predictions=predictions
-                )
-                
                 if prediction_id:
                     messages.success(request, f'Prediction saved successfully! Patient ID: {patient_id}')
                 else:
@@ -167,57 +180,26 @@ def dashboard_view(request):
     end_date = request.GET.get('end_date')
     
     if request.user.is_staff:
-        # Admin view: system-wide statistics and all predictions
+        # Admin view: a shell whose panels the browser loads in parallel from
+        # dashboard_panel_view, so the first paint waits on no aggregate.
+        # Panel URLs carry the aggregate version, so a new prediction changes
+        # them and the browser never shows a cached panel from before it
+        try:
+            version = aggregates_version()
+        except Exception as e:
+            print(f"⚠ Warning: Could not read aggregate cache version: {e}")
+            version = int(time.time())
+        panel_query = {'v': version}
         if start_date and end_date:
-            try:
-                start = datetime.strptime(start_date, '%Y-%m-%d')
-                end = datetime.strptime(end_date, '%Y-%m-%d')
-                end = end.replace(hour=23, minute=59, second=59)
-                stats = db_service.get_statistics_by_date_range(start, end)
-                all_predictions = db_service.get_predictions_by_date_range(start, end, limit=20)
-            except ValueError:
-                stats = db_service.get_statistics()
-                all_predictions = db_service.get_all_predictions(limit=20)
-        else:
-            stats = db_service.get_statistics()
-            all_predictions = db_service.get_all_predictions(limit=20)
-        
-        health_workers_data = db_service.get_all_health_workers()
-        
-        # Get user details for top health workers
-        top_health_workers = []
-        for hw in health_workers_data[:10]:  # Top 10 most active
-            try:
-                user = User.objects.get(id=int(hw['user_id']))
-                top_health_workers.append({
-                    'user': user,
-                    'user_id': hw['user_id'],
-                    'total_predictions': hw['total_predictions'],
-                    'high_risk_count': hw['high_risk_count'],
-                    'last_prediction': hw.get('last_prediction')
-                })
-            except (User.DoesNotExist, ValueError, TypeError):
-                top_health_workers.append({
-                    'user': None,
-                    'user_id': hw['user_id'],
-                    'total_predictions': hw['total_predictions'],
-                    'high_risk_count': hw['high_risk_count'],
-                    'last_prediction': hw.get('last_prediction')
-                })
-        
-        # Get daily statistics for charts
-        daily_stats = db_service.get_daily_statistics(days=30)
-        
+            panel_query.update(start_date=start_date, end_date=end_date)
+
         # Log dashboard view
         db_service.log_action(request.user.id, 'dashboard_view', {'is_staff': True})
         
         return render(request, 'predictions/dashboard.html', {
-            'all_predictions': all_predictions,
-            'stats': stats,
             'is_staff': True,
             'user_predictions': None,
-            'health_workers': top_health_workers,
-            'daily_stats': daily_stats,
+            'panel_query': urlencode(panel_query),
             'start_date': start_date,
             'end_date': end_date
         })
@@ -238,35 +220,116 @@ def dashboard_view(request):
         })
 
 
+DASHBOARD_PANEL_TEMPLATES = {
+    'stats': 'predictions/dashboard_panels/stats.html',
+    'health_workers': 'predictions/dashboard_panels/health_workers.html',
+    'recent_predictions': 'predictions/dashboard_panels/recent_predictions.html',
+}
+
+
+def _dashboard_range(request):
+    """The dashboard's date filter as (start, end) datetimes, or (None, None) if absent or invalid"""
+    start_date = request.GET.get('start_date')
+    end_date = request.GET.get('end_date')
+    if not (start_date and end_date):
+        return None, None
+    try:
+        start = datetime.strptime(start_date, '%Y-%m-%d')
+        end = datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
+        return start, end
+    except ValueError:
+        return None, None
+
+
+def _top_health_workers(health_workers_data, limit=10):
+    """The most active health workers with their user accounts (None if deleted)"""
+    health_workers_data = health_workers_data[:limit]
+    users = user_directory.resolve(hw['user_id'] for hw in health_workers_data)
+    top_health_workers = []
+    for hw in health_workers_data:
+        top_health_workers.append({
+            'user': users.get(hw['user_id']),
+            'user_id': hw['user_id'],
+            'total_predictions': hw['total_predictions'],
+            'high_risk_count': hw['high_risk_count'],
+            'last_prediction': hw.get('last_prediction')
+        })
+    return top_health_workers
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff, login_url='/predict/')
+def dashboard_panel_view(request, panel):
+    """
+    One panel of the admin dashboard, fetched by the dashboard shell
+    
+    Returns an HTML fragment (JSON for the daily chart) that the browser may
+    cache for DASHBOARD_PANEL_MAX_AGE[panel] seconds. A query that misses the
+    page deadline returns 503 and the shell shows a notice for that panel only.
+    The one query runs in the request thread (the pool would add no
+    concurrency), bounded on the MongoDB server as well, so it is aborted
+    rather than left running.
+    """
+    if panel not in settings.DASHBOARD_PANEL_MAX_AGE:
+        raise Http404("Unknown dashboard panel")
+    start, end = _dashboard_range(request)
+    if panel == 'stats':
+        query = (lambda: db_service.get_statistics_by_date_range(start, end)) if start else db_service.get_statistics
+    elif panel == 'recent_predictions':
+        query = ((lambda: db_service.get_predictions_by_date_range(start, end, limit=20)) if start
+                 else (lambda: db_service.get_all_predictions(limit=20)))
+    elif panel == 'health_workers':
+        query = db_service.get_all_health_workers
+    else:
+        query = lambda: db_service.get_daily_statistics(days=30)
+
+    try:
+        data = run_with_deadline(query)
+    except Exception as e:
+        print(f"⚠ Warning: Dashboard panel '{panel}' failed: {e}")
+        return HttpResponse("Dashboard panel unavailable", status=503)
+
+    if panel == 'daily_chart':
+        response = JsonResponse({
+            'dates': [item['_id'] for item in data],
+            'total': [item['count'] for item in data],
+            'high_risk': [item['high_risk'] for item in data],
+            'low_risk': [item['low_risk'] for item in data]
+        })
+    elif panel == 'health_workers':
+        response = render(request, DASHBOARD_PANEL_TEMPLATES[panel], {
+            'health_workers': _top_health_workers(data)
+        })
+    elif panel == 'recent_predictions':
+        response = render(request, DASHBOARD_PANEL_TEMPLATES[panel], {'all_predictions': data})
+    else:
+        response = render(request, DASHBOARD_PANEL_TEMPLATES[panel], {'stats': data})
+
+    # Empty results usually mean the database was unreachable: don't let the browser keep them
+    if data:
+        patch_cache_control(response, private=True, max_age=settings.DASHBOARD_PANEL_MAX_AGE[panel])
+    return response
+
+
 @login_required
 @user_passes_test(lambda u: u.is_staff, login_url='/predict/')
 def health_workers_view(request):
     """Admin view: List all health workers with their activity"""
     health_workers_data = db_service.get_all_health_workers()
     
-    # Get user details for each health worker
+    # Get user details for all health workers in one query
+    users = user_directory.resolve(hw['user_id'] for hw in health_workers_data)
     health_worker_details = []
     for hw in health_workers_data:
-        try:
-            user = User.objects.get(id=int(hw['user_id']))
-            health_worker_details.append({
-                'user': user,
-                'user_id': hw['user_id'],
-                'total_predictions': hw['total_predictions'],
-                'high_risk_count': hw['high_risk_count'],
-                'first_prediction': hw.get('first_prediction'),
-                'last_prediction': hw.get('last_prediction')
-            })
-        except (User.DoesNotExist, ValueError, TypeError):
-            # User might have been deleted
-            health_worker_details.append({
-                'user': None,
-                'user_id': hw['user_id'],
-                'total_predictions': hw['total_predictions'],
-                'high_risk_count': hw['high_risk_count'],
-                'first_prediction': hw.get('first_prediction'),
-                'last_prediction': hw.get('last_prediction')
-            })
+        # user is None if the account has been deleted
+        health_worker_details.append({
+            'user': users.get(hw['user_id']),
+            'user_id': hw['user_id'],
+            'total_predictions': hw['total_predictions'],
+            'high_risk_count': hw['high_risk_count'],
+            'first_prediction': hw.get('first_prediction'),
+            'last_prediction': hw.get('last_prediction')
+        })
     
     return render(request, 'predictions/health_workers.html', {
         'health_workers': health_worker_details
@@ -311,6 +374,39 @@ def patients_management_view(request):
     })
 
 
+@login_required
+@user_passes_test(lambda u: u.is_staff, login_url='/predict/')
+def duplicate_patients_view(request):
+    """Admin view: Review patients that look registered more than once"""
+    if request.method == 'POST':
+        candidate_id = request.POST.get('candidate_id', '')
+        action = request.POST.get('action')
+        statuses = {'confirm': 'confirmed', 'dismiss': 'dismissed'}
+        if action in statuses and db_service.set_duplicate_candidate_status(candidate_id, statuses[action], request.user.id):
+            db_service.log_action(request.user.id, 'duplicate_review', {
+                'candidate_id': candidate_id,
+                'status': statuses[action]
+            })
+            messages.success(request, f'Marked {candidate_id.replace("|", " / ")} as {statuses[action]}.')
+        else:
+            messages.error(request, 'Could not update that duplicate candidate.')
+        return redirect('duplicate_patients')
+    
+    status = request.GET.get('status', 'pending')
+    if status not in ('pending', 'confirmed', 'dismissed'):
+        status = 'pending'
+    candidates = db_service.get_duplicate_candidates(status=status, limit=200)
+    for candidate in candidates:
+        candidate['id'] = candidate['_id']
+        candidate['score_percent'] = round(candidate['score'] * 100, 1)
+        candidate['pair'] = list(zip(candidate['patient_ids'], candidate['patient_names']))
+    
+    return render(request, 'predictions/duplicate_patients.html', {
+        'candidates': candidates,
+        'status': status
+    })
+
+
 @login_required
 @user_passes_test(lambda u: u.is_staff, login_url='/predict/')
 def users_management_view(request):
@@ -344,6 +440,115 @@ def users_management_view(request):
     })
 
 
+@login_required
+@user_passes_test(lambda u: u.is_staff, login_url='/predict/')
+def slow_queries_view(request):
+    """Admin view: This worker's recent slow MongoDB commands with sampled explain plans"""
+    entries = []
+    for entry in db_service.slow_queries(limit=200):
+        entry = dict(entry)
+        entry['filter_json'] = json.dumps(entry['filter'], default=str)
+        entry['sort_json'] = json.dumps(entry['sort']) if entry['sort'] else ''
+        entries.append(entry)
+    
+    return render(request, 'predictions/slow_queries.html', {
+        'entries': entries,
+        'threshold_ms': settings.SLOW_QUERY_MS,
+        'explain_rate_percent': round(settings.SLOW_QUERY_EXPLAIN_RATE * 100),
+        'pid': os.getpid()
+    })
+
+
+PROFILING_SORTS = ['cumulative', 'tottime', 'ncalls']
+
+
+def _profilable_views():
+    """URL names of the app's views, except the profiling pages themselves"""
+    from .urls import urlpatterns
+    return sorted(
+        pattern.name for pattern in urlpatterns
+        if pattern.name and not pattern.name.startswith('profiling')
+    )
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff, login_url='/predict/')
+def profiling_view(request):
+    """Admin view: Profile the next N requests to a view in this worker (cProfile + optional tracemalloc)"""
+    views = _profilable_views()
+    
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if action == 'start':
+            view_name = request.POST.get('view_name')
+            try:
+                requests = int(request.POST.get('requests', 10))
+            except ValueError:
+                requests = 0
+            if view_name not in views:
+                messages.error(request, 'Choose a view to profile.')
+            elif not 1 <= requests <= settings.PROFILING_MAX_REQUESTS:
+                messages.error(request, f'Profile between 1 and {settings.PROFILING_MAX_REQUESTS} requests.')
+            else:
+                memory = request.POST.get('memory') == 'on'
+                try:
+                    profiler.start(view_name, requests, memory=memory, started_by=request.user.username,
+                                   timeout=settings.PROFILING_SESSION_TIMEOUT_SECONDS)
+                    db_service.log_action(request.user.id, 'profiling_started', {
+                        'view_name': view_name,
+                        'requests': requests,
+                        'memory': memory
+                    })
+                    messages.success(request, f'Profiling the next {requests} request(s) to {view_name}.')
+                except ValueError as e:
+                    messages.error(request, str(e))
+        elif action == 'stop':
+            if profiler.stop():
+                messages.info(request, 'Profiling stopped.')
+        return redirect('profiling')
+    
+    sort = request.GET.get('sort', 'cumulative')
+    if sort not in PROFILING_SORTS:
+        sort = 'cumulative'
+    session = profiler.last
+    return render(request, 'predictions/profiling.html', {
+        'views': views,
+        'session': session,
+        'active': profiler.active is not None,
+        'report': session.report(sort=sort) if session else '',
+        'sort': sort,
+        'sorts': PROFILING_SORTS,
+        'max_requests': settings.PROFILING_MAX_REQUESTS,
+        'timeout_minutes': settings.PROFILING_SESSION_TIMEOUT_SECONDS // 60,
+        'pid': os.getpid()
+    })
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff, login_url='/predict/')
+def profiling_report_view(request):
+    """Aggregated stats of the latest profiling session (text, or ?format=prof for snakeviz / pstats)"""
+    session = profiler.last
+    if session is None or session.stats is None:
+        raise Http404('No profiled requests yet')
+    
+    if request.GET.get('format') == 'prof':
+        response = HttpResponse(session.dump(), content_type='application/octet-stream')
+        response['Content-Disposition'] = (
+            f'attachment; filename="mamacare_{session.view_name}_{session.started_at:%Y%m%d_%H%M%S}.prof"'
+        )
+        return response
+    
+    sort = request.GET.get('sort', 'cumulative')
+    if sort not in PROFILING_SORTS:
+        sort = 'cumulative'
+    try:
+        limit = min(int(request.GET.get('limit', 100)), 1000)
+    except ValueError:
+        limit = 100
+    return HttpResponse(session.report(sort=sort, limit=limit), content_type='text/plain; charset=utf-8')
+
+
 @login_required
 @user_passes_test(lambda u: u.is_staff, login_url='/predict/')
 def audit_logs_view(request):
@@ -358,13 +563,10 @@ def audit_logs_view(request):
         limit=limit
     )
     
-    # Get user names for logs
+    # Get user names for logs (one query for the whole page)
+    names = user_directory.names(log.get('user_id') for log in logs)
     for log in logs:
-        try:
-            user = User.objects.get(id=int(log['user_id']))
-            log['user_name'] = user.get_full_name() or user.username
-        except (User.DoesNotExist, ValueError, TypeError):
-            log['user_name'] = f"User ID: {log['user_id']}"
+        log['user_name'] = names[log.get('user_id')]
     
     return render(request, 'predictions/audit_logs.html', {
         'logs': logs,
@@ -373,59 +575,205 @@ def audit_logs_view(request):
     })
 
 
-@login_required
-@user_passes_test(lambda u: u.is_staff, login_url='/predict/')
-def export_csv_view(request):
-    """Export predictions to CSV"""
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    
+def _parse_export_range(start_date, end_date):
+    """Parse export date filters; returns (None, None) when absent or invalid"""
     if start_date and end_date:
         try:
             start = datetime.strptime(start_date, '%Y-%m-%d')
             end = datetime.strptime(end_date, '%Y-%m-%d')
-            end = end.replace(hour=23, minute=59, second=59)
-            predictions = db_service.get_predictions_by_date_range(start, end, limit=10000)
+            return start, end.replace(hour=23, minute=59, second=59)
         except ValueError:
-            predictions = db_service.get_all_predictions(limit=10000)
-    else:
-        predictions = db_service.get_all_predictions(limit=10000)
+            pass
+    return None, None
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff, login_url='/predict/')
+def export_csv_view(request):
+    """Export predictions to CSV, streamed straight from a MongoDB cursor"""
+    start_date = request.GET.get('start_date')
+    end_date = request.GET.get('end_date')
+    start, end = _parse_export_range(start_date, end_date)
     
-    # Log export
+    # Log export (row count is unknown until the stream has finished)
     db_service.log_action(request.user.id, 'export_csv', {
         'start_date': start_date,
         'end_date': end_date,
-        'count': len(predictions)
+        'streamed': True
     })
     
-    response = HttpResponse(content_type='text/csv')
+    predictions = db_service.iter_predictions(start, end, projection=EXPORT_PROJECTION)
+    response = StreamingHttpResponse(iter_csv(predictions), content_type='text/csv')
     response['Content-Disposition'] = f'attachment; filename="mamacare_predictions_{datetime.now().strftime("%Y%m%d")}.csv"'
     
-    writer = csv.writer(response)
-    writer.writerow([
-        'Date', 'Patient ID', 'Patient Name', 'Health Worker ID', 'Age', 'BMI', 
-        'Gestational Age', 'Systolic BP', 'Diastolic BP', 'General Risk', 
-        'Preeclampsia Risk', 'GDM Risk', 'Overall Assessment'
-    ])
+    return response
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff, login_url='/predict/')
+def export_xlsx_view(request):
+    """Export predictions to Excel, written row by row in openpyxl write-only mode"""
+    start_date = request.GET.get('start_date')
+    end_date = request.GET.get('end_date')
+    start, end = _parse_export_range(start_date, end_date)
     
-    for pred in predictions:
-        input_data = pred.get('input_data', {})
-        writer.writerow([
-            pred.get('created_at', '').strftime('%Y-%m-%d %H:%M:%S') if pred.get('created_at') else '',
-            pred.get('patient_id', ''),
-            pred.get('patient_name', ''),
-            pred.get('user_id', ''),
-            input_data.get('age', ''),
-            input_data.get('bmi_val', ''),
-            input_data.get('gestational_age_weeks', ''),
-            input_data.get('systolic_bp', ''),
-            input_data.get('diastolic_bp', ''),
-            pred.get('general_risk', ''),
-            pred.get('preeclampsia_risk', ''),
-            pred.get('gdm_risk', ''),
-            pred.get('overall_assessment', '')
-        ])
+    db_service.log_action(request.user.id, 'export_xlsx', {
+        'start_date': start_date,
+        'end_date': end_date
+    })
+    
+    # The workbook is spooled to an anonymous temp file, then streamed out in chunks
+    tmp = tempfile.TemporaryFile()
+    predictions = db_service.iter_predictions(start, end, projection=EXPORT_PROJECTION)
+    write_xlsx(predictions, tmp)
+    tmp.seek(0)
+    
+    return FileResponse(
+        tmp,
+        as_attachment=True,
+        filename=f'mamacare_predictions_{datetime.now().strftime("%Y%m%d")}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff, login_url='/predict/')
+def export_pdf_view(request):
+    """Export a PDF summary report built from aggregated statistics"""
+    start_date = request.GET.get('start_date')
+    end_date = request.GET.get('end_date')
+    start, end = _parse_export_range(start_date, end_date)
+    
+    summary = db_service.get_report_summary(start, end)
+    label_health_workers(summary)
     
+    db_service.log_action(request.user.id, 'export_pdf', {
+        'start_date': start_date,
+        'end_date': end_date
+    })
+    
+    buffer = io.BytesIO()
+    write_summary_pdf(summary, buffer)
+    buffer.seek(0)
+    
+    return FileResponse(
+        buffer,
+        as_attachment=True,
+        filename=f'mamacare_summary_{datetime.now().strftime("%Y%m%d")}.pdf',
+        content_type='application/pdf'
+    )
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff, login_url='/predict/')
+def export_job_create_view(request):
+    """Queue a background export (identical pending requests share one job)"""
+    if request.method != 'POST':
+        return redirect('analytics')
+    
+    export_format = request.POST.get('format', ExportJob.FORMAT_CSV)
+    if export_format not in dict(ExportJob.FORMAT_CHOICES):
+        messages.error(request, f'Unknown export format "{export_format}".')
+        return redirect('analytics')
+    
+    start, end = _parse_export_range(request.POST.get('start_date'), request.POST.get('end_date'))
+    job, created = submit_export(
+        export_format,
+        start_date=start.date() if start else None,
+        end_date=end.date() if end else None,
+        user=request.user
+    )
+    
+    db_service.log_action(request.user.id, f'export_{export_format}', {
+        'start_date': request.POST.get('start_date'),
+        'end_date': request.POST.get('end_date'),
+        'job_id': job.pk,
+        'shared': not created
+    })
+    
+    return redirect('export_job', job_id=job.pk)
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff, login_url='/predict/')
+def export_job_view(request, job_id):
+    """Admin view: progress page for a background export"""
+    job = get_object_or_404(ExportJob, pk=job_id)
+    return render(request, 'predictions/export_job.html', {'job': job})
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff, login_url='/predict/')
+def export_job_status_view(request, job_id):
+    """API endpoint for background export status"""
+    job = get_object_or_404(ExportJob, pk=job_id)
+    return JsonResponse({
+        'id': job.pk,
+        'format': job.export_format,
+        'status': job.status,
+        'start_date': job.start_date.isoformat() if job.start_date else None,
+        'end_date': job.end_date.isoformat() if job.end_date else None,
+        'row_count': job.row_count,
+        'file_size': job.file_size,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'download_url': reverse('export_job_download', args=[job.pk]) if job.status == ExportJob.STATUS_DONE else None
+    })
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff, login_url='/predict/')
+def export_job_download_view(request, job_id):
+    """Download a finished export artifact (supports HTTP Range requests)"""
+    job = get_object_or_404(ExportJob, pk=job_id, status=ExportJob.STATUS_DONE)
+    if not os.path.exists(job.file_path):
+        raise Http404('Export file has expired.')
+    return _ranged_file_response(request, job.file_path, job.file_name, CONTENT_TYPES[job.export_format])
+
+
+def _ranged_file_response(request, path, filename, content_type, chunk_size=64 * 1024):
+    """Serve a file, honouring a single 'Range: bytes=...' request header"""
+    size = os.path.getsize(path)
+    range_header = request.META.get('HTTP_RANGE', '').strip()
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', range_header) if range_header else None
+    
+    if not match or (not match.group(1) and not match.group(2)):
+        # No (or an unsupported multi-part) range: send the whole file
+        response = FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type=content_type)
+        response['Accept-Ranges'] = 'bytes'
+        return response
+    
+    if match.group(1):
+        first = int(match.group(1))
+        last = int(match.group(2)) if match.group(2) else size - 1
+    else:
+        # Suffix range: the final N bytes
+        first = max(size - int(match.group(2)), 0)
+        last = size - 1
+    last = min(last, size - 1)
+    
+    if first > last or first >= size:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    
+    def file_range():
+        with open(path, 'rb') as f:
+            f.seek(first)
+            remaining = last - first + 1
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+    
+    response = StreamingHttpResponse(file_range(), status=206, content_type=content_type)
+    response['Content-Length'] = str(last - first + 1)
+    response['Content-Range'] = f'bytes {first}-{last}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
 
@@ -494,6 +842,32 @@ def analytics_data_api(request):
     })
 
 
+@login_required
+@user_passes_test(lambda u: u.is_staff, login_url='/predict/')
+def spool_status_api(request):
+    """API endpoint for write-behind backlog (visits and audit logs not yet persisted)"""
+    return JsonResponse(db_service.write_behind_stats())
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff, login_url='/predict/')
+def db_status_api(request):
+    """API endpoint for this worker's storage connection (MongoDB pool and circuit breaker)"""
+    return JsonResponse(db_service.pool_stats())
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint (all workers' metrics in the text exposition format)"""
+    token = settings.METRICS_TOKEN
+    if token:
+        if request.headers.get('Authorization', '') != f'Bearer {token}':
+            return HttpResponse('Unauthorized', status=401)
+    elif request.META.get('REMOTE_ADDR') not in ('127.0.0.1', '::1'):
+        return HttpResponse('Set METRICS_TOKEN to scrape metrics remotely', status=403)
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
+
+
 @login_required
 def history_view(request):
     """View prediction history - supports patient ID lookup"""
@@ -523,6 +897,30 @@ def history_view(request):
     })
 
 
+@login_required
+def patient_autocomplete_api(request):
+    """API endpoint for patient name / ID autocomplete (?q=...&limit=...)"""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 20)
+    except ValueError:
+        limit = 10
+    
+    results = db_service.search_patients(query, limit=limit) if query else []
+    return JsonResponse({
+        'query': query,
+        'results': [
+            {
+                'patient_id': patient['patient_id'],
+                'patient_name': patient.get('patient_name') or 'Unknown',
+                'created_at': patient['created_at'].isoformat() if patient.get('created_at') else None,
+                'url': reverse('patient_detail', args=[patient['patient_id']])
+            }
+            for patient in results
+        ]
+    })
+
+
 @login_required
 def patient_detail_view(request, patient_id):
     """Detailed patient view showing all visits with comparison"""
@@ -548,18 +946,12 @@ def patient_detail_view(request, patient_id):
     # Prepare data for comparison view
     # Group predictions with their key metrics for easy comparison
     comparison_data = []
+    # Health worker names for every visit in one query
+    worker_names = user_directory.names(pred.get('user_id') for pred in predictions)
     for pred in predictions:
         input_data = pred.get('input_data', {})
         user_id = pred.get('user_id')
-        
-        # Get health worker information
-        health_worker_name = 'Unknown'
-        if user_id:
-            try:
-                user = User.objects.get(id=int(user_id))
-                health_worker_name = f"{user.get_full_name() or user.username}"
-            except (User.DoesNotExist, ValueError, TypeError):
-                health_worker_name = f"User ID: {user_id}"
+        health_worker_name = worker_names[user_id] if user_id else 'Unknown'
         
         comparison_data.append({
             'date': pred.get('created_at'),